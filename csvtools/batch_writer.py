@@ -0,0 +1,130 @@
+'''
+Batched row output
+
+Writing rows one by one with writerow costs a call into the csv module
+(and potentially a write call) per row, BatchWriter collects rows and
+writes them with a single writerows call per batch.
+
+FormattingWriter formats the rows of a writerows call to a single string
+and writes it with a single write call.
+ThreadedFile hands these strings to a thread, so that compressing and
+writing an output overlaps with producing and formatting the rows
+- both release the GIL, while formatting does not.
+'''
+
+import sys
+import csv
+import Queue
+import threading
+from cStringIO import StringIO
+
+
+BATCH_SIZE = 1000
+# writes queued for a ThreadedFile
+QUEUE_SIZE = 16
+
+
+class BatchWriter(object):
+
+    '''
+    csv writer interface writing rows with writerows in batches.
+
+    Call .flush() (or .close()) after the last row.
+    '''
+
+    def __init__(self, writer, batch_size=BATCH_SIZE):
+        self.writer = writer
+        self.batch_size = batch_size
+        self.batch = []
+
+    def writerow(self, row):
+        batch = self.batch
+        batch.append(row)
+        if len(batch) >= self.batch_size:
+            self.flush()
+
+    def writerows(self, rows):
+        self.flush()
+        self.writer.writerows(rows)
+
+    def flush(self):
+        if self.batch:
+            self.writer.writerows(self.batch)
+            self.batch = []
+
+    close = flush
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.flush()
+
+
+class FormattingWriter(object):
+
+    '''
+    csv writer interface writing the formatted rows of a writerows call
+    with a single write call.
+    '''
+
+    def __init__(self, output_file):
+        self.write = output_file.write
+
+    def writerow(self, row):
+        self.writerows([row])
+
+    def writerows(self, rows):
+        data = StringIO()
+        csv.writer(data).writerows(rows)
+        self.write(data.getvalue())
+
+
+class ThreadedFile(object):
+
+    '''
+    Write only file interface, writing to output_file in a thread.
+
+    .close() waits for the queued data to be written, closes output_file
+    and re-raises an error of the writing thread
+    (writes after an error also raise it).
+    '''
+
+    def __init__(self, output_file, queue_size=QUEUE_SIZE):
+        self.output_file = output_file
+        self.queue = Queue.Queue(queue_size)
+        self.exc_info = None
+        self.thread = threading.Thread(target=self._write)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _write(self):
+        for data in iter(self.queue.get, None):
+            if self.exc_info is None:
+                try:
+                    self.output_file.write(data)
+                except:
+                    self.exc_info = sys.exc_info()
+
+    def _raise_error(self):
+        if self.exc_info is not None:
+            raise self.exc_info[0], self.exc_info[1], self.exc_info[2]
+
+    def write(self, data):
+        self._raise_error()
+        self.queue.put(data)
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        try:
+            self._raise_error()
+        finally:
+            self.output_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
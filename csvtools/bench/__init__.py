@@ -0,0 +1,12 @@
+'''
+Throughput benchmarks of the console scripts on synthetic data
+
+Usage:
+python -m csvtools.bench [--rows N] [--save results.json]
+    [--baseline baseline.json [--tolerance 0.1]] [benchmark [...]]
+
+Every benchmark runs a tool in a subprocess on deterministically generated
+input and reports rows/s, MB/s (of input) and peak RSS.
+Results are stored as JSON, when compared to a baseline throughput drops
+beyond the tolerance are reported as regressions (exit status 1).
+'''
@@ -0,0 +1,5 @@
+import sys
+from csvtools.bench.runner import main
+
+
+sys.exit(main())
@@ -0,0 +1,93 @@
+'''
+Deterministic synthetic csv data generators
+
+Every generator writes a header and `rows` data rows to `output_file`,
+the same seed always gives the same output.
+'''
+
+import csv
+import random
+import string
+
+
+LETTERS = string.ascii_letters + string.digits
+
+
+def _word(rnd, length):
+    return ''.join(rnd.choice(LETTERS) for _ in xrange(length))
+
+
+def _write(output_file, header, rows):
+    writer = csv.writer(output_file)
+    writer.writerow(header)
+    writer.writerows(rows)
+
+
+def wide(output_file, rows, seed=0, columns=200):
+    '''
+    Many short unquoted fields
+    '''
+    rnd = random.Random(seed)
+    words = [_word(rnd, 6) for _ in xrange(1000)]
+    header = ['f{}'.format(i) for i in xrange(columns)]
+    _write(
+        output_file, header,
+        ([rnd.choice(words) for _ in xrange(columns)] for _ in xrange(rows)))
+
+
+def narrow(output_file, rows, seed=0):
+    '''
+    Few short unquoted fields
+    '''
+    rnd = random.Random(seed)
+    _write(
+        output_file, ['id', 'a', 'b'],
+        ([i, rnd.randint(0, 1000), _word(rnd, 4)] for i in xrange(rows)))
+
+
+def quoted(output_file, rows, seed=0, columns=10):
+    '''
+    Fields needing quotes: containing delimiters, quotes and newlines
+    '''
+    rnd = random.Random(seed)
+    specials = [',', '"', '\n', ' ']
+
+    def value():
+        return _word(rnd, 3) + rnd.choice(specials) + _word(rnd, 3)
+
+    header = ['f{}'.format(i) for i in xrange(columns)]
+    _write(
+        output_file, header,
+        ([value() for _ in xrange(columns)] for _ in xrange(rows)))
+
+
+def high_cardinality(output_file, rows, seed=0):
+    '''
+    Entity fields (a, b) with mostly distinct values
+    '''
+    rnd = random.Random(seed)
+    _write(
+        output_file, ['id', 'a', 'b', 'c'],
+        ([i, _word(rnd, 8), _word(rnd, 8), _word(rnd, 4)]
+         for i in xrange(rows)))
+
+
+def low_cardinality(output_file, rows, seed=0, distinct=100):
+    '''
+    Entity fields (a, b) with few distinct values
+    '''
+    rnd = random.Random(seed)
+    entities = [(_word(rnd, 8), _word(rnd, 8)) for _ in xrange(distinct)]
+
+    def row(i):
+        a, b = rnd.choice(entities)
+        return [i, a, b, _word(rnd, 4)]
+
+    _write(
+        output_file, ['id', 'a', 'b', 'c'],
+        (row(i) for i in xrange(rows)))
+
+
+GENERATORS = dict(
+    (generator.__name__, generator)
+    for generator in (wide, narrow, quoted, high_cardinality, low_cardinality))
@@ -0,0 +1,314 @@
+import os
+import sys
+import csv
+import json
+import time
+import shutil
+import tempfile
+import subprocess
+
+import argparse
+from csvtools.bench.generators import GENERATORS
+from csvtools.unzip import unzip
+from csvtools.divide import divide_stream
+from csvtools.columns import write_columns
+from csvtools.extract_map import new_extractor, open_map_file
+
+
+class BenchmarkFailed(Exception):
+    pass
+
+
+class Benchmark(object):
+
+    '''
+    Run of a console script (given by its module) on a generated dataset.
+
+    prepare: optional function(dataset_filename) -> input filename,
+        called in the work directory, creates the actual input
+        and other files needed by the tool
+    '''
+
+    def __init__(self, name, dataset, module_args, prepare=None):
+        self.name = name
+        self.dataset = dataset
+        self.module_args = module_args
+        self.prepare = prepare
+
+    def run(self, dataset_filename):
+        '''
+        Run the tool once in the current directory, return measurements
+        '''
+        input_filename = dataset_filename
+        if self.prepare:
+            input_filename = self.prepare(dataset_filename)
+
+        command = [sys.executable, '-m'] + self.module_args
+        with open(input_filename, 'rb') as stdin:
+            with open(os.devnull, 'wb') as stdout:
+                start = time.time()
+                process = subprocess.Popen(command, stdin=stdin, stdout=stdout)
+                _, status, rusage = os.wait4(process.pid, 0)
+                seconds = time.time() - start
+        process.returncode = status
+
+        if status != 0:
+            raise BenchmarkFailed(self.name, status)
+
+        return dict(
+            seconds=seconds,
+            bytes=os.path.getsize(input_filename),
+            # kilobytes on Linux
+            peak_rss_kb=rusage.ru_maxrss)
+
+
+def remove_file(filename):
+    if os.path.exists(filename):
+        os.remove(filename)
+
+
+def prepare_zip(dataset_filename):
+    with open(dataset_filename) as csv_in:
+        with open('zip-spec.csv', 'wb') as spec:
+            with open('zip-rest.csv', 'wb') as rest:
+                unzip(
+                    csv.reader(csv_in), ['a'],
+                    csv.writer(spec), csv.writer(rest), zip_field='zip_id')
+    return 'zip-spec.csv'
+
+
+def prepare_tsv(dataset_filename):
+    with open(dataset_filename) as csv_in:
+        with open('input.tsv', 'wb') as tsv_out:
+            csv.writer(tsv_out, delimiter='\t').writerows(csv.reader(csv_in))
+    return 'input.tsv'
+
+
+def prepare_extract_map(dataset_filename):
+    remove_file('map.csv')
+    return dataset_filename
+
+
+def prepare_inflate_map(dataset_filename):
+    remove_file('inflate-map.csv')
+    extractor = new_extractor('a,b', 'id=ab_id')
+    with open_map_file(extractor, 'inflate-map.csv'):
+        with open(dataset_filename) as csv_in:
+            with open('inflate-input.csv', 'wb') as csv_out:
+                extractor.extract(csv.reader(csv_in), csv.writer(csv_out))
+    return 'inflate-input.csv'
+
+
+def prepare_weave(dataset_filename):
+    with open(dataset_filename) as csv_in:
+        divide_stream(csv.reader(csv_in), 'weave.', 4)
+    return dataset_filename
+
+
+def prepare_columns2csv(dataset_filename):
+    with open(dataset_filename) as csv_in:
+        write_columns(csv.reader(csv_in), 'columns2csv')
+    return dataset_filename
+
+
+BENCHMARKS = [
+    Benchmark('select-wide', 'wide', ['csvtools.select', 'f3,f1,x=f150']),
+    Benchmark('select-narrow', 'narrow', ['csvtools.select', 'b,a']),
+    Benchmark('select-quoted', 'quoted', ['csvtools.select', 'f3,f1']),
+    Benchmark('rmfields-wide', 'wide', ['csvtools.rmfields', 'f0', 'f100']),
+    Benchmark('split-narrow', 'narrow', ['csvtools.split', 'split.', '10000']),
+    Benchmark(
+        'split-bytes-narrow', 'narrow',
+        ['csvtools.split', '--bytes', 'split.', '1000000']),
+    Benchmark(
+        'split-by-narrow', 'narrow',
+        ['csvtools.split', '--by', 'a', '--buckets', '8', 'split.']),
+    Benchmark('divide-narrow', 'narrow', ['csvtools.divide', 'divide.', '4']),
+    Benchmark(
+        'divide-round_robin-narrow', 'narrow',
+        ['csvtools.divide', '--round-robin', 'divide.', '4']),
+    Benchmark(
+        'weave-narrow', 'narrow', ['csvtools.weave', 'weave.'],
+        prepare=prepare_weave),
+    Benchmark(
+        'unzip-wide', 'wide',
+        ['csvtools.unzip', '--id=zip_id', 'f0,f1,f2', 'unzip-rest.csv']),
+    Benchmark(
+        'unzip-to-wide', 'wide',
+        ['csvtools.unzip', '--id=zip_id',
+         '--to', 'f0,f1,f2', 'unzip-to0.csv.gz',
+         '--to', 'f3,f4', 'unzip-to1.csv']),
+    Benchmark(
+        'unzip-to-threads-wide', 'wide',
+        ['csvtools.unzip', '--id=zip_id', '--threads',
+         '--to', 'f0,f1,f2', 'unzip-to0.csv.gz',
+         '--to', 'f3,f4', 'unzip-to1.csv']),
+    Benchmark(
+        'zip-narrow', 'narrow', ['csvtools.zip', 'zip-rest.csv'],
+        prepare=prepare_zip),
+    Benchmark(
+        'extract_map-low_cardinality', 'low_cardinality',
+        ['csvtools.extract_map', 'a,b', 'id=ab_id', 'map.csv'],
+        prepare=prepare_extract_map),
+    Benchmark(
+        'extract_map-high_cardinality', 'high_cardinality',
+        ['csvtools.extract_map', 'a,b', 'id=ab_id', 'map.csv'],
+        prepare=prepare_extract_map),
+    Benchmark(
+        'extract_map-compact-high_cardinality', 'high_cardinality',
+        ['csvtools.extract_map', '--compact', 'a,b', 'id=ab_id', 'map.csv'],
+        prepare=prepare_extract_map),
+    Benchmark(
+        'extract_map-jobs-high_cardinality', 'high_cardinality',
+        ['csvtools.extract_map', '--jobs', '2', 'a,b', 'id=ab_id', 'map.csv'],
+        prepare=prepare_extract_map),
+    Benchmark(
+        'inflate_map-high_cardinality', 'high_cardinality',
+        ['csvtools.inflate_map', 'a=a2,b=b2', 'id=ab_id', 'inflate-map.csv'],
+        prepare=prepare_inflate_map),
+    Benchmark(
+        'inflate_map-on_disk-high_cardinality', 'high_cardinality',
+        ['csvtools.inflate_map', '--on-disk',
+         'a=a2,b=b2', 'id=ab_id', 'inflate-map.csv'],
+        prepare=prepare_inflate_map),
+    Benchmark(
+        'sort-narrow', 'narrow',
+        ['csvtools.sort', '--run-rows', '20000', 'b']),
+    Benchmark(
+        'sort-numeric-narrow', 'narrow',
+        ['csvtools.sort', '--numeric', '--run-rows', '20000', 'a']),
+    Benchmark(
+        'pipeline-low_cardinality', 'low_cardinality',
+        ['csvtools.pipeline',
+         'select', 'id,a,b', ':', 'extract_map', 'a,b', 'id=ab_id', 'map.csv',
+         ':', 'rmfields', 'a', 'b'],
+        prepare=prepare_extract_map),
+    Benchmark('to_postgres-narrow', 'narrow', ['csvtools.to_postgres', 't']),
+    Benchmark('csv2tsv-quoted', 'quoted', ['csvtools.csv2tsv']),
+    Benchmark(
+        'tsv2csv-narrow', 'narrow', ['csvtools.tsv2csv'],
+        prepare=prepare_tsv),
+    Benchmark(
+        'csv2columns-wide', 'wide', ['csvtools.csv2columns', 'csv2columns']),
+    Benchmark(
+        'columns2csv-wide', 'wide', ['csvtools.columns2csv', 'columns2csv'],
+        prepare=prepare_columns2csv),
+]
+
+
+def generate_dataset(dataset, rows):
+    filename = dataset + '.csv'
+    if not os.path.exists(filename):
+        with open(filename, 'wb') as f:
+            GENERATORS[dataset](f, rows)
+    return filename
+
+
+def run_benchmarks(benchmarks, rows, repeat=1):
+    '''
+    Run benchmarks in a temporary directory, return results by name.
+
+    The fastest of `repeat` runs is reported.
+    '''
+    results = {}
+    original_dir = os.getcwd()
+    work_dir = tempfile.mkdtemp(prefix='csvtools-bench-')
+    try:
+        os.chdir(work_dir)
+        for benchmark in benchmarks:
+            dataset_filename = generate_dataset(benchmark.dataset, rows)
+            runs = [benchmark.run(dataset_filename) for _ in xrange(repeat)]
+            best = min(runs, key=lambda run: run['seconds'])
+            best['peak_rss_kb'] = max(run['peak_rss_kb'] for run in runs)
+            best['rows'] = rows
+            best['rows_per_s'] = rows / best['seconds']
+            best['mb_per_s'] = best['bytes'] / best['seconds'] / 1e6
+            results[benchmark.name] = best
+    finally:
+        os.chdir(original_dir)
+        shutil.rmtree(work_dir)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    '''
+    Names of benchmarks with rows/s dropped more than tolerance (ratio)
+    '''
+    return sorted(
+        name
+        for name, result in results.iteritems()
+        if name in baseline
+        if result['rows_per_s'] < (
+            baseline[name]['rows_per_s'] * (1 - tolerance)))
+
+
+def report(results, baseline, output_file):
+    output_file.write(
+        '{:<40} {:>12} {:>8} {:>10} {:>9}\n'.format(
+            'benchmark', 'rows/s', 'MB/s', 'RSS(kB)', 'baseline'))
+    for name in sorted(results):
+        result = results[name]
+        if name in baseline:
+            change = '{:+.1%}'.format(
+                result['rows_per_s'] / baseline[name]['rows_per_s'] - 1)
+        else:
+            change = '-'
+        output_file.write(
+            '{:<40} {:>12.0f} {:>8.2f} {:>10} {:>9}\n'.format(
+                name, result['rows_per_s'], result['mb_per_s'],
+                result['peak_rss_kb'], change))
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+        description='benchmark csvtools console scripts')
+
+    parser.add_argument(
+        '--rows', type=int, default=100000,
+        help='number of data rows in generated inputs (%(default)s)')
+    parser.add_argument(
+        '--repeat', type=int, default=1,
+        help='number of runs per benchmark, the fastest counts (%(default)s)')
+    parser.add_argument(
+        '--save', metavar='RESULTS_JSON',
+        help='file to save results to')
+    parser.add_argument(
+        '--baseline', metavar='BASELINE_JSON',
+        help='saved results to compare with')
+    parser.add_argument(
+        '--tolerance', type=float, default=0.1,
+        help='rows/s drop ratio reported as regression (%(default)s)')
+    parser.add_argument(
+        'benchmarks', metavar='BENCHMARK', nargs='*',
+        help='benchmarks to run (all): {}'.format(
+            ', '.join(b.name for b in BENCHMARKS)))
+
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    args = parse_args(sys.argv[1:] if args is None else args)
+
+    benchmarks = [
+        b for b in BENCHMARKS
+        if not args.benchmarks or b.name in args.benchmarks]
+    results = run_benchmarks(benchmarks, args.rows, args.repeat)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+
+    report(results, baseline, sys.stdout)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(
+                dict(python=sys.version, rows=args.rows, results=results),
+                f, indent=2, sort_keys=True)
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        sys.stdout.write('REGRESSIONS: {}\n'.format(', '.join(regressions)))
+        return 1
+    return 0
@@ -0,0 +1,20 @@
+'''
+Read rows in blocks
+'''
+
+import itertools
+
+
+BLOCK_ROWS = 10000
+
+
+def read_blocks(reader, block_rows=BLOCK_ROWS):
+    '''
+    Iterator over lists of at most block_rows rows of reader
+    '''
+    reader = iter(reader)
+    while True:
+        rows = list(itertools.islice(reader, block_rows))
+        if not rows:
+            return
+        yield rows
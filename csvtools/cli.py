@@ -0,0 +1,67 @@
+'''
+Command line handling shared by the tools
+'''
+
+import os
+import sys
+import contextlib
+
+from csvtools.mapped_file import open_mapped
+from csvtools import stats
+
+
+STDIN = '-'
+
+BUFFER_SIZE = 1024 * 1024
+
+
+def add_input_argument(parser):
+    parser.add_argument(
+        '-i', '--input', dest='input_filename', default=STDIN,
+        help='input file, memory mapped (standard input)')
+
+
+def add_buffer_argument(parser):
+    parser.add_argument(
+        '--buffer-size', type=int, default=BUFFER_SIZE, metavar='BYTES',
+        help='size of output buffers (%(default)s)')
+
+
+def add_stats_argument(parser):
+    parser.add_argument(
+        '--stats', action='store_true', default=False,
+        help='write runtime statistics as JSON to standard error at exit'
+        ' (also enabled by the {} environment variable)'.format(
+            stats.ENVIRONMENT_VARIABLE))
+
+
+def stats_for(args, tool):
+    return stats.for_tool(tool, args.stats)
+
+
+@contextlib.contextmanager
+def input_file(filename):
+    '''
+    Context manager for the input file, standard input for None or -
+    '''
+    if filename in (None, STDIN):
+        yield sys.stdin
+    else:
+        f = open_mapped(filename)
+        try:
+            yield f
+        finally:
+            f.close()
+
+
+@contextlib.contextmanager
+def output_file(buffer_size=BUFFER_SIZE):
+    '''
+    Context manager for standard output with a buffer of buffer_size bytes
+    '''
+    sys.stdout.flush()
+    f = os.fdopen(os.dup(sys.stdout.fileno()), 'w', buffer_size)
+    try:
+        yield f
+    finally:
+        f.close()
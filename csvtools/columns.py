@@ -0,0 +1,173 @@
+'''
+Columnar store: the fields of a csv file in their own files
+
+A column store is a directory of column files - single field csv files
+with the values of a field, one per row - and a manifest (manifest.json)
+with the field names, their column files and the number of rows.
+The manifest is written last: a directory without it is incomplete.
+
+Reading only the columns needed avoids parsing the rest of the fields.
+'''
+
+import os
+import csv
+import json
+import itertools
+
+from csvtools.lib import Header
+from csvtools.exceptions import DuplicateFieldError, MissingFieldError
+from csvtools.blocks import read_blocks
+
+
+MANIFEST = 'manifest.json'
+FORMAT = 1
+# per column, as there might be hundreds of columns open
+COLUMN_BUFFER_SIZE = 64 * 1024
+BLOCK_ROWS = 10000
+# as written by csv.writer
+LINE_TERMINATOR = '\r\n'
+# values with these - or empty values - are quoted by csv.writer
+SPECIAL_CHARS = ',"\r\n'
+
+
+class BadInput(Exception):
+    pass
+
+
+def is_column_store(path):
+    return os.path.isfile(os.path.join(path, MANIFEST))
+
+
+def column_filename(index):
+    return '{:05d}.csv'.format(index)
+
+
+def write_column(f, writer, values):
+    '''
+    Write values as single field rows
+    '''
+    all_values = ''.join(values)
+    needs_quoting = (
+        '' in values or any(char in all_values for char in SPECIAL_CHARS))
+    if needs_quoting:
+        writer.writerows(itertools.izip(values))
+    else:
+        # the same as written by writer, without a call per value
+        f.write(LINE_TERMINATOR.join(values) + LINE_TERMINATOR)
+
+
+def write_columns(reader, directory):
+    '''
+    Store the rows of reader in directory as columns.
+
+    Returns the number of rows stored.
+    '''
+    ireader = iter(reader)
+    header = ireader.next()
+    if len(set(header)) != len(header):
+        raise DuplicateFieldError(
+            set(field for field in header if header.count(field) > 1))
+
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    manifest_filename = os.path.join(directory, MANIFEST)
+    if os.path.exists(manifest_filename):
+        os.remove(manifest_filename)
+
+    filenames = [column_filename(i) for i in range(len(header))]
+    files = []
+    try:
+        for filename in filenames:
+            files.append(
+                open(
+                    os.path.join(directory, filename), 'wb',
+                    COLUMN_BUFFER_SIZE))
+        writers = [csv.writer(f) for f in files]
+
+        rows = 0
+        for block in read_blocks(ireader, BLOCK_ROWS):
+            for i, row in enumerate(block):
+                if len(row) != len(header):
+                    raise BadInput(
+                        'row {} has {} fields instead of {}'.format(
+                            rows + i + 1, len(row), len(header)))
+            for f, writer, column in itertools.izip(
+                    files, writers, zip(*block)):
+                write_column(f, writer, column)
+            rows += len(block)
+    finally:
+        for f in files:
+            f.close()
+
+    temp_filename = manifest_filename + '.tmp'
+    with open(temp_filename, 'w') as f:
+        json.dump(
+            dict(format=FORMAT, fields=header, files=filenames, rows=rows),
+            f, indent=1)
+    os.rename(temp_filename, manifest_filename)
+    return rows
+
+
+class ColumnStore(object):
+
+    '''
+    Column store in directory
+    '''
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST)) as f:
+            manifest = json.load(f)
+        if manifest.get('format') != FORMAT:
+            raise BadInput(
+                'unknown column store format: {}'.format(
+                    manifest.get('format')))
+        # utf-8 encoded field names, like those read by csv
+        self.fields = [field.encode('utf-8') for field in manifest['fields']]
+        self.files = manifest['files']
+        self.rows = manifest['rows']
+        self.header = Header(self.fields)
+
+    def reader(self, fields=None):
+        '''
+        Iterator over rows of fields (all by default), the header first
+        '''
+        if fields is None:
+            fields = self.fields
+        missing = set(fields) - set(self.fields)
+        if missing:
+            raise MissingFieldError(missing)
+
+        yield list(fields)
+
+        files = [
+            open(os.path.join(self.directory, self.files[index]), 'rb')
+            for index in self.header.indices(fields)]
+        try:
+            columns = [
+                itertools.imap(''.join, csv.reader(f)) for f in files]
+            for row in itertools.izip(*columns):
+                yield list(row)
+        finally:
+            for f in files:
+                f.close()
+
+
+def needed_fields(transformer, fields):
+    '''
+    Input fields needed by transformer from fields, all if unknown
+    '''
+    transformer.bind(fields)
+    indices = transformer.indices
+    if indices is None or None in indices:
+        return list(fields)
+    return [fields[index] for index in sorted(set(indices))]
+
+
+def transform(transformer, store, stats, writer):
+    '''
+    Transform the rows of store with transformer to writer,
+    reading only the columns needed.
+    '''
+    fields = needed_fields(transformer, store.fields)
+    transformer.process(stats.reader(store.reader(fields)), writer)
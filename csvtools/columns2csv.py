@@ -0,0 +1,42 @@
+'''
+Write the rows of a column store as csv
+
+Usage:
+columns2csv [--fields FIELDS] directory
+'''
+
+import csv
+import sys
+
+import argparse
+from csvtools import cli, columns
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+        description='convert a directory of column files to csv')
+
+    cli.add_stats_argument(parser)
+    cli.add_buffer_argument(parser)
+    parser.add_argument(
+        '--fields', type=lambda fields: fields.split(','), default=None,
+        help='comma separated names of the fields to output (all)')
+    parser.add_argument(
+        'directory', metavar='DIRECTORY',
+        help='column store directory')
+
+    return parser.parse_args(args)
+
+
+def main():
+    args = parse_args(sys.argv[1:])
+    stats = cli.stats_for(args, 'columns2csv')
+
+    store = columns.ColumnStore(args.directory)
+    with cli.output_file(args.buffer_size) as output_file:
+        writer = stats.writer(csv.writer(stats.output_file(output_file)))
+        writer.writerows(stats.reader(store.reader(args.fields)))
+
+
+if __name__ == '__main__':
+    main()
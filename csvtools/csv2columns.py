@@ -0,0 +1,38 @@
+'''
+Store csv input as a column store: every field in its own file
+
+Usage:
+csv2columns [--input FILE] directory
+'''
+
+import csv
+import sys
+
+import argparse
+from csvtools import cli, columns
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+        description='store csv as a directory of column files')
+
+    cli.add_input_argument(parser)
+    cli.add_stats_argument(parser)
+    parser.add_argument(
+        'directory', metavar='DIRECTORY',
+        help='column store directory, created if it does not exist')
+
+    return parser.parse_args(args)
+
+
+def main():
+    args = parse_args(sys.argv[1:])
+    stats = cli.stats_for(args, 'csv2columns')
+
+    with cli.input_file(args.input_filename) as input_file:
+        reader = stats.reader(csv.reader(stats.input_file(input_file)))
+        columns.write_columns(reader, args.directory)
+
+
+if __name__ == '__main__':
+    main()
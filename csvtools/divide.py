@@ -0,0 +1,154 @@
+'''
+Divide csv input into the given number of files of about equal size
+
+Usage:
+divide [--input FILE] [--round-robin] PREFIX COUNT
+
+Output files are PREFIX0, PREFIX1, ..., each having the header of the input.
+
+A regular input file is divided into byte ranges of about equal size,
+cut at record boundaries: the data is copied without parsing, and the
+outputs are contiguous parts of the input.
+Streams (and regular files with --round-robin) are parsed and their rows
+are distributed round robin, so the numbers of rows in the outputs differ
+by at most one: output i has the rows i, i + COUNT, i + 2 * COUNT, ...
+
+There is no counting pass over the input in either case.
+
+weave puts the outputs back together: weave --concatenate the byte
+ranges, weave the rows distributed round robin.
+'''
+
+import csv
+import sys
+import mmap
+import itertools
+
+import argparse
+from csvtools import cli
+from csvtools.blocks import read_blocks
+from csvtools.mapped_file import is_mappable
+from csvtools.records import count_quotes, find_record_start
+from csvtools.stats import NoStats
+
+
+# rows distributed to an output at once
+BATCH_ROWS = 1000
+# bytes copied at once
+COPY_SIZE = 1 << 20
+
+
+def output_filenames(prefix, count):
+    return [prefix + str(i) for i in range(count)]
+
+
+def record_boundaries(data, start, count):
+    '''
+    Offsets dividing data[start:] into count parts of whole records,
+    of about equal size - the first offset is start, the last is len(data)
+    '''
+    end = len(data)
+    boundaries = [start]
+    for i in range(1, count):
+        previous = boundaries[-1]
+        cut = start + (end - start) * i // count
+        if cut <= previous:
+            # the previous part is longer because of a long record
+            boundaries.append(previous)
+            continue
+        in_quotes = count_quotes(data, previous, cut) % 2 == 1
+        boundaries.append(find_record_start(data, cut, in_quotes))
+    boundaries.append(end)
+    return boundaries
+
+
+def divide_file(input_file, prefix, count, stats=None, buffer_size=-1):
+    '''
+    Divide regular input_file into count byte ranges of whole records.
+    '''
+    stats = stats or NoStats()
+    # input might be partially consumed already
+    start = input_file.tell()
+    data = mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        header_end = find_record_start(data, start)
+        header = data[start:header_end]
+        boundaries = record_boundaries(data, header_end, count)
+
+        filenames = output_filenames(prefix, count)
+        for i, filename in enumerate(filenames):
+            with open(filename, 'wb', buffer_size) as f:
+                output = stats.output_file(f)
+                output.write(header)
+                end = boundaries[i + 1]
+                for offset in xrange(boundaries[i], end, COPY_SIZE):
+                    output.write(data[offset:min(offset + COPY_SIZE, end)])
+    finally:
+        data.close()
+
+
+def divide_stream(reader, prefix, count, stats=None, buffer_size=-1):
+    '''
+    Distribute the rows of reader round robin into count files.
+    '''
+    stats = stats or NoStats()
+    reader = iter(reader)
+    header = next(reader, None)
+
+    files = []
+    try:
+        for filename in output_filenames(prefix, count):
+            files.append(open(filename, 'wb', buffer_size))
+        if header is None:
+            return
+        writers = [
+            stats.writer(csv.writer(stats.output_file(f))) for f in files]
+        for writer in writers:
+            writer.writerow(header)
+
+        for rows in read_blocks(reader, BATCH_ROWS * count):
+            for i, writer in enumerate(writers):
+                writer.writerows(itertools.islice(rows, i, None, count))
+    finally:
+        for f in files:
+            f.close()
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser()
+
+    cli.add_input_argument(parser)
+    cli.add_stats_argument(parser)
+    cli.add_buffer_argument(parser)
+    parser.add_argument(
+        '--round-robin', action='store_true', default=False,
+        help='distribute rows round robin also for regular input files')
+    parser.add_argument(
+        'prefix', metavar='PREFIX',
+        help='output file prefix, output files are PREFIX0, PREFIX1, ...')
+    parser.add_argument(
+        'count', metavar='COUNT', type=int,
+        help='number of output files')
+
+    args = parser.parse_args(args)
+    if args.count < 1:
+        parser.error('COUNT must be positive')
+    return args
+
+
+def main():
+    args = parse_args(sys.argv[1:])
+    stats = cli.stats_for(args, 'divide')
+
+    with cli.input_file(args.input_filename) as input_file:
+        if not args.round_robin and is_mappable(input_file):
+            divide_file(
+                input_file, args.prefix, args.count, stats, args.buffer_size)
+        else:
+            reader = stats.reader(csv.reader(stats.input_file(input_file)))
+            divide_stream(
+                reader, args.prefix, args.count, stats, args.buffer_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,7 +2,9 @@
 Replace a set of fields with a reference to map.csv file rows
 
 Usage:
-extract_map entity_fields_spec ref_field_spec map.csv
+extract_map [--input FILE] [--index]
+    entity_fields_spec ref_field_spec map.csv
+    [entity_fields_spec ref_field_spec map.csv [...]]
 
 Technically:
 - read original map from map.csv if that file exists
@@ -10,18 +12,51 @@ Technically:
 - append input side of ref_field_spec to input
 - append new mappings to map.csv
 
+Multiple entities are extracted in a single pass, when more than one
+entity_fields_spec ref_field_spec map.csv triple is given:
+their reference fields are appended in the given order.
+
+With --index a persistent index of map.csv is kept in map.csv.index,
+so that only mappings appended since its last update are read.
+
+With --compact mappings are kept in a memory compact table,
+which spills to disk above --memory-limit.
+
+New mappings are written in batches, before the output rows referring
+to them. With --journal they are also committed durably,
+see csvtools.map_journal.
+
+With --shared multiple processes can extract to the same map files
+concurrently, see csvtools.shared_map.
+
+With --jobs N mappings are sharded across N processes,
+see csvtools.sharded_map.
+
 '''
 
 import os.path
 import sys
-from csvtools.lib import FieldsMap, Header, list_extractor, tuple_extractor
+import itertools
+import argparse
+from csvtools.lib import FieldsMap, Header, projection
 from csvtools.exceptions import MissingFieldError
 from csvtools.exceptions import ExtraFieldError
 from csvtools.exceptions import InvalidReferenceFieldError
+from csvtools import cli
+from csvtools.rawlines import read_record, parse_records
+from csvtools.map_index import MapIndex, index_filename, SUFFIX
+from csvtools.ref_table import CompactRefTable
+from csvtools.map_journal import Journal, JournaledWriter
+from csvtools.map_journal import SUFFIX as JOURNAL_SUFFIX
+from csvtools.blocks import read_blocks
+from csvtools.shared_map import SharedMapFile, locked
 
 import csv
 
 
+BATCH_SIZE = 1000
+
+
 class Mapper(object):
 
     ''' Map attributes to entity reference number.
@@ -29,18 +64,47 @@ class Mapper(object):
     The mapping might be [partially] pre-existing, in this case
     it is extended if new values are mapped, or not yet existing,
     then it is created.
+
+    values_to_ref: mapping of value tuples to references
+        (e.g. a MapIndex), might contain mappings read before - see max_ref.
+        A new dict is used by default.
+    max_ref: largest reference in values_to_ref
+    batch_size: new mappings are written in batches of this size,
+        pending mappings are written by commit()
+    shared_map: SharedMapFile, if the map file is appended to by other
+        processes as well.
+        Pending mappings get provisional (negative) references then,
+        final references are allocated by commit() - see take_renumbered().
+        values_to_ref should be a dict in this case.
     '''
 
     @classmethod
-    def new(cls, ref_field, fields, appender):
+    def new(
+            cls, ref_field, fields, appender, values_to_ref=None,
+            batch_size=1, shared_map=None):
         header = [ref_field] + list(fields)
         appender.writerow(header)
-        return cls(ref_field, fields, [header], appender)
+        return cls(
+            ref_field, fields, [header], appender, values_to_ref=values_to_ref,
+            batch_size=batch_size, shared_map=shared_map)
 
-    def __init__(self, ref_field, fields, reader, appender):
+    existing_mappings = 0
+    new_mappings = 0
+
+    def __init__(
+            self, ref_field, fields, reader, appender,
+            values_to_ref=None, max_ref=0, batch_size=1, shared_map=None):
         self.appender = appender
-        self.max_ref = 0
-        self.values_to_ref = dict()
+        self.max_ref = max_ref
+        self.batch_size = batch_size
+        self.shared_map = shared_map
+        # (ref, values) of new mappings not yet written
+        self.pending = []
+        self.provisional_refs = 0
+        self.renumbered = dict()
+        if values_to_ref is None:
+            values_to_ref = dict()
+        self.values_to_ref = values_to_ref
         fields = list(fields)
         reader = iter(reader)
         header = Header(reader.next())
@@ -48,16 +112,14 @@ class Mapper(object):
         self._check_parameters(ref_field, fields, header)
 
         param_header = Header([ref_field] + fields)
-        self.to_entity_file_order = list_extractor(
-            param_header.extractors(header))
+        self.to_entity_file_order = projection(
+            param_header.indices(header), list)
 
-        def permutated_reader():
-            transform = list_extractor(
-                [header.extractor(ref_field)] + header.extractors(fields))
-            for row in reader:
-                yield transform(row)
+        self.from_entity_file_order = projection(
+            header.indices([ref_field] + fields))
 
-        self._read_existing_mappings(permutated_reader())
+        self._read_mappings(reader)
+        self.existing_mappings = len(self.values_to_ref)
 
     def _check_parameters(self, ref_field, fields, header):
         all_fields = set(fields).union(set([ref_field]))
@@ -72,8 +134,13 @@ class Mapper(object):
         if header_fields - all_fields:
             raise ExtraFieldError(header_fields - all_fields)
 
-    def _read_existing_mappings(self, reader):
-        for ref_and_values in reader:
+    def _read_mappings(self, reader):
+        '''
+        Add mappings from map file rows
+        '''
+        from_entity_file_order = self.from_entity_file_order
+        for row in reader:
+            ref_and_values = from_entity_file_order(row)
             ref = int(ref_and_values[0])
             values = tuple(ref_and_values[1:])
             self.max_ref = max(ref, self.max_ref)
@@ -84,82 +151,471 @@ class Mapper(object):
         ''' Map attributes to entity reference number.
 
         Multiple calls for same values will return the same reference.
-        New values and their assigned references are persisted.
+        New values and their assigned references are persisted
+        - in batches of .batch_size, see commit().
         '''
         ref = self.values_to_ref.get(values)
 
         if ref is None:
-            self.max_ref += 1
-            ref = self.max_ref
+            if self.shared_map is None:
+                self.max_ref += 1
+                self.new_mappings += 1
+                ref = self.max_ref
+            else:
+                self.provisional_refs += 1
+                ref = -self.provisional_refs
             self.values_to_ref[values] = ref
-            new_mapping = self.to_entity_file_order((ref,) + tuple(values))
-            self.appender.writerow(new_mapping)
+            self.pending.append((ref, values))
+            if len(self.pending) >= self.batch_size:
+                self.commit()
+                if ref < 0:
+                    ref = self.renumbered.pop(ref)
 
         return ref
 
+    def commit(self):
+        ''' Write pending new mappings.
+        '''
+        if not self.pending:
+            return
+
+        if self.shared_map is None:
+            to_entity_file_order = self.to_entity_file_order
+            self.appender.writerows(
+                to_entity_file_order((ref,) + tuple(values))
+                for ref, values in self.pending)
+        else:
+            self._commit_shared()
+        self.pending = []
+
+    def _commit_shared(self):
+        values_to_ref = self.values_to_ref
+        # forget provisional references
+        for _, values in self.pending:
+            del values_to_ref[values]
+
+        with self.shared_map.appending() as new_rows:
+            # mappings appended by other processes
+            self._read_mappings(new_rows)
+
+            new_mappings = []
+            for provisional_ref, values in self.pending:
+                ref = values_to_ref.get(values)
+                if ref is None:
+                    self.max_ref += 1
+                    self.new_mappings += 1
+                    ref = self.max_ref
+                    values_to_ref[values] = ref
+                    new_mappings.append(
+                        self.to_entity_file_order((ref,) + tuple(values)))
+                self.renumbered[provisional_ref] = ref
+            self.appender.writerows(new_mappings)
+
+    def take_renumbered(self):
+        '''
+        Final references of provisional ones committed since last call
+        '''
+        renumbered = self.renumbered
+        self.renumbered = dict()
+        return renumbered
+
 
 class EntityExtractor(object):
 
     ''' Extract entities and replace them with entity references.
 
     Optionally remove/keep entity attributes.
+
+    batch_size: input rows are processed in batches of this size,
+        new mappings of a batch are written before its output rows
     '''
 
-    def __init__(self, ref_field_map, fields_map, keep_fields):
+    def __init__(self, ref_field_map, fields_map, keep_fields, batch_size=1):
         self.ref_field_map = ref_field_map
         self.fields_map = fields_map
+        self.batch_size = batch_size
         self.mapper = None
 
-    def use_new_mapper(self, appender):
+    @property
+    def mapper_fields(self):
+        '''
+        Reference field and entity fields in the map
+        '''
+        return (
+            tuple(self.ref_field_map.output_fields[:1]) +
+            tuple(self.fields_map.output_fields))
+
+    def use_new_mapper(self, appender, values_to_ref=None, shared_map=None):
         self.mapper = Mapper.new(
             self.ref_field_map.output_fields[0],
             self.fields_map.output_fields,
-            appender)
-
-    def use_existing_mapper(self, reader, appender):
+            appender,
+            values_to_ref=values_to_ref,
+            batch_size=self.batch_size,
+            shared_map=shared_map)
+
+    def use_existing_mapper(
+            self, reader, appender, values_to_ref=None, max_ref=0,
+            shared_map=None):
         self.mapper = Mapper(
             self.ref_field_map.output_fields[0],
             self.fields_map.output_fields,
             reader,
-            appender)
+            appender,
+            values_to_ref=values_to_ref,
+            max_ref=max_ref,
+            batch_size=self.batch_size,
+            shared_map=shared_map)
 
     def extract(self, reader, writer):
+        writer.writerows(self.rows(reader))
+
+    def rows(self, reader):
+        '''
+        Iterator over output rows - the first one is the output header
+        '''
         ireader = iter(reader)
         input_header = Header(ireader.next())
 
-        extract_entity = tuple_extractor(
-            input_header.extractors(self.fields_map.input_fields))
+        extract_entity = projection(
+            input_header.indices(self.fields_map.input_fields))
+        # tuples of strings are untracked by the garbage collector:
+        # holding a batch of them does not make collections slow,
+        # output rows are lists
+        copy_row = projection(range(len(input_header)))
+        map_entity = self.mapper.map
 
-        def entity_ref(row):
-            return self.mapper.map(extract_entity(row))
+        def transform(row):
+            return copy_row(row) + (map_entity(extract_entity(row)),)
 
-        transform = list_extractor(
-            input_header.extractors(input_header) + [entity_ref])
         output_header = (
             list(input_header) + list(self.ref_field_map.input_fields))
 
-        writer.writerow(output_header)
-        writer.writerows(transform(row) for row in ireader)
+        if self.batch_size <= 1:
+            return itertools.chain(
+                [output_header],
+                itertools.imap(list, itertools.imap(transform, ireader)))
+        return itertools.chain(
+            [output_header], self._batched_rows(ireader, transform))
+
+    def _batched_rows(self, reader, transform):
+        mapper = self.mapper
+        # input rows are not kept
+        output_blocks = read_blocks(
+            itertools.imap(transform, reader), self.batch_size)
+        for output_rows in output_blocks:
+            # references in output rows should be already in the map
+            mapper.commit()
+            renumbered = mapper.take_renumbered()
+            if renumbered:
+                output_rows = [
+                    row[:-1] + (renumbered.get(row[-1], row[-1]),)
+                    for row in output_rows]
+            for row in output_rows:
+                yield list(row)
+
+
+class IndexedMapFile(object):
 
+    '''
+    Map file with its index, the index is updated when closed.
 
-def main():
-    reader = csv.reader(sys.stdin)
-    writer = csv.writer(sys.stdout)
-    entity_fields, ref_field, entity_file = sys.argv[1:]
+    When closed on an error, the index is not updated:
+    mappings written since opening will be read from the map file
+    next time.
+    '''
 
-    extractor = EntityExtractor(
-        FieldsMap.parse(ref_field),
-        FieldsMap.parse(entity_fields),
-        keep_fields=True)
+    def __init__(self, f, index, mapper):
+        self.file = f
+        self.index = index
+        self.mapper = mapper
+
+    def close(self, commit=True):
+        try:
+            self.file.flush()
+            if commit:
+                self.index.commit(
+                    os.fstat(self.file.fileno()).st_size,
+                    self.mapper.max_ref)
+        finally:
+            self.index.close()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(commit=exc_type is None)
+
+
+def _use_indexed_mapper(extractor, f, appender, has_entity_file, index):
+    fields = extractor.mapper_fields
+
+    if not has_entity_file:
+        index.reset(fields)
+        extractor.use_new_mapper(appender, values_to_ref=index)
+        return
+
+    header_record = read_record(f)
+    header = parse_records(header_record).next()
+    if index.offset and index.matches(fields, os.fstat(f.fileno()).st_size):
+        f.seek(index.offset)
+    else:
+        index.reset(fields)
+
+    extractor.use_existing_mapper(
+        itertools.chain([header], csv.reader(f)), appender,
+        values_to_ref=index, max_ref=index.max_ref)
+
+
+def _open_shared_map_file(extractor, entity_file, buffer_size, journal):
+    f = open(entity_file, 'a+', buffer_size)
+    try:
+        with locked(f):
+            map_journal = Journal(entity_file)
+            map_journal.recover()
+            has_entity_file = os.fstat(f.fileno()).st_size > 0
+            if journal:
+                appender = JournaledWriter(f, map_journal)
+                if has_entity_file:
+                    map_journal.commit(f)
+            else:
+                map_journal.remove()
+                appender = csv.writer(f)
+
+            shared_map = SharedMapFile(f)
+            if has_entity_file:
+                extractor.use_existing_mapper(
+                    csv.reader(f), appender, shared_map=shared_map)
+            else:
+                extractor.use_new_mapper(appender, shared_map=shared_map)
+            f.flush()
+            shared_map.read_to_end()
+    except:
+        f.close()
+        raise
+    return f
+
+
+def open_map_file(
+        extractor, entity_file, buffer_size=-1, index=False,
+        values_to_ref=None, journal=False, shared=False):
+    '''
+    Open entity_file as the map of extractor.
+
+    index: use and update a persistent index of entity_file
+    values_to_ref: mapping for Mapper, when not using an index
+    journal: commit new mappings durably, see csvtools.map_journal
+    shared: the map file is used by concurrent processes,
+        see csvtools.shared_map - index and values_to_ref are not used
+
+    Mappings written, but not committed by a journaled run are removed.
+
+    Returns the open file, it should be closed after extraction.
+    '''
+    if shared:
+        return _open_shared_map_file(
+            extractor, entity_file, buffer_size, journal)
 
+    map_journal = Journal(entity_file)
+    map_journal.recover()
     has_entity_file = os.path.exists(entity_file)
 
-    with open(entity_file, 'a+') as f:
+    f = open(entity_file, 'a+', buffer_size)
+    if journal:
+        appender = JournaledWriter(f, map_journal)
+        if has_entity_file:
+            map_journal.commit(f)
+    else:
+        map_journal.remove()
+        appender = csv.writer(f)
+
+    if not index:
         if has_entity_file:
-            extractor.use_existing_mapper(csv.reader(f), csv.writer(f))
+            extractor.use_existing_mapper(
+                csv.reader(f), appender, values_to_ref=values_to_ref)
         else:
-            extractor.use_new_mapper(csv.writer(f))
-        extractor.extract(reader, writer)
+            extractor.use_new_mapper(appender, values_to_ref=values_to_ref)
+        return f
+
+    map_index = MapIndex(index_filename(entity_file))
+    try:
+        _use_indexed_mapper(
+            extractor, f, appender, has_entity_file, map_index)
+    except:
+        map_index.close()
+        f.close()
+        raise
+    return IndexedMapFile(f, map_index, extractor.mapper)
+
+
+class BadEntitySpecs(Exception):
+    '''Entity specs are not triples of distinct map files'''
+
+
+def entity_specs(args):
+    '''
+    List of (entity_fields, ref_field, entity_file) triples in args
+    '''
+    if not args or len(args) % 3:
+        raise BadEntitySpecs(args)
+    specs = zip(args[0::3], args[1::3], args[2::3])
+    entity_files = [entity_file for _, _, entity_file in specs]
+    if len(set(entity_files)) != len(entity_files):
+        raise BadEntitySpecs('map file given more than once')
+    return specs
+
+
+def new_extractor(entity_fields, ref_field, batch_size=1):
+    return EntityExtractor(
+        FieldsMap.parse(ref_field),
+        FieldsMap.parse(entity_fields),
+        keep_fields=True,
+        batch_size=batch_size)
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser()
+
+    cli.add_input_argument(parser)
+    cli.add_stats_argument(parser)
+    cli.add_buffer_argument(parser)
+    parser.add_argument(
+        '--index', action='store_true', default=False,
+        help='keep a persistent index of the map in MAP_CSV{}'.format(
+            SUFFIX))
+    parser.add_argument(
+        '--compact', action='store_true', default=False,
+        help='keep mappings in a memory compact table (ignored with --index)')
+    parser.add_argument(
+        '--memory-limit', type=int, default=None, metavar='MB',
+        help='with --compact: spill mappings to disk above MB megabytes')
+    parser.add_argument(
+        '--batch-size', type=int, default=BATCH_SIZE, metavar='ROWS',
+        help='write new mappings after every ROWS input rows,'
+        ' before their output rows (%(default)s)')
+    parser.add_argument(
+        '--journal', action='store_true', default=False,
+        help='fsync new mappings and record the committed map size in'
+        ' MAP_CSV{}, uncommitted mappings are removed on the next run'.format(
+            JOURNAL_SUFFIX))
+    parser.add_argument(
+        '--shared', action='store_true', default=False,
+        help='map files are appended to by concurrent processes'
+        ' (lock them while appending)')
+    parser.add_argument(
+        '--jobs', type=int, default=1,
+        help='number of processes to shard mappings to (%(default)s)')
+    parser.add_argument(
+        'entity_specs', nargs='+',
+        metavar='ENTITY_FIELDS_SPEC REF_FIELD_SPEC MAP_CSV',
+        help='fields to extract: [map_field=]input_field,...;'
+        ' reference field: map_field=output_field;'
+        ' map file, created if does not exist')
+
+    args = parser.parse_args(args)
+    try:
+        args.entity_specs = entity_specs(args.entity_specs)
+    except BadEntitySpecs as e:
+        parser.error(
+            'expected ENTITY_FIELDS_SPEC REF_FIELD_SPEC MAP_CSV triples'
+            ' with distinct map files: {}'.format(e))
+    if args.jobs > 1 and (
+            args.index or args.compact or args.journal or args.shared):
+        parser.error(
+            '--jobs can not be used with'
+            ' --index, --compact, --journal or --shared')
+    if args.shared and (args.index or args.compact):
+        parser.error('--shared can not be used with --index or --compact')
+    return args
+
+
+def open_extractors(args, buffer_size, map_files, tables):
+    '''
+    Extractors of args.entity_specs with their map files opened
+    as given by args.
+
+    Opened map files are appended to map_files, they are to be closed
+    by their __exit__, not to update their index on error.
+    Compact tables are appended to tables, to be closed after them.
+    '''
+    memory_limit = args.memory_limit
+    if memory_limit is not None:
+        memory_limit *= 1024 * 1024
+
+    extractors = []
+    for entity_fields, ref_field, entity_file in args.entity_specs:
+        extractor = new_extractor(entity_fields, ref_field, args.batch_size)
+        values_to_ref = None
+        if args.compact and not args.index:
+            values_to_ref = CompactRefTable(memory_limit)
+            tables.append(values_to_ref)
+        map_files.append(
+            open_map_file(
+                extractor, entity_file, buffer_size,
+                index=args.index, values_to_ref=values_to_ref,
+                journal=args.journal, shared=args.shared))
+        extractors.append(extractor)
+    return extractors
+
+
+def extract_sharded(args, stats):
+    # sharded_map depends on this module
+    from csvtools import sharded_map
+
+    with cli.input_file(args.input_filename) as input_file:
+        with cli.output_file(args.buffer_size) as output_file:
+            maps, rows = sharded_map.extract(
+                args.entity_specs,
+                stats.input_file(input_file),
+                stats.output_file(output_file),
+                args.jobs, args.buffer_size)
+
+    # + header
+    stats.count('rows_read', rows + 1)
+    stats.count('rows_written', rows + 1)
+    for map_ in maps:
+        stats.count('existing_mappings', map_.existing_mappings)
+        stats.count('new_mappings', map_.new_mappings)
+
+
+def main():
+    args = parse_args(sys.argv[1:])
+    stats = cli.stats_for(args, 'extract_map')
+    if args.jobs > 1:
+        extract_sharded(args, stats)
+        return
+
+    extractors = []
+    tables = []
+    map_files = []
+    # map files are closed as context managers: the index is not updated
+    # on error
+    exc_info = (None, None, None)
+    try:
+        with cli.input_file(args.input_filename) as input_file:
+            extractors = open_extractors(
+                args, args.buffer_size, map_files, tables)
+
+            with cli.output_file(args.buffer_size) as output_file:
+                rows = stats.reader(csv.reader(stats.input_file(input_file)))
+                for extractor in extractors:
+                    rows = extractor.rows(rows)
+                writer = stats.writer(
+                    csv.writer(stats.output_file(output_file)))
+                writer.writerows(rows)
+    except:
+        exc_info = sys.exc_info()
+        raise
+    finally:
+        for map_file in reversed(map_files):
+            map_file.__exit__(*exc_info)
+        for table in tables:
+            table.close()
+
+    for extractor in extractors:
+        stats.count('existing_mappings', extractor.mapper.existing_mappings)
+        stats.count('new_mappings', extractor.mapper.new_mappings)
 
 
 if __name__ == '__main__':
@@ -1,5 +1,7 @@
 class Field(object):
 
+    index = None
+
     def bind(self, header_row):
         pass
 
@@ -19,8 +21,6 @@ def make_index_extractor(index):
 
 class NamedField(Field):
 
-    index = None
-
     def __init__(self, name):
         self.name = name
 
@@ -37,3 +37,12 @@ class NamedField(Field):
             return None_extractor
 
         return make_index_extractor(self.index)
+
+
+def is_index_field(field):
+    '''
+    True if the value of bound field is the item at field.index in the row
+    '''
+    return (
+        isinstance(field, NamedField) and
+        type(field).value_extractor is NamedField.value_extractor)
@@ -0,0 +1,313 @@
+'''
+Replace a reference field with the fields of the referenced map.csv rows
+- the inverse of extract_map
+
+Usage:
+inflate_map [--input FILE] [--keep-ref] [--on-disk]
+    entity_fields_spec ref_field_spec map.csv
+
+The specs are the same as for extract_map:
+- entity_fields_spec: output fields and the map fields they are read from:
+  [map_field=]output_field,...
+- ref_field_spec: map_field=input_field - the reference field
+
+The entity fields are appended to the input, the reference field is
+removed, unless --keep-ref is given.
+The map is loaded before processing the input, it can not be extracted
+by an earlier stage of the same pipeline.
+
+References are dense, so the map rows are found by reference in arrays
+of offsets into the memory mapped map file (read into memory, if it can not
+be mapped): rows are split - or parsed, if quoted - when looked up.
+With --on-disk only the start offsets of map rows are kept in memory,
+and every row is parsed by the csv module.
+'''
+
+import sys
+import csv
+import array
+import argparse
+from cStringIO import StringIO
+
+from csvtools.lib import FieldsMap, Header, projection
+from csvtools.exceptions import MissingFieldError
+from csvtools.mapped_file import MappedFile, is_mappable
+from csvtools.rawlines import read_record, read_blocks, parse_records
+from csvtools.rawlines import is_raw, DELIMITER
+from csvtools.records import QUOTE
+from csvtools import cli
+
+
+# C long offsets
+OFFSET_TYPE = 'l'
+LINE_END = '\r\n'
+
+
+class UnknownReferenceError(Exception):
+    '''Reference not found in map'''
+
+
+def _split(record):
+    '''
+    Fields of a single record without line end
+    '''
+    if QUOTE in record or '\r' in record:
+        return parse_records(record).next()
+    return record.split(DELIMITER)
+
+
+def _map_header(reader, ref_field, fields):
+    try:
+        header = Header(reader.next())
+    except StopIteration:
+        # empty map file, no header
+        header = Header([])
+    missing = set([ref_field]).union(fields) - set(header)
+    if missing:
+        raise MissingFieldError(missing)
+    return header
+
+
+class StringData(object):
+
+    '''
+    The parts of the MappedFile interface used by the tables
+    over a string
+    '''
+
+    def __init__(self, data):
+        self.mapping = data
+        stream = StringIO(data)
+        self.readline = stream.readline
+        self.readlines = stream.readlines
+        self.seek = stream.seek
+        self.tell = stream.tell
+        self.close = stream.close
+
+
+def _map_data(map_file):
+    '''
+    File like object over the contents of map_file,
+    its .mapping can be sliced
+    '''
+    if is_mappable(map_file):
+        return MappedFile(map_file)
+    # e.g. empty files can not be mapped
+    return StringData(map_file.read())
+
+
+def _records(data):
+    '''
+    (offset, record) pairs of the records in data from its position on
+    '''
+    offset = data.tell()
+    for block in read_blocks(data):
+        if is_raw(block):
+            lines = block.split('\n')
+            if block.endswith('\n'):
+                lines.pop()
+            for line in lines:
+                yield offset, line
+                offset += len(line) + 1
+        else:
+            records = StringIO(block)
+            for record in iter(lambda: read_record(records), ''):
+                yield offset, record
+                offset += len(record)
+
+
+def _grow(offsets, ref):
+    if ref >= len(offsets):
+        offsets.extend(
+            array.array(OFFSET_TYPE, [0]) *
+            (max(ref + 1, 2 * len(offsets)) - len(offsets)))
+
+
+class RefTable(object):
+
+    '''
+    Start and end offsets of map rows - without line end - in arrays
+    indexed by reference, the rows are sliced from the map file contents
+    '''
+
+    def __init__(self, ref_field, fields, map_file):
+        self.data = _map_data(map_file)
+        header = _map_header(
+            parse_records(read_record(self.data)), ref_field, fields)
+        self.extract_values = projection(header.indices(fields))
+
+        # 0 is the offset of the header: no map row
+        self.starts = array.array(OFFSET_TYPE)
+        self.ends = array.array(OFFSET_TYPE)
+        self._read_offsets(header.index(ref_field))
+
+    def _read_offsets(self, ref_index):
+        starts, ends = self.starts, self.ends
+        for start, record in _records(self.data):
+            record = record.rstrip(LINE_END)
+            ref = int(_split(record)[ref_index])
+            _grow(starts, ref)
+            _grow(ends, ref)
+            starts[ref] = start
+            ends[ref] = start + len(record)
+
+    def get(self, ref):
+        start = self.starts[ref] if 0 < ref < len(self.starts) else 0
+        if not start:
+            raise UnknownReferenceError(ref)
+        return self.extract_values(
+            _split(self.data.mapping[start:self.ends[ref]]))
+
+    def close(self):
+        self.data.close()
+
+
+class MappedRefTable(RefTable):
+
+    '''
+    Start offsets of map rows in an array indexed by reference,
+    the rows are read from the map file contents and parsed when looked up
+    '''
+
+    def _read_offsets(self, ref_index):
+        starts = self.starts
+        for start, record in _records(self.data):
+            ref = int(_split(record.rstrip(LINE_END))[ref_index])
+            _grow(starts, ref)
+            starts[ref] = start
+
+    def get(self, ref):
+        start = self.starts[ref] if 0 < ref < len(self.starts) else 0
+        if not start:
+            raise UnknownReferenceError(ref)
+        self.data.seek(start)
+        return self.extract_values(
+            parse_records(read_record(self.data)).next())
+
+
+class MapInflater(object):
+
+    '''
+    Replace a reference field with entity fields from a map.
+    '''
+
+    def __init__(self, ref_field_map, fields_map, keep_ref=False):
+        self.ref_field_map = ref_field_map
+        self.fields_map = fields_map
+        self.keep_ref = keep_ref
+        self.table = None
+
+    @property
+    def map_ref_field(self):
+        return self.ref_field_map.output_fields[0]
+
+    @property
+    def map_fields(self):
+        return self.fields_map.input_fields
+
+    def use_table(self, table):
+        self.table = table
+
+    def rows(self, reader):
+        '''
+        Iterator over output rows - the first one is the output header
+        '''
+        ireader = iter(reader)
+        input_header = Header(ireader.next())
+        ref_field = self.ref_field_map.input_fields[0]
+        ref_index = input_header.index(ref_field)
+
+        kept_indices = [
+            i for i, field in enumerate(input_header)
+            if self.keep_ref or field != ref_field]
+        copy_row = projection(kept_indices, list)
+        get_values = self.table.get
+
+        yield (
+            [input_header.fields_list[i] for i in kept_indices] +
+            list(self.fields_map.output_fields))
+        for row in ireader:
+            output = copy_row(row)
+            output.extend(get_values(int(row[ref_index])))
+            yield output
+
+    def process(self, reader, writer):
+        writer.writerows(self.rows(reader))
+
+
+def new_inflater(entity_fields, ref_field, keep_ref=False):
+    '''
+    MapInflater from extract_map style specs
+    '''
+    # entity fields spec is [map_field=]output_field
+    fields_map = FieldsMap([
+        (output_field, map_field)
+        for map_field, output_field in FieldsMap.parse(entity_fields)])
+    return MapInflater(
+        FieldsMap.parse(ref_field), fields_map, keep_ref=keep_ref)
+
+
+def open_table(inflater, map_filename, on_disk=False):
+    '''
+    Load the map of inflater from map_filename.
+
+    Returns the table, it should be closed after use.
+    '''
+    with open(map_filename, 'rb') as f:
+        if on_disk:
+            table = MappedRefTable(
+                inflater.map_ref_field, inflater.map_fields, f)
+        else:
+            table = RefTable(inflater.map_ref_field, inflater.map_fields, f)
+    inflater.use_table(table)
+    return table
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser()
+
+    cli.add_input_argument(parser)
+    cli.add_stats_argument(parser)
+    cli.add_buffer_argument(parser)
+    parser.add_argument(
+        '--keep-ref', action='store_true', default=False,
+        help='keep the reference field in output')
+    parser.add_argument(
+        '--on-disk', action='store_true', default=False,
+        help='keep only offsets of map rows in memory,'
+        ' read the rows from the memory mapped map file')
+    parser.add_argument(
+        'entity_fields', metavar='ENTITY_FIELDS_SPEC',
+        help='fields to add: [map_field=]output_field,...')
+    parser.add_argument(
+        'ref_field', metavar='REF_FIELD_SPEC',
+        help='reference field: map_field=input_field')
+    parser.add_argument(
+        'entity_file', metavar='MAP_CSV',
+        help='map file')
+
+    return parser.parse_args(args)
+
+
+def main():
+    args = parse_args(sys.argv[1:])
+    stats = cli.stats_for(args, 'inflate_map')
+
+    inflater = new_inflater(
+        args.entity_fields, args.ref_field, keep_ref=args.keep_ref)
+    table = stats.timed('load_map', open_table)(
+        inflater, args.entity_file, args.on_disk)
+    try:
+        with cli.input_file(args.input_filename) as input_file:
+            with cli.output_file(args.buffer_size) as output_file:
+                reader = stats.reader(
+                    csv.reader(stats.input_file(input_file)))
+                writer = stats.writer(
+                    csv.writer(stats.output_file(output_file)))
+                inflater.process(reader, writer)
+    finally:
+        table.close()
+
+
+if __name__ == '__main__':
+    main()
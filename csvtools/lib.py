@@ -6,6 +6,9 @@ class Header(object):
 
     def __init__(self, header_row):
         self.fields_list = list(header_row)
+        self.index_by_name = dict(
+            (header_field, i)
+            for (i, header_field) in enumerate(self.fields_list))
         self.extractors_by_name = dict(
             (header_field, itemgetter(i))
             for (i, header_field) in enumerate(self.fields_list))
@@ -26,6 +29,51 @@ class Header(object):
     def extractors(self, field_names):
         return [self.extractors_by_name[name] for name in field_names]
 
+    def index(self, name):
+        return self.index_by_name[name]
+
+    def indices(self, field_names):
+        return [self.index_by_name[name] for name in field_names]
+
+
+def projection(indices, seq_type=tuple):
+    '''
+    Compile a single function extracting items at indices as a seq_type.
+
+    A None index extracts None.
+    The returned function does not call back to Python per item:
+    it is either a multi-index itemgetter or generated code
+    with constant indices.
+    '''
+    indices = tuple(indices)
+    if seq_type is tuple and len(indices) > 1 and None not in indices:
+        return itemgetter(*indices)
+
+    items = ''.join(
+        'None, ' if index is None else 'row[{:d}], '.format(index)
+        for index in indices)
+    template = {tuple: 'lambda row: ({})', list: 'lambda row: [{}]'}
+    return eval(template[seq_type].format(items))
+
+
+def numeric_value(value):
+    '''
+    value as a number, value itself if it is not a number.
+
+    In Python 2 numbers are less than strings,
+    so non-numbers sort after the numbers, in string order.
+    '''
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        number = float(value)
+    except ValueError:
+        return value
+    # NaN is not ordered
+    return number if number == number else value
+
 
 def list_extractor(item_extractors):
     _item_extractors = tuple(item_extractors)
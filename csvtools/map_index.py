@@ -0,0 +1,141 @@
+'''
+Persistent index of an entity map file (map.csv)
+
+The index is an SQLite database next to the map file,
+it maps entity values to their references and remembers
+how much of the map file it covers and the largest reference seen.
+Only the part of the map file appended since the last run
+needs to be read at startup.
+
+The map file stays the canonical data, the index is rebuilt
+if it does not match the map file (different fields or shorter map file).
+It is expected, that map files are only appended to.
+'''
+
+import marshal
+import sqlite3
+
+
+SUFFIX = '.index'
+
+CACHE_SIZE = 100000
+
+
+def index_filename(map_filename):
+    return map_filename + SUFFIX
+
+
+def key_bytes(values):
+    # length prefixed values: unambiguous and canonical
+    # (marshal output depends on whether strings are interned)
+    return ''.join('{:d}:{}'.format(len(value), value) for value in values)
+
+
+def encode_key(values):
+    return sqlite3.Binary(key_bytes(values))
+
+
+class MapIndex(object):
+
+    '''
+    Persistent mapping of value tuples to references.
+
+    Changes are made persistent by commit().
+    '''
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.db = sqlite3.connect(filename)
+        self.db.text_factory = str
+        self.db.executescript('''
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS mapping (
+                key BLOB PRIMARY KEY,
+                ref INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS meta (
+                name TEXT PRIMARY KEY,
+                value BLOB);
+        ''')
+        self.cache = dict()
+        self.fields = self._get_meta('fields', None)
+        self.offset = self._get_meta('offset', 0)
+        self.max_ref = self._get_meta('max_ref', 0)
+        self.size = self._get_meta('size', 0)
+
+    def _get_meta(self, name, default):
+        row = self.db.execute(
+            'SELECT value FROM meta WHERE name = ?', (name,)).fetchone()
+        if row is None:
+            return default
+        return marshal.loads(str(row[0]))
+
+    def _set_meta(self, name, value):
+        self.db.execute(
+            'INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)',
+            (name, sqlite3.Binary(marshal.dumps(value))))
+
+    def reset(self, fields):
+        '''
+        Forget all mappings, index a map file with fields
+        '''
+        self.db.execute('DELETE FROM mapping')
+        self.cache.clear()
+        self.fields = tuple(fields)
+        self.offset = 0
+        self.max_ref = 0
+        self.size = 0
+
+    def matches(self, fields, map_file_size):
+        '''
+        Is this an index of a map file of map_file_size with fields?
+        '''
+        return (
+            self.fields == tuple(fields) and self.offset <= map_file_size)
+
+    def __len__(self):
+        return self.size
+
+    def get(self, values, default=None):
+        ref = self.cache.get(values)
+        if ref is None:
+            row = self.db.execute(
+                'SELECT ref FROM mapping WHERE key = ?',
+                (encode_key(values),)).fetchone()
+            if row is None:
+                return default
+            ref = row[0]
+            self._cache(values, ref)
+        return ref
+
+    def __setitem__(self, values, ref):
+        key = encode_key(values)
+        updated = self.db.execute(
+            'UPDATE mapping SET ref = ? WHERE key = ?', (ref, key))
+        if not updated.rowcount:
+            self.db.execute(
+                'INSERT INTO mapping (key, ref) VALUES (?, ?)', (key, ref))
+            self.size += 1
+        self._cache(values, ref)
+
+    def _cache(self, values, ref):
+        if len(self.cache) >= CACHE_SIZE:
+            self.cache.clear()
+        self.cache[values] = ref
+
+    def commit(self, offset, max_ref):
+        '''
+        Make changes persistent, the map file is indexed up to offset.
+        '''
+        self.offset = offset
+        self.max_ref = max_ref
+        self._set_meta('fields', self.fields)
+        self._set_meta('offset', offset)
+        self._set_meta('max_ref', max_ref)
+        self._set_meta('size', self.size)
+        self.db.commit()
+
+    def close(self):
+        '''
+        Close the index, uncommitted changes are lost
+        '''
+        self.db.close()
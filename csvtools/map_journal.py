@@ -0,0 +1,108 @@
+'''
+Crash safe appends to a map file
+
+The size of the map file at the last commit is recorded in a journal file
+next to it (map.csv.journal).
+A commit flushes and fsyncs the map file, then replaces the journal
+atomically.
+When opening the map file again, anything after the committed size
+(mappings written, but not committed before a crash) is truncated.
+'''
+
+import os
+import csv
+
+
+SUFFIX = '.journal'
+
+
+def journal_filename(map_filename):
+    return map_filename + SUFFIX
+
+
+def _fsync_directory(filename):
+    fd = os.open(os.path.dirname(os.path.abspath(filename)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Journal(object):
+
+    '''
+    Committed size of a map file
+    '''
+
+    def __init__(self, map_filename):
+        self.map_filename = map_filename
+        self.filename = journal_filename(map_filename)
+
+    def committed_size(self):
+        '''
+        Size of the map file at the last commit, None if never committed
+        '''
+        try:
+            with open(self.filename) as f:
+                return int(f.read())
+        except IOError:
+            return None
+
+    def recover(self):
+        '''
+        Truncate the map file to its committed size.
+
+        Returns the number of bytes removed.
+        '''
+        size = self.committed_size()
+        if size is None or not os.path.exists(self.map_filename):
+            return 0
+        extra = os.path.getsize(self.map_filename) - size
+        if extra <= 0:
+            return 0
+        with open(self.map_filename, 'r+b') as f:
+            f.truncate(size)
+            os.fsync(f.fileno())
+        return extra
+
+    def remove(self):
+        '''
+        Stop journaling: the map file might be appended to without commits
+        '''
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+    def commit(self, map_file):
+        '''
+        Make everything written to map_file durable and record its size
+        '''
+        map_file.flush()
+        os.fsync(map_file.fileno())
+        size = os.fstat(map_file.fileno()).st_size
+
+        temp_filename = self.filename + '.tmp'
+        with open(temp_filename, 'w') as f:
+            f.write(str(size))
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(temp_filename, self.filename)
+        _fsync_directory(self.filename)
+
+
+class JournaledWriter(object):
+
+    '''
+    csv writer for a map file, that commits after every write
+    '''
+
+    def __init__(self, map_file, journal):
+        self.map_file = map_file
+        self.journal = journal
+        self.writer = csv.writer(map_file)
+
+    def writerow(self, row):
+        self.writerows([row])
+
+    def writerows(self, rows):
+        self.writer.writerows(rows)
+        self.journal.commit(self.map_file)
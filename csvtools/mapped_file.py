@@ -0,0 +1,126 @@
+'''
+Read only file like object over a memory mapped file
+
+Reading through a mapping avoids copying through a read buffer and
+makes re-reading files already in the page cache cheap.
+The whole file is accessible at once, which allows cheap seeking and
+processing of byte ranges.
+
+Only non-empty regular files are mapped, anything else (pipes, terminals,
+empty files) is read as a normal file.
+'''
+
+import os
+import sys
+import stat
+import mmap
+import ctypes
+from cStringIO import StringIO
+
+
+# from <fcntl.h> on Linux
+POSIX_FADV_SEQUENTIAL = 2
+
+
+def is_mappable(f):
+    '''
+    Is f a non-empty regular file?
+    '''
+    try:
+        file_stat = os.fstat(f.fileno())
+    except (AttributeError, ValueError):
+        # no real file behind f, e.g. StringIO
+        return False
+    return stat.S_ISREG(file_stat.st_mode) and file_stat.st_size > 0
+
+
+def advise_sequential(fileno):
+    '''
+    Hint the kernel to read ahead more of the file, where supported
+    '''
+    if not sys.platform.startswith('linux'):
+        return
+    try:
+        fadvise = ctypes.CDLL(None).posix_fadvise64
+    except (OSError, AttributeError):
+        return
+    fadvise.argtypes = [
+        ctypes.c_int, ctypes.c_int64, ctypes.c_int64, ctypes.c_int]
+    # the whole file; failing is harmless
+    fadvise(fileno, 0, 0, POSIX_FADV_SEQUENTIAL)
+
+
+class MappedFile(object):
+
+    '''
+    Minimal read only file interface of a memory mapped file:
+    iteration over lines, readline, readlines, read, seek, tell, fileno
+    '''
+
+    def __init__(self, f):
+        self.file = f
+        self.name = f.name
+        self.mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        advise_sequential(f.fileno())
+
+        self.readline = self.mapping.readline
+        self.read = self.mapping.read
+        self.seek = self.mapping.seek
+        self.tell = self.mapping.tell
+
+    def __iter__(self):
+        return iter(self.readline, '')
+
+    def __len__(self):
+        return len(self.mapping)
+
+    def __getitem__(self, index):
+        return self.mapping[index]
+
+    def readlines(self, sizehint=None):
+        '''
+        List of whole lines of at least sizehint total size (if possible)
+        '''
+        mapping = self.mapping
+        start = mapping.tell()
+        if sizehint:
+            end = mapping.find('\n', start + sizehint - 1) + 1
+        else:
+            end = 0
+        end = end or len(mapping)
+
+        mapping.seek(end)
+        # split only at \n, like file.readlines
+        return StringIO(mapping[start:end]).readlines()
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.mapping.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def open_mapped(filename):
+    '''
+    Open filename for reading through a memory map.
+
+    Files, that can not be mapped, are returned as normal files.
+    '''
+    f = open(filename, 'rb')
+    if not is_mappable(f):
+        return f
+    try:
+        return MappedFile(f)
+    except (ValueError, EnvironmentError):
+        # mmap.error is an EnvironmentError
+        return f
+    except:
+        f.close()
+        raise
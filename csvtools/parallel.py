@@ -0,0 +1,115 @@
+'''
+Transform a regular csv file in parallel
+
+The file is memory mapped and split into byte ranges of whole records,
+the ranges are transformed in a process pool and the transformed ranges
+are written in the original order.
+'''
+
+import collections
+import csv
+import mmap
+import multiprocessing
+
+from csvtools.mapped_file import is_mappable
+from csvtools.records import find_record_start, record_ranges
+from csvtools.rawlines import parse_records, BlockTransformer
+from csvtools import rawlines
+from csvtools.stats import NoStats, WRITE
+
+
+CHUNK_SIZE = 16 * 1024 * 1024
+
+
+# state of worker processes
+_transform_block = None
+_data = None
+
+
+def _init_worker(transformer, header, data):
+    global _transform_block, _data
+    transformer.bind(header)
+    _transform_block = BlockTransformer(transformer)
+    _data = data
+
+
+def _transform_range(record_range):
+    '''
+    Number of records in and output for the range
+    '''
+    start, end = record_range
+    rows_before = _transform_block.rows
+    output = _transform_block(_data[start:end])
+    return _transform_block.rows - rows_before, output
+
+
+def process_file(
+        transformer, input_file, output_file, jobs, chunk_size=None,
+        stats=None):
+    '''
+    Transform regular input_file with transformer to output_file.
+
+    jobs: number of processes to use
+    chunk_size: approximate size of input ranges processed by one job
+    '''
+    chunk_size = chunk_size or CHUNK_SIZE
+    stats = stats or NoStats()
+    # input might be partially consumed already
+    start = input_file.tell()
+
+    data = mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        header_end = find_record_start(data, start)
+        header = parse_records(data[start:header_end]).next()
+
+        # workers are forked with the unbound transformer
+        pool = multiprocessing.Pool(
+            jobs, _init_worker, (transformer, header, data))
+        try:
+            transformer.bind(header)
+            csv.writer(output_file).writerow(transformer.output_field_names)
+            write = stats.timed(WRITE, output_file.write)
+
+            def write_result(async_result):
+                rows, output = async_result.get()
+                stats.count('rows_read', rows)
+                stats.count('rows_written', rows)
+                write(output)
+
+            # keep the number of ranges in memory bounded
+            pending = collections.deque()
+            for record_range in record_ranges(data, header_end, chunk_size):
+                pending.append(
+                    pool.apply_async(_transform_range, (record_range,)))
+                if len(pending) > 2 * jobs:
+                    write_result(pending.popleft())
+            while pending:
+                write_result(pending.popleft())
+
+            # + header
+            stats.count('rows_read')
+            stats.count('rows_written')
+            stats.count('bytes_read', len(data) - start)
+
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+    finally:
+        data.close()
+
+
+def process(transformer, input_file, output_file, jobs=1, stats=None):
+    '''
+    Transform input_file with transformer to output_file.
+
+    Input that is not a regular file is transformed in this process.
+    Empty input is not regular in this sense.
+    '''
+    if jobs > 1 and is_mappable(input_file):
+        process_file(
+            transformer, input_file, output_file, jobs, stats=stats)
+    else:
+        rawlines.process(transformer, input_file, output_file, stats=stats)
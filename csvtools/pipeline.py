@@ -0,0 +1,281 @@
+'''
+Run a chain of csvtools stages in one process
+
+Usage:
+csv_pipeline [--input FILE] stage [stage-arguments] [: stage [...] [...]]
+
+Stages:
+    select transform_spec
+    rmfields field_name [field_name [...]]
+    extract_map [--index] [--compact [--memory-limit MB]] [--journal]
+        [--shared] [--batch-size ROWS]
+        entity_fields_spec ref_field_spec map.csv [...]
+    inflate_map [--keep-ref] [--on-disk] entity_fields_spec ref_field_spec
+        map.csv
+    sort [--numeric] [--run-rows N] [--jobs N] [--temp-dir DIR] fields
+    unzip [--id=zip-id] fields unspec_filename
+    unzip [--id=zip-id] [--threads]
+        --to fields filename [--to fields filename [...]]
+    zip [--keep-id] [--rm] [--join inner|left|outer [--numeric]]
+        other_filename [...]
+
+Stages take the options of their tools, except for those of the input
+and the processes (--input, --jobs, sort --merge).
+
+Standard input is parsed once, rows are passed between stages in memory
+and standard output is written once, e.g.
+
+    csv_pipeline select a,b,c : rmfields b : extract_map a ref_a map.csv
+
+is the same as
+
+    csv_select a,b,c | csv_rmfields b | csv_extract_map a ref_a map.csv
+'''
+
+import os
+import sys
+import csv
+import argparse
+
+from csvtools.field_maps import FieldMaps
+from csvtools.transformer import SimpleTransformer
+from csvtools.rmfields import RemoveFields
+from csvtools.extract_map import open_extractors
+from csvtools.unzip import Unzip, MultiUnzip, open_writer, close_files
+from csvtools.zip import MultiZip
+from csvtools.mapped_file import open_mapped
+from csvtools import cli
+from csvtools.inflate_map import new_inflater, open_table
+from csvtools.sort import Sorter
+import csvtools.select
+import csvtools.rmfields
+import csvtools.extract_map
+import csvtools.inflate_map
+import csvtools.sort
+import csvtools.unzip
+import csvtools.zip
+
+
+STAGE_SEPARATOR = ':'
+
+# stage name: tool module, its parse_args parses the stage arguments
+STAGE_TOOLS = {
+    'select': csvtools.select,
+    'rmfields': csvtools.rmfields,
+    'extract_map': csvtools.extract_map,
+    'inflate_map': csvtools.inflate_map,
+    'sort': csvtools.sort,
+    'unzip': csvtools.unzip,
+    'zip': csvtools.zip,
+}
+
+
+class BadStage(Exception):
+    pass
+
+
+class Pipeline(object):
+
+    '''
+    Chain of stages, each having a .rows(reader) method
+    returning an iterator over its output rows, header first.
+
+    A Pipeline is a stage itself.
+    '''
+
+    def __init__(self, stages):
+        self.stages = list(stages)
+
+    def rows(self, reader):
+        rows = reader
+        for stage in self.stages:
+            rows = stage.rows(rows)
+        return iter(rows)
+
+    def process(self, reader, writer):
+        writer.writerows(self.rows(reader))
+
+
+class StageBuilder(object):
+
+    '''
+    Creates stages from command line arguments.
+
+    Files opened by stages are kept track of, call .close() when done.
+    Input files to be removed are removed by .remove_files().
+    '''
+
+    def __init__(self, buffer_size=-1):
+        self.buffer_size = buffer_size
+        self.open_files = []
+        self.map_files = []
+        self.files_to_remove = []
+
+    def open(self, filename, mode='r'):
+        f = open(filename, mode, self.buffer_size)
+        self.open_files.append(f)
+        return f
+
+    def close(self, exc_info=(None, None, None)):
+        '''
+        Close the opened files - map files are closed by their __exit__
+        with exc_info, not to update their index on error
+        '''
+        map_files, self.map_files = self.map_files, []
+        open_files, self.open_files = self.open_files, []
+        try:
+            for map_file in reversed(map_files):
+                map_file.__exit__(*exc_info)
+        finally:
+            close_files(open_files)
+
+    def remove_files(self):
+        for filename in self.files_to_remove:
+            os.remove(filename)
+        self.files_to_remove = []
+
+    def build(self, args):
+        return self.build_stage(*parse_stage(args))
+
+    def build_stage(self, name, args):
+        '''
+        Stage from its name and arguments parsed by parse_stage
+        '''
+        return getattr(self, 'build_' + name)(args)
+
+    def build_select(self, args):
+        field_maps = FieldMaps()
+        field_maps.parse_from(args.transform_spec)
+        return SimpleTransformer(field_maps)
+
+    def build_rmfields(self, args):
+        return RemoveFields(args.fields)
+
+    def build_extract_map(self, args):
+        return Pipeline(
+            open_extractors(
+                args, self.buffer_size, self.map_files, self.open_files))
+
+    def build_inflate_map(self, args):
+        inflater = new_inflater(
+            args.entity_fields, args.ref_field, keep_ref=args.keep_ref)
+        self.open_files.append(
+            open_table(inflater, args.entity_file, args.on_disk))
+        return inflater
+
+    def build_sort(self, args):
+        return Sorter(
+            args.fields, numeric=args.numeric, run_rows=args.run_rows,
+            jobs=args.jobs, temp_dir=args.temp_dir)
+
+    def build_unzip(self, args):
+        if args.outputs:
+            groups = [
+                (fields.split(','),
+                 open_writer(
+                     filename, self.buffer_size, args.threads,
+                     self.open_files))
+                for fields, filename in args.outputs]
+            return MultiUnzip(groups, zip_field=args.zip_field)
+        out_unspec = self.open(args.unspec_fields_filename, 'w')
+        return Unzip(
+            args.fields.split(','), csv.writer(out_unspec),
+            zip_field=args.zip_field)
+
+    def build_zip(self, args):
+        others = []
+        for other_filename in args.other_filenames:
+            other_csv = open_mapped(other_filename)
+            self.open_files.append(other_csv)
+            others.append(csv.reader(other_csv))
+            if args.remove_input_file:
+                self.files_to_remove.append(other_filename)
+        return MultiZip(
+            others, keep_id=args.keep_id, join=args.join,
+            numeric=args.numeric)
+
+
+def split_stages(args):
+    '''
+    Split command line arguments into per stage argument lists
+    '''
+    stages = [[]]
+    for arg in args:
+        if arg == STAGE_SEPARATOR:
+            stages.append([])
+        else:
+            stages[-1].append(arg)
+
+    if not all(stages):
+        raise BadStage('empty stage')
+    return stages
+
+
+def parse_stage(args):
+    '''
+    Stage name and its arguments parsed by its tool
+    '''
+    name, args = args[0], args[1:]
+    try:
+        tool = STAGE_TOOLS[name]
+    except KeyError:
+        raise BadStage('unknown stage {}'.format(name))
+    args = tool.parse_args(args)
+
+    # the input and processes are the pipeline's
+    if args.input_filename != cli.STDIN:
+        raise BadStage('{} --input'.format(name))
+    if getattr(args, 'jobs', 1) > 1 and name != 'sort':
+        raise BadStage('{} --jobs'.format(name))
+    if getattr(args, 'merge', False):
+        raise BadStage('{} --merge'.format(name))
+    return name, args
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser()
+
+    cli.add_input_argument(parser)
+    cli.add_stats_argument(parser)
+    cli.add_buffer_argument(parser)
+    parser.add_argument(
+        'stages', metavar='STAGE', nargs=argparse.REMAINDER,
+        help='stage name and arguments, stages are separated by :')
+
+    args = parser.parse_args(args)
+    try:
+        args.stages = [
+            parse_stage(stage_args)
+            for stage_args in split_stages(args.stages)]
+    except BadStage as e:
+        parser.error('bad stage: {}'.format(e))
+    return args
+
+
+def main():
+    args = parse_args(sys.argv[1:])
+    stats = cli.stats_for(args, 'pipeline')
+    builder = StageBuilder(args.buffer_size)
+    exc_info = (None, None, None)
+    try:
+        pipeline = Pipeline(
+            builder.build_stage(name, stage_args)
+            for name, stage_args in args.stages)
+
+        with cli.input_file(args.input_filename) as input_file:
+            with cli.output_file(args.buffer_size) as output_file:
+                reader = stats.reader(
+                    csv.reader(stats.input_file(input_file)))
+                writer = stats.writer(
+                    csv.writer(stats.output_file(output_file)))
+                pipeline.process(reader, writer)
+        builder.remove_files()
+    except:
+        exc_info = sys.exc_info()
+        raise
+    finally:
+        builder.close(exc_info)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+'''
+Fast path for projections of csv input without quotes
+
+Input is processed in blocks of whole records.
+Blocks without quote characters are split on the delimiter and joined back
+without the csv module, other blocks are parsed and written by the csv module.
+The output is the same in both cases.
+'''
+
+import csv
+import itertools
+from cStringIO import StringIO
+
+from csvtools.lib import projection
+from csvtools.records import QUOTE
+from csvtools.stats import NoStats, PARSE, WRITE
+
+
+BLOCK_SIZE = 1024 * 1024
+
+DELIMITER = ','
+# as written by csv.writer
+LINE_TERMINATOR = '\r\n'
+
+
+def parse_records(block):
+    # lines end only at \n, like in files read by csv.reader
+    return csv.reader(StringIO(block))
+
+
+def read_record(input_file, in_quotes=False):
+    '''
+    Text of the next record in input_file - might be multiple lines
+
+    in_quotes: input_file is positioned within a quoted field,
+        the text of the rest of the record is returned
+    '''
+    record = input_file.readline()
+    quotes = int(in_quotes) + record.count(QUOTE)
+    while quotes % 2:
+        line = input_file.readline()
+        if not line:
+            break
+        record += line
+        quotes += line.count(QUOTE)
+    return record
+
+
+def read_block(input_file, block_size=BLOCK_SIZE):
+    '''
+    Text block of whole records of about block_size from input_file,
+    empty at the end of input_file
+    '''
+    block = ''.join(input_file.readlines(block_size))
+    if block.count(QUOTE) % 2:
+        block += read_record(input_file, in_quotes=True)
+    return block
+
+
+def read_blocks(input_file, block_size=BLOCK_SIZE):
+    '''
+    Iterator over text blocks of whole records in input_file
+    '''
+    return iter(lambda: read_block(input_file, block_size), '')
+
+
+def is_raw(block):
+    '''
+    True if block can be split into records and fields without csv:
+    it has no quotes and no \r other than in \r\n line ends
+    '''
+    return QUOTE not in block and block.count('\r') == block.count('\r\n')
+
+
+class BlockTransformer(object):
+
+    '''
+    Transform text blocks of whole records with a bound transformer.
+
+    The raw line fast path is used only for transformers,
+    that are projections of existing fields (have .indices).
+
+    .rows : number of records transformed so far
+    '''
+
+    def __init__(self, transformer):
+        self.transformer = transformer
+        self.project = None
+        self.rows = 0
+
+        indices = getattr(transformer, 'indices', None)
+        if indices is not None and None not in indices:
+            self.project = projection(indices)
+            # csv.writer writes a single empty field as ""
+            self.single_field = len(indices) == 1
+
+    def __call__(self, block):
+        if self.project is not None and is_raw(block):
+            return self.transform_raw(block)
+        return self.transform_csv(block)
+
+    def transform_raw(self, block):
+        project = self.project
+        join = DELIMITER.join
+        lines = block.replace('\r', '').split('\n')
+        if block.endswith('\n'):
+            lines.pop()
+        lines = [join(project(line.split(DELIMITER))) for line in lines]
+        self.rows += len(lines)
+        if self.single_field:
+            lines = [line or '""' for line in lines]
+        lines.append('')
+        return LINE_TERMINATOR.join(lines)
+
+    def transform_csv(self, block):
+        rows = list(parse_records(block))
+        self.rows += len(rows)
+        output = StringIO()
+        csv.writer(output).writerows(
+            itertools.imap(self.transformer.transform, rows))
+        return output.getvalue()
+
+
+def process(
+        transformer, input_file, output_file, block_size=BLOCK_SIZE,
+        stats=None):
+    '''
+    Transform input_file with transformer to output_file
+    '''
+    stats = stats or NoStats()
+    header = parse_records(read_record(input_file)).next()
+    transformer.bind(header)
+    csv.writer(output_file).writerow(transformer.output_field_names)
+
+    transform_block = BlockTransformer(transformer)
+    write = stats.timed(WRITE, output_file.write)
+    for block in stats.timed_iter(PARSE, read_blocks(input_file, block_size)):
+        write(transform_block(block))
+
+    # + header
+    stats.count('rows_read', transform_block.rows + 1)
+    stats.count('rows_written', transform_block.rows + 1)
@@ -0,0 +1,78 @@
+'''
+Quote aware record boundaries in raw csv data
+
+A newline ends a record only if it is outside of quotes,
+that is, if there is an even number of quote characters before it
+in the record - escaped quotes are doubled, so they do not change this.
+
+`data` below is anything supporting len() and slicing to str,
+e.g. a str or an mmap.
+'''
+
+QUOTE = '"'
+NEWLINE = '\n'
+
+BLOCK_SIZE = 1 << 20
+
+
+def next_record_start(block, start=0, in_quotes=False):
+    '''
+    Offset of the first record start after start in block or None.
+
+    in_quotes: block[start] is within a quoted field
+    '''
+    quotes = int(in_quotes)
+    while True:
+        newline = block.find(NEWLINE, start)
+        if newline < 0:
+            return None
+
+        quotes += block.count(QUOTE, start, newline)
+        if quotes % 2 == 0:
+            return newline + 1
+        start = newline + 1
+
+
+def count_quotes(data, start, end):
+    return sum(
+        data[i:min(i + BLOCK_SIZE, end)].count(QUOTE)
+        for i in xrange(start, end, BLOCK_SIZE))
+
+
+def find_record_start(data, start, in_quotes=False):
+    '''
+    Offset of the first record start after start in data.
+
+    Returns len(data) if there is no more record start.
+    '''
+    end = len(data)
+    while start < end:
+        block = data[start:start + BLOCK_SIZE]
+        record_start = next_record_start(block, 0, in_quotes)
+        if record_start is not None:
+            return start + record_start
+
+        in_quotes = (in_quotes + block.count(QUOTE)) % 2 == 1
+        start += len(block)
+    return end
+
+
+def record_ranges(data, start, size):
+    '''
+    Split data[start:] to (start, end) ranges of whole records.
+
+    start: a record start
+    size: approximate size of ranges - ranges are at least this long,
+        except for the last one
+    '''
+    end = len(data)
+    while start < end:
+        cut = start + size
+        if cut >= end:
+            yield start, end
+            return
+
+        in_quotes = count_quotes(data, start, cut) % 2 == 1
+        next_start = find_record_start(data, cut, in_quotes)
+        yield start, next_start
+        start = next_start
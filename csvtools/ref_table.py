@@ -0,0 +1,225 @@
+'''
+Memory compact mapping of value tuples to references
+
+Keys are stored as their encoded bytes (see map_index.key_bytes) in a
+single growing byte buffer, instead of tuples of strings.
+The hash table is open addressing over arrays of fixed size numbers:
+a mapping takes the length of its encoded values and about 40 bytes,
+instead of the hundreds of bytes of a dict entry with a tuple of strings
+as key.
+Lookups compare the encoded values, so different values never share a
+reference, even if their hashes are equal.
+
+Above a memory limit new entries are spilled to a temporary SQLite database.
+'''
+
+import os
+import array
+import itertools
+import zlib
+import sqlite3
+import tempfile
+
+from csvtools.map_index import key_bytes
+
+
+INITIAL_CAPACITY = 1024
+# grow the table when more than this fraction of slots are used
+MAX_LOAD = 0.5
+
+# array types with the same size on every platform:
+# 32 bit hashes and entry numbers; references and offsets as doubles,
+# which hold integers exactly up to 2 ** 53
+HASH_TYPE = 'I'
+ENTRY_TYPE = 'I'
+NUMBER_TYPE = 'd'
+
+
+def key_hash(key):
+    return zlib.crc32(key) & 0xffffffff
+
+
+def _array(typecode, size):
+    return array.array(typecode, [0]) * size
+
+
+class SpillStore(object):
+
+    '''
+    Encoded values to reference mapping in a temporary SQLite database
+
+    The database file is removed as soon as it is open.
+    '''
+
+    def __init__(self):
+        fd, filename = tempfile.mkstemp(suffix='.sqlite')
+        os.close(fd)
+        self.db = sqlite3.connect(filename)
+        self.db.executescript('''
+            PRAGMA synchronous = OFF;
+            PRAGMA journal_mode = OFF;
+            CREATE TABLE mapping (
+                key BLOB PRIMARY KEY,
+                ref INTEGER NOT NULL);
+        ''')
+        os.remove(filename)
+        self.size = 0
+
+    def get(self, key):
+        row = self.db.execute(
+            'SELECT ref FROM mapping WHERE key = ?',
+            (sqlite3.Binary(key),)).fetchone()
+        return None if row is None else row[0]
+
+    def set(self, key, ref):
+        key = sqlite3.Binary(key)
+        updated = self.db.execute(
+            'UPDATE mapping SET ref = ? WHERE key = ?', (ref, key))
+        if not updated.rowcount:
+            self.db.execute(
+                'INSERT INTO mapping (key, ref) VALUES (?, ?)', (key, ref))
+            self.size += 1
+
+    def close(self):
+        self.db.close()
+
+
+class CompactRefTable(object):
+
+    '''
+    Mapping of value tuples to references, usable as Mapper.values_to_ref
+
+    Entries are numbered in insertion order, their references and the end
+    offsets of their keys in .keys are in arrays indexed by entry number.
+    Slots of the hash table hold the hash and the entry number + 1
+    (0 for empty slots).
+
+    memory_limit: approximate maximum size of the in-memory table in bytes,
+        unlimited if None
+    '''
+
+    def __init__(self, memory_limit=None):
+        self.memory_limit = memory_limit
+        self.spill = None
+        self.keys = bytearray()
+        self.key_ends = array.array(NUMBER_TYPE)
+        self.refs = array.array(NUMBER_TYPE)
+        self._allocate(INITIAL_CAPACITY)
+
+    def _allocate(self, capacity):
+        self.capacity = capacity
+        self.mask = capacity - 1
+        self.hashes = _array(HASH_TYPE, capacity)
+        self.entries = _array(ENTRY_TYPE, capacity)
+
+    @property
+    def size(self):
+        return len(self.refs)
+
+    @property
+    def slots_size(self):
+        return self.capacity * (
+            self.hashes.itemsize + self.entries.itemsize)
+
+    @property
+    def memory_size(self):
+        '''
+        Size of the in-memory table in bytes
+        '''
+        return (
+            self.slots_size +
+            self.size * (self.refs.itemsize + self.key_ends.itemsize) +
+            len(self.keys))
+
+    def _key(self, entry):
+        start = int(self.key_ends[entry - 1]) if entry else 0
+        return self.keys[start:int(self.key_ends[entry])]
+
+    def _slot(self, key, hash_):
+        '''
+        Index of the slot of key, or of the empty slot for it
+        '''
+        hashes, entries, mask = self.hashes, self.entries, self.mask
+        slot = hash_ & mask
+        while entries[slot]:
+            if hashes[slot] == hash_ and self._key(entries[slot] - 1) == key:
+                break
+            slot = (slot + 1) & mask
+        return slot
+
+    def _grow(self):
+        hashes, entries = self.hashes, self.entries
+        self._allocate(2 * self.capacity)
+        mask = self.mask
+        for hash_, entry in itertools.izip(hashes, entries):
+            if entry:
+                # keys are distinct: look for an empty slot only
+                slot = hash_ & mask
+                while self.entries[slot]:
+                    slot = (slot + 1) & mask
+                self.hashes[slot] = hash_
+                self.entries[slot] = entry
+
+    def _is_full(self, key):
+        '''
+        Would adding key exceed the memory limit?
+        '''
+        if self.memory_limit is None:
+            return False
+        size = (
+            self.memory_size + len(key) +
+            self.refs.itemsize + self.key_ends.itemsize)
+        if self.size + 1 > MAX_LOAD * self.capacity:
+            size += self.slots_size
+        return size > self.memory_limit
+
+    def __len__(self):
+        return self.size + (self.spill.size if self.spill else 0)
+
+    def get(self, values, default=None):
+        key = key_bytes(values)
+        entry = self.entries[self._slot(key, key_hash(key))]
+        if entry:
+            return int(self.refs[entry - 1])
+        if self.spill is not None:
+            ref = self.spill.get(key)
+            if ref is not None:
+                return ref
+        return default
+
+    def __setitem__(self, values, ref):
+        key = key_bytes(values)
+        hash_ = key_hash(key)
+        slot = self._slot(key, hash_)
+        entry = self.entries[slot]
+        if entry:
+            self.refs[entry - 1] = ref
+            return
+
+        if self.spill is not None and self.spill.get(key) is not None:
+            self.spill.set(key, ref)
+            return
+
+        if self._is_full(key):
+            if self.spill is None:
+                self.spill = SpillStore()
+            self.spill.set(key, ref)
+            return
+
+        if self.size + 1 > MAX_LOAD * self.capacity:
+            self._grow()
+            slot = self._slot(key, hash_)
+
+        self.keys += key
+        self.key_ends.append(len(self.keys))
+        self.refs.append(ref)
+        self.hashes[slot] = hash_
+        self.entries[slot] = self.size
+
+    def close(self):
+        '''
+        Release the spill database - if any
+        '''
+        if self.spill is not None:
+            self.spill.close()
+            self.spill = None
@@ -3,13 +3,17 @@ Remove the given fields from its input
 
 Usage:
 
-rmfields.py field_name [field_name [...]]
+rmfields.py [--input FILE] [--jobs N]
+    field_name [field_name [...]]
 '''
 
-import sys
 import csv
+import sys
+
+import argparse
 from csvtools.transformer import Transformer, SimpleTransformer
 from csvtools.field_maps import FieldMaps
+from csvtools import columns, parallel, cli
 
 
 class RemoveFields(Transformer):
@@ -34,12 +38,46 @@ class RemoveFields(Transformer):
     def transform(self):
         return self.transformer.transform
 
+    @property
+    def indices(self):
+        return self.transformer.indices
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser()
+
+    cli.add_input_argument(parser)
+    cli.add_stats_argument(parser)
+    cli.add_buffer_argument(parser)
+    parser.add_argument(
+        '--jobs', type=int, default=1,
+        help='number of processes to use if input is a file (%(default)s)')
+    parser.add_argument(
+        'fields', metavar='FIELD', nargs='+',
+        help='field to remove')
+
+    return parser.parse_args(args)
+
 
 def main():
-    reader = csv.reader(sys.stdin)
-    writer = csv.writer(sys.stdout)
-    fields = sys.argv[1:]
-    RemoveFields(fields).process(reader, writer)
+    args = parse_args(sys.argv[1:])
+
+    stats = cli.stats_for(args, 'rmfields')
+
+    if columns.is_column_store(args.input_filename):
+        with cli.output_file(args.buffer_size) as output_file:
+            writer = stats.writer(csv.writer(stats.output_file(output_file)))
+            columns.transform(
+                RemoveFields(args.fields),
+                columns.ColumnStore(args.input_filename), stats, writer)
+        return
+
+    with cli.input_file(args.input_filename) as input_file:
+        with cli.output_file(args.buffer_size) as output_file:
+            parallel.process(
+                RemoveFields(args.fields),
+                stats.input_file(input_file), stats.output_file(output_file),
+                jobs=args.jobs, stats=stats)
 
 
 if __name__ == '__main__':
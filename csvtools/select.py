@@ -1,20 +1,55 @@
-import sys
 import csv
+import sys
+
+import argparse
 from csvtools.transformer import SimpleTransformer
 from csvtools.field_maps import FieldMaps
+from csvtools import columns, parallel, rawlines, cli
 
 
 def select(input_file, output_file, transform_spec):
-    reader = csv.reader(input_file)
-    writer = csv.writer(output_file)
     field_maps = FieldMaps()
     field_maps.parse_from(transform_spec)
-    SimpleTransformer(field_maps).process(reader, writer)
+    rawlines.process(SimpleTransformer(field_maps), input_file, output_file)
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser()
+
+    cli.add_input_argument(parser)
+    cli.add_stats_argument(parser)
+    cli.add_buffer_argument(parser)
+    parser.add_argument(
+        '--jobs', type=int, default=1,
+        help='number of processes to use if input is a file (%(default)s)')
+    parser.add_argument(
+        'transform_spec', metavar='TRANSFORM_SPEC',
+        help='comma separated list of output fields: out[=in]')
+
+    return parser.parse_args(args)
 
 
 def main():
-    transform_spec = sys.argv[1]
-    select(sys.stdin, sys.stdout, transform_spec)
+    args = parse_args(sys.argv[1:])
+
+    field_maps = FieldMaps()
+    field_maps.parse_from(args.transform_spec)
+    stats = cli.stats_for(args, 'select')
+
+    if columns.is_column_store(args.input_filename):
+        with cli.output_file(args.buffer_size) as output_file:
+            writer = stats.writer(csv.writer(stats.output_file(output_file)))
+            columns.transform(
+                SimpleTransformer(field_maps),
+                columns.ColumnStore(args.input_filename), stats, writer)
+        return
+
+    with cli.input_file(args.input_filename) as input_file:
+        with cli.output_file(args.buffer_size) as output_file:
+            parallel.process(
+                SimpleTransformer(field_maps),
+                stats.input_file(input_file), stats.output_file(output_file),
+                jobs=args.jobs, stats=stats)
 
 
 if __name__ == '__main__':
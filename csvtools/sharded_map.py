@@ -0,0 +1,480 @@
+'''
+Parallel entity extraction with mappings sharded across processes
+
+The input is read in chunks of whole records, the work on them is done
+by worker processes:
+
+- every worker owns the mappings of the values hashing to its shard
+  (for every map), the workers load the map files in parallel: each parses
+  a byte range of a map file and passes the mappings to their owners
+- the formatter of a chunk (chunks are assigned round robin) parses it,
+  extracts the entity values and sends them to the workers owning their
+  shards, which look them up - in chunk order
+- the formatter then builds and formats the output rows of the chunk
+
+The main process only reads the chunks, allocates references to new values
+and writes the outputs.
+New references are allocated in order of first occurrence, chunk by chunk,
+so the output and the new mappings are the same as of a serial run.
+New mappings are sent to their shards with the next chunk submitted,
+until they reach every lookup they are remembered by the main process.
+
+Processes communicate through queues only, nobody waits for a peer to
+receive a message.
+'''
+
+import os
+import csv
+import mmap
+import heapq
+import itertools
+import traceback
+import collections
+import multiprocessing
+from cStringIO import StringIO
+
+from csvtools.extract_map import Mapper
+from csvtools.map_journal import Journal
+from csvtools.exceptions import MissingFieldError
+from csvtools.lib import FieldsMap, Header, projection
+from csvtools.rawlines import read_record, read_blocks, parse_records
+from csvtools.records import find_record_start, record_ranges
+
+
+CHUNK_SIZE = 1024 * 1024
+# chunks submitted, but not yet written, per worker
+CHUNKS_PER_WORKER = 2
+
+
+class WorkerError(Exception):
+    '''An error in a worker process, with its traceback as message'''
+
+
+def shard_of(values, shards):
+    return hash(values) % shards
+
+
+def map_ranges(map_filename, shards):
+    '''
+    Header and at most shards byte ranges of whole records of map file
+    '''
+    with open(map_filename, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            header_end = find_record_start(data, 0)
+            header = parse_records(data[:header_end]).next()
+            size = -(-(len(data) - header_end) // shards)
+            return header, list(record_ranges(data, header_end, size))
+        finally:
+            data.close()
+
+
+class MapSpec(object):
+
+    '''
+    What workers need to know of a map: where to load it from
+    and the input field indices of its values
+
+    ranges: byte ranges of the map file, loaded by the workers with
+        the same index
+    from_map_order: projection of map rows to the ref and the values
+    '''
+
+    def __init__(self, filename, ranges, from_map_order, value_indices):
+        self.filename = filename
+        self.ranges = ranges
+        self.from_map_order = from_map_order
+        self.value_indices = value_indices
+
+
+class Worker(object):
+
+    '''
+    Shard owner and chunk formatter, see the module documentation.
+
+    Messages in its task queue:
+    ('mappings', map index, range index, mappings) from the loading workers,
+    ('parse', chunk, data, new mappings per map per shard) from main,
+    ('lookup', chunk, formatter, (new mappings, rows, values) per map)
+    from formatters,
+    ('refs', chunk, shard, refs per map) from shards,
+    ('resolved', chunk, new references per map) from main.
+    None stops the worker.
+    '''
+
+    def __init__(self, index, tasks, results, map_specs, row_length):
+        self.index = index
+        self.tasks = tasks
+        self.shards = len(tasks)
+        self.results = results
+        self.map_specs = map_specs
+        self.copy_row = projection(range(row_length), list)
+        self.extractors = [
+            projection(spec.value_indices) for spec in map_specs]
+        self.tables = [dict() for _ in map_specs]
+        # lookups waiting for the lookups of previous chunks
+        self.lookups = dict()
+        self.next_lookup = 0
+        # state of chunks formatted here
+        self.chunks = dict()
+
+    def run(self):
+        self.load()
+        for message in iter(self.tasks[self.index].get, None):
+            getattr(self, 'on_' + message[0])(*message[1:])
+
+    def load(self):
+        shards = self.shards
+        max_refs = []
+        for map_index, spec in enumerate(self.map_specs):
+            max_ref = 0
+            if self.index < len(spec.ranges):
+                buckets = [dict() for _ in xrange(shards)]
+                start, end = spec.ranges[self.index]
+                with open(spec.filename, 'rb') as f:
+                    f.seek(start)
+                    data = f.read(end - start)
+                from_map_order = projection(spec.from_map_order)
+                for row in parse_records(data):
+                    ref_and_values = from_map_order(row)
+                    ref = int(ref_and_values[0])
+                    values = tuple(ref_and_values[1:])
+                    max_ref = max(ref, max_ref)
+                    buckets[shard_of(values, shards)][values] = ref
+                for tasks, bucket in itertools.izip(self.tasks, buckets):
+                    tasks.put(('mappings', map_index, self.index, bucket))
+            max_refs.append(max_ref)
+
+        # the first messages are all mappings: chunks are sent when
+        # every worker is ready, mappings of later ranges win,
+        # like in the map file
+        expected = sum(len(spec.ranges) for spec in self.map_specs)
+        received = sorted(
+            self.tasks[self.index].get()[1:] for _ in xrange(expected))
+        for map_index, _, mappings in received:
+            self.tables[map_index].update(mappings)
+
+        self.results.put(
+            ('ready', self.index, max_refs, map(len, self.tables)))
+
+    def on_parse(self, chunk, data, new_mappings):
+        rows = list(parse_records(data))
+        shards = self.shards
+        state = dict(rows=rows, keys=[], shard_indices=[], refs=dict())
+        lookups = [[] for _ in xrange(shards)]
+        for map_index, extract in enumerate(self.extractors):
+            keys = map(extract, rows)
+            shard_indices = [hash(key) % shards for key in keys]
+            state['keys'].append(keys)
+            state['shard_indices'].append(shard_indices)
+
+            shard_rows = [[] for _ in xrange(shards)]
+            shard_keys = [[] for _ in xrange(shards)]
+            for row, key, shard in itertools.izip(
+                    itertools.count(), keys, shard_indices):
+                shard_rows[shard].append(row)
+                shard_keys[shard].append(key)
+            for shard in xrange(shards):
+                lookups[shard].append(
+                    (
+                        new_mappings[map_index][shard],
+                        shard_rows[shard], shard_keys[shard]))
+
+        self.chunks[chunk] = state
+        for tasks, shard_lookups in itertools.izip(self.tasks, lookups):
+            tasks.put(('lookup', chunk, self.index, shard_lookups))
+
+    def on_lookup(self, chunk, formatter, lookups):
+        self.lookups[chunk] = formatter, lookups
+        # in chunk order: new mappings come with the lookups
+        while self.next_lookup in self.lookups:
+            self.look_up(self.next_lookup, *self.lookups.pop(self.next_lookup))
+            self.next_lookup += 1
+
+    def look_up(self, chunk, formatter, lookups):
+        refs = []
+        missing = []
+        for table, (new_mappings, rows, keys) in itertools.izip(
+                self.tables, lookups):
+            table.update(new_mappings)
+            map_refs = map(table.get, keys)
+            refs.append(map_refs)
+            # first occurrences of unknown values
+            map_missing = []
+            seen = set()
+            for row, key, ref in itertools.izip(rows, keys, map_refs):
+                if ref is None and key not in seen:
+                    seen.add(key)
+                    map_missing.append((row, key))
+            missing.append(map_missing)
+        self.tasks[formatter].put(('refs', chunk, self.index, refs))
+        self.results.put(('missing', chunk, self.index, missing))
+
+    def on_refs(self, chunk, shard, refs):
+        self.chunks[chunk]['refs'][shard] = refs
+        self.format(chunk)
+
+    def on_resolved(self, chunk, new_refs):
+        self.chunks[chunk]['resolved'] = new_refs
+        self.format(chunk)
+
+    def format(self, chunk):
+        state = self.chunks[chunk]
+        if 'resolved' not in state or len(state['refs']) < self.shards:
+            return
+        del self.chunks[chunk]
+
+        columns = []
+        for map_index, (keys, shard_indices) in enumerate(
+                itertools.izip(state['keys'], state['shard_indices'])):
+            shard_refs = [
+                iter(state['refs'][shard][map_index]).next
+                for shard in xrange(self.shards)]
+            new_refs = state['resolved'][map_index]
+            column = [shard_refs[shard]() for shard in shard_indices]
+            columns.append([
+                new_refs[key] if ref is None else ref
+                for ref, key in itertools.izip(column, keys)])
+
+        copy_row = self.copy_row
+        output = StringIO()
+        csv.writer(output).writerows(
+            copy_row(row) + list(refs)
+            for row, refs in itertools.izip(state['rows'], zip(*columns)))
+        self.results.put(
+            ('output', chunk, output.getvalue(), len(state['rows'])))
+
+
+def _run_worker(index, tasks, results, map_specs, row_length):
+    try:
+        Worker(index, tasks, results, map_specs, row_length).run()
+    except:
+        results.put(('error', index, traceback.format_exc()))
+
+
+class ShardedMap(object):
+
+    '''
+    Map of an entity in the main process: allocates new references
+    '''
+
+    def __init__(self, entity_fields, ref_field, map_filename):
+        self.ref_field_map = FieldsMap.parse(ref_field)
+        self.fields_map = FieldsMap.parse(entity_fields)
+        self.filename = map_filename
+        self.file = None
+        self.mapper = None
+        self.existing_mappings = 0
+        # (number of submitted chunks when created, values) of new mappings,
+        # that might be unknown to the shards looking up submitted chunks
+        self.recent = collections.deque()
+
+    @property
+    def new_mappings(self):
+        return self.mapper.new_mappings
+
+    def open(self, input_header, shards, buffer_size=-1):
+        '''
+        Open the map file for appending, return its MapSpec
+        '''
+        missing = set(self.fields_map.input_fields) - set(input_header)
+        if missing:
+            # e.g. a reference field of another entity
+            raise MissingFieldError(missing)
+
+        # mappings are not committed: like open_map_file without journal
+        map_journal = Journal(self.filename)
+        map_journal.recover()
+        map_journal.remove()
+
+        ref_field = self.ref_field_map.output_fields[0]
+        fields = list(self.fields_map.output_fields)
+        new = (
+            not os.path.exists(self.filename) or
+            os.path.getsize(self.filename) == 0)
+        if new:
+            header, ranges = None, []
+        else:
+            header, ranges = map_ranges(self.filename, shards)
+
+        self.file = open(self.filename, 'ab', buffer_size)
+        appender = csv.writer(self.file)
+        if new:
+            self.mapper = Mapper.new(ref_field, fields, appender)
+            from_map_order = range(len(fields) + 1)
+        else:
+            self.mapper = Mapper(ref_field, fields, [header], appender)
+            from_map_order = Header(header).indices([ref_field] + fields)
+        self.unsent = [dict() for _ in xrange(shards)]
+        return MapSpec(
+            self.filename, ranges, from_map_order,
+            input_header.indices(self.fields_map.input_fields))
+
+    def loaded(self, max_ref, existing_mappings):
+        self.mapper.max_ref = max(self.mapper.max_ref, max_ref)
+        self.existing_mappings += existing_mappings
+
+    def take_unsent(self):
+        unsent = self.unsent
+        self.unsent = [dict() for _ in unsent]
+        return unsent
+
+    def resolve(self, chunk, submitted, missing_lists):
+        '''
+        References of the values missing from the shards for chunk
+
+        missing_lists: (row, values) lists per shard, in row order
+        submitted: number of chunks submitted so far
+        '''
+        recent = self.recent
+        values_to_ref = self.mapper.values_to_ref
+        while recent and recent[0][0] <= chunk:
+            del values_to_ref[recent.popleft()[1]]
+
+        mapper = self.mapper
+        shards = len(self.unsent)
+        new_refs = dict()
+        for _, values in heapq.merge(*missing_lists):
+            new_mappings = mapper.new_mappings
+            ref = new_refs[values] = mapper.map(values)
+            if mapper.new_mappings != new_mappings:
+                self.unsent[shard_of(values, shards)][values] = ref
+                recent.append((submitted, values))
+        return new_refs
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+class ShardedExtraction(object):
+
+    '''
+    Extract entities of maps in jobs processes.
+
+    Call .close() when done.
+    '''
+
+    def __init__(self, maps, jobs, buffer_size=-1, chunk_size=CHUNK_SIZE):
+        self.maps = maps
+        self.jobs = jobs
+        self.buffer_size = buffer_size
+        self.chunk_size = chunk_size
+        self.processes = []
+        self.tasks = []
+        self.results = None
+        self.rows = 0
+
+    def start(self, input_header):
+        map_specs = [
+            map_.open(input_header, self.jobs, self.buffer_size)
+            for map_ in self.maps]
+
+        self.tasks = [multiprocessing.Queue() for _ in xrange(self.jobs)]
+        self.results = multiprocessing.Queue()
+        for index in xrange(self.jobs):
+            process = multiprocessing.Process(
+                target=_run_worker,
+                args=(
+                    index, self.tasks, self.results, map_specs,
+                    len(input_header)))
+            process.daemon = True
+            process.start()
+            self.processes.append(process)
+
+        for _ in xrange(self.jobs):
+            _, _, max_refs, sizes = self._receive('ready')
+            for map_, max_ref, size in zip(self.maps, max_refs, sizes):
+                map_.loaded(max_ref, size)
+
+    def _receive(self, *kinds):
+        message = self.results.get()
+        if message[0] == 'error':
+            raise WorkerError(message[2])
+        assert message[0] in kinds, message
+        return message
+
+    def process(self, input_file, output_file):
+        '''
+        Extract the entities of input_file, write the output to output_file
+        '''
+        input_header = parse_records(read_record(input_file)).next()
+        self.start(Header(input_header))
+        csv.writer(output_file).writerow(
+            list(input_header) +
+            [map_.ref_field_map.input_fields[0] for map_ in self.maps])
+
+        jobs = self.jobs
+        chunks = read_blocks(input_file, self.chunk_size)
+        submitted = resolved = written = 0
+        missing = collections.defaultdict(dict)
+        outputs = dict()
+        exhausted = False
+        while not exhausted or written < submitted:
+            in_flight = submitted - written
+            if not exhausted and in_flight < CHUNKS_PER_WORKER * jobs:
+                data = next(chunks, None)
+                if data is None:
+                    exhausted = True
+                    continue
+                new_mappings = [map_.take_unsent() for map_ in self.maps]
+                self.tasks[submitted % jobs].put(
+                    ('parse', submitted, data, new_mappings))
+                submitted += 1
+                continue
+
+            message = self._receive('missing', 'output')
+            if message[0] == 'missing':
+                _, chunk, shard, chunk_missing = message
+                missing[chunk][shard] = chunk_missing
+                while len(missing.get(resolved, ())) == jobs:
+                    self._resolve(resolved, submitted, missing.pop(resolved))
+                    resolved += 1
+            else:
+                _, chunk, data, rows = message
+                outputs[chunk] = data
+                self.rows += rows
+                while written in outputs:
+                    output_file.write(outputs.pop(written))
+                    written += 1
+
+    def _resolve(self, chunk, submitted, shard_missing):
+        new_refs = []
+        for map_index, map_ in enumerate(self.maps):
+            missing_lists = [
+                shard_missing[shard][map_index] for shard in xrange(self.jobs)]
+            new_refs.append(map_.resolve(chunk, submitted, missing_lists))
+        # new mappings are written before the output rows referring to them
+        for map_ in self.maps:
+            map_.file.flush()
+        self.tasks[chunk % self.jobs].put(('resolved', chunk, new_refs))
+
+    def close(self):
+        try:
+            for tasks in self.tasks:
+                tasks.put(None)
+            for process in self.processes:
+                process.join(1)
+                if process.is_alive():
+                    process.terminate()
+        finally:
+            for map_ in self.maps:
+                map_.close()
+
+
+def extract(
+        entity_specs, input_file, output_file, jobs, buffer_size=-1,
+        chunk_size=CHUNK_SIZE):
+    '''
+    Extract (entity_fields, ref_field, map_filename) entity_specs
+    from input_file to output_file in jobs processes.
+
+    Returns the ShardedMap-s of the entities.
+    '''
+    maps = [ShardedMap(*spec) for spec in entity_specs]
+    extraction = ShardedExtraction(maps, jobs, buffer_size, chunk_size)
+    try:
+        extraction.process(input_file, output_file)
+    finally:
+        extraction.close()
+    return maps, extraction.rows
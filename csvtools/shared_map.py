@@ -0,0 +1,67 @@
+'''
+Map file shared by concurrently running extract_map processes
+
+Appending to the map file is serialized by an exclusive lock (flock)
+on the map file.
+A process allocates the final references of its new mappings only when
+appending them, after reading the mappings appended by others since its
+last append:
+values mapped by others meanwhile get their reference,
+new references continue from the largest reference in the map file.
+Until then, new mappings have provisional references, output rows are
+renumbered before being written, see Mapper.commit().
+
+References are allocated under the lock, so there is no need to lease
+reference ranges, and references remain dense.
+'''
+
+import os
+import csv
+import fcntl
+import contextlib
+
+
+@contextlib.contextmanager
+def locked(f, operation=fcntl.LOCK_EX):
+    '''
+    Context manager holding a lock (exclusive by default) on file f
+    '''
+    fcntl.flock(f.fileno(), operation)
+    try:
+        yield f
+    finally:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class SharedMapFile(object):
+
+    '''
+    Map file open for reading and appending, shared with other processes
+    '''
+
+    def __init__(self, f):
+        self.file = f
+        # end of the map file at the last read or append of this process
+        self.position = None
+
+    def read_to_end(self):
+        '''
+        Mark the map file as read up to its current end
+        '''
+        self.position = os.fstat(self.file.fileno()).st_size
+
+    @contextlib.contextmanager
+    def appending(self):
+        '''
+        Context manager locking the map file for appending.
+
+        Yields a reader of the rows appended since the last
+        read_to_end() or appending() - by other processes.
+        '''
+        f = self.file
+        with locked(f):
+            f.seek(self.position)
+            new_data = f.read()
+            yield csv.reader(new_data.splitlines(True))
+            f.flush()
+            self.read_to_end()
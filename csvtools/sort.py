@@ -0,0 +1,314 @@
+'''
+Sort csv rows by named fields in bounded memory
+
+Usage:
+sort [--input FILE] [--numeric] [--run-rows N] [--jobs N] [--temp-dir DIR]
+    fields
+sort --merge [--numeric] fields sorted.csv [...]
+
+fields: comma separated names of the key fields
+
+The input is read in runs of at most --run-rows rows, runs are sorted
+(in --jobs processes) and written to temporary files, which are then
+merged.
+At most MERGE_FAN_IN files are merged at once: with more runs, consecutive
+runs are merged to temporary files in passes.
+Input fitting in one run is sorted in memory.
+With --merge already sorted files are merged.
+
+Sorting is stable: rows with equal keys keep their input order
+(and the order of the files given to --merge).
+Quoted fields with new lines are kept intact.
+
+With --numeric values, that are not numbers (e.g. empty values or NaN)
+sort after the numbers, in string order.
+'''
+
+import os
+import sys
+import csv
+import heapq
+import itertools
+import shutil
+import argparse
+import tempfile
+import collections
+import multiprocessing
+
+from csvtools.lib import Header, projection, numeric_value
+from csvtools.exceptions import MissingFieldError
+from csvtools.blocks import read_blocks
+from csvtools.mapped_file import open_mapped
+from csvtools import cli
+
+
+RUN_ROWS = 1000000
+# maximum number of files merged at once
+MERGE_FAN_IN = 64
+
+
+class BadInput(Exception):
+    pass
+
+
+def sort_key(indices, numeric=False):
+    '''
+    Function returning the key of a row: a tuple of the fields at indices,
+    converted to numbers if numeric
+    '''
+    extract = projection(indices)
+    if not numeric:
+        return extract
+
+    def key(row):
+        return tuple(numeric_value(value) for value in extract(row))
+    return key
+
+
+def key_indices(header, fields):
+    missing = set(fields) - set(header)
+    if missing:
+        raise MissingFieldError(missing)
+    return header.indices(fields)
+
+
+def write_run(rows, indices, numeric, filename):
+    '''
+    Sort rows and write them to filename
+    '''
+    rows.sort(key=sort_key(indices, numeric))
+    with open(filename, 'wb') as f:
+        csv.writer(f).writerows(rows)
+    return filename
+
+
+def _keyed_rows(rows, key, seq):
+    for row_number, row in enumerate(rows):
+        yield key(row), seq, row_number, row
+
+
+def merge(sorted_rows_list, key):
+    '''
+    Iterator over the rows of sorted iterables of rows, in key order.
+
+    Rows with equal keys are in the order of sorted_rows_list.
+    '''
+    keyed = [
+        _keyed_rows(rows, key, seq)
+        for seq, rows in enumerate(sorted_rows_list)]
+    for item in heapq.merge(*keyed):
+        yield item[-1]
+
+
+def _merged_files(filenames, key):
+    '''
+    Iterator over the rows of sorted files, in key order
+    '''
+    files = [open(filename, 'rb') for filename in filenames]
+    try:
+        for row in merge(map(csv.reader, files), key):
+            yield row
+    finally:
+        for f in files:
+            f.close()
+
+
+class Sorter(object):
+
+    '''
+    Sort rows by fields in runs of at most run_rows rows.
+
+    Runs are sorted in jobs processes, while reading the next runs,
+    at most 2 * jobs runs are in memory.
+    At most fan_in run files are open at once while merging.
+    '''
+
+    def __init__(
+            self, fields, numeric=False, run_rows=RUN_ROWS, jobs=1,
+            temp_dir=None, fan_in=MERGE_FAN_IN):
+        self.fields = fields
+        self.numeric = numeric
+        self.run_rows = run_rows
+        self.jobs = jobs
+        self.temp_dir = temp_dir
+        self.fan_in = fan_in
+        self.runs = 0
+        self.merged_runs = 0
+
+    def rows(self, reader):
+        '''
+        Iterator over output rows - the first one is the output header
+        '''
+        ireader = iter(reader)
+        header = Header(ireader.next())
+        indices = key_indices(header, self.fields)
+        key = sort_key(indices, self.numeric)
+
+        yield list(header)
+
+        blocks = read_blocks(ireader, self.run_rows)
+        first_run = next(blocks, [])
+        if len(first_run) < self.run_rows:
+            # fits in memory
+            first_run.sort(key=key)
+            for row in first_run:
+                yield row
+            return
+
+        run_dir = tempfile.mkdtemp(prefix='csv_sort.', dir=self.temp_dir)
+        try:
+            run_filenames = self._write_runs(
+                [first_run], blocks, indices, run_dir)
+            while len(run_filenames) > self.fan_in:
+                run_filenames = self._merge_pass(run_filenames, key, run_dir)
+            for row in _merged_files(run_filenames, key):
+                yield row
+        finally:
+            shutil.rmtree(run_dir)
+
+    def _merge_pass(self, filenames, key, run_dir):
+        '''
+        Merge groups of fan_in consecutive run files,
+        return the merged filenames in input order
+        '''
+        merged_filenames = []
+        for i in xrange(0, len(filenames), self.fan_in):
+            group = filenames[i:i + self.fan_in]
+            if len(group) == 1:
+                merged_filenames.extend(group)
+                continue
+            self.merged_runs += 1
+            merged_filename = os.path.join(
+                run_dir, 'merged{:06d}.csv'.format(self.merged_runs))
+            with open(merged_filename, 'wb') as f:
+                csv.writer(f).writerows(_merged_files(group, key))
+            # free disk space early
+            for filename in group:
+                os.remove(filename)
+            merged_filenames.append(merged_filename)
+        return merged_filenames
+
+    def _write_runs(self, first_runs, runs, indices, run_dir):
+        '''
+        Write sorted runs to run_dir, return their filenames in input order
+        '''
+        def run_filename():
+            self.runs += 1
+            return os.path.join(run_dir, '{:06d}.csv'.format(self.runs))
+
+        runs = itertools.chain(first_runs, runs)
+        if self.jobs == 1:
+            return [
+                write_run(rows, indices, self.numeric, run_filename())
+                for rows in runs]
+
+        filenames = []
+        pool = multiprocessing.Pool(self.jobs)
+        try:
+            pending = collections.deque()
+            for rows in runs:
+                pending.append(
+                    pool.apply_async(
+                        write_run,
+                        (rows, indices, self.numeric, run_filename())))
+                if len(pending) >= self.jobs:
+                    filenames.append(pending.popleft().get())
+            while pending:
+                filenames.append(pending.popleft().get())
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+        return filenames
+
+    def process(self, reader, writer):
+        writer.writerows(self.rows(reader))
+
+
+def merge_sorted(readers, fields, numeric=False):
+    '''
+    Iterator over the merged rows of sorted readers having the same header
+    - the first one is the header
+    '''
+    readers = [iter(reader) for reader in readers]
+    headers = [reader.next() for reader in readers]
+    header = Header(headers[0])
+    if any(list(other) != list(header) for other in headers[1:]):
+        raise BadInput('headers differ')
+    key = sort_key(key_indices(header, fields), numeric)
+
+    yield list(header)
+    for row in merge(readers, key):
+        yield row
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser()
+
+    cli.add_input_argument(parser)
+    cli.add_stats_argument(parser)
+    cli.add_buffer_argument(parser)
+    parser.add_argument(
+        '--numeric', action='store_true', default=False,
+        help='compare key fields as numbers')
+    parser.add_argument(
+        '--run-rows', type=int, default=RUN_ROWS, metavar='N',
+        help='sort at most N rows in memory at once (%(default)s)')
+    parser.add_argument(
+        '--jobs', type=int, default=1, metavar='N',
+        help='sort runs in N processes (%(default)s)')
+    parser.add_argument(
+        '--temp-dir', default=None, metavar='DIR',
+        help='directory for the sorted runs (system default)')
+    parser.add_argument(
+        '--merge', action='store_true', default=False,
+        help='merge already sorted files')
+    parser.add_argument(
+        'fields', type=lambda fields: fields.split(','),
+        help='comma separated names of the fields to sort by')
+    parser.add_argument(
+        'sorted_filenames', metavar='sorted_filename', nargs='*',
+        help='sorted files to merge (with --merge)')
+
+    args = parser.parse_args(args)
+    if args.merge != bool(args.sorted_filenames):
+        parser.error('sorted files are to be given exactly with --merge')
+    if args.run_rows < 1 or args.jobs < 1:
+        parser.error('--run-rows and --jobs must be positive')
+    return args
+
+
+def main():
+    args = parse_args(sys.argv[1:])
+    stats = cli.stats_for(args, 'sort')
+
+    with cli.output_file(args.buffer_size) as output_file:
+        writer = stats.writer(csv.writer(stats.output_file(output_file)))
+        if args.merge:
+            sorted_files = []
+            try:
+                for filename in args.sorted_filenames:
+                    sorted_files.append(open_mapped(filename))
+                readers = [
+                    stats.reader(csv.reader(stats.input_file(f)))
+                    for f in sorted_files]
+                writer.writerows(
+                    merge_sorted(readers, args.fields, args.numeric))
+            finally:
+                for f in sorted_files:
+                    f.close()
+        else:
+            sorter = Sorter(
+                args.fields, numeric=args.numeric, run_rows=args.run_rows,
+                jobs=args.jobs, temp_dir=args.temp_dir)
+            with cli.input_file(args.input_filename) as input_file:
+                reader = stats.reader(
+                    csv.reader(stats.input_file(input_file)))
+                sorter.process(reader, writer)
+            stats.count('runs', sorter.runs)
+
+
+if __name__ == '__main__':
+    main()
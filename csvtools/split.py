@@ -1,10 +1,25 @@
+import io
 import csv
 import sys
+import zlib
+import resource
+import itertools
+import collections
+
+import argparse
+from csvtools import cli
+from csvtools.lib import Header, projection
+from csvtools.exceptions import MissingFieldError
+from csvtools.rawlines import BLOCK_SIZE, read_block, read_record
+from csvtools.stats import NoStats
 
 
 class StreamSplitter(object):
 
-    def __init__(self, reader, prefix, chunk_size):
+    def __init__(
+            self, reader, prefix, chunk_size, stats=None, buffer_size=-1):
+        self.stats = stats or NoStats()
+        self.buffer_size = buffer_size
         self.prefix = prefix
         self.chunk_size = chunk_size
         self.file_index = 0
@@ -21,35 +36,274 @@ class StreamSplitter(object):
         if self.output_file is not None:
             self.close_file()
 
-        self.output_file = open(self.prefix + str(self.file_index), 'w')
-        writer = csv.writer(self.output_file)
+        self.output_file = open(
+            self.prefix + str(self.file_index), 'w', self.buffer_size)
+        writer = self.stats.writer(
+            csv.writer(self.stats.output_file(self.output_file)))
         writer.writerow(self.header)
         return writer
 
     def split(self):
         chunk_size = self.chunk_size
+        reader = self.reader
 
         writer = self.new_file()
-        count = 0
-
-        for row in self.reader:
-            if count == chunk_size:
-                writer = self.new_file()
-                count = 0
+        writer.writerows(itertools.islice(reader, chunk_size))
 
+        for row in reader:
+            writer = self.new_file()
             writer.writerow(row)
-            count += 1
+            writer.writerows(itertools.islice(reader, chunk_size - 1))
 
         self.close_file()
 
 
-def split(reader, prefix, chunk_size):
-    StreamSplitter(reader, prefix, chunk_size).split()
+def split(reader, prefix, chunk_size, stats=None, buffer_size=-1):
+    StreamSplitter(reader, prefix, chunk_size, stats, buffer_size).split()
+
+
+class RawSplitter(object):
+
+    '''
+    Split the text of a csv file to files of about chunk_size bytes,
+    copying whole records, without parsing them.
+
+    Every file starts with the header, and has at least one record
+    (if there is any).
+    '''
+
+    def __init__(
+            self, input_file, prefix, chunk_size, stats=None, buffer_size=-1):
+        self.stats = stats or NoStats()
+        self.buffer_size = buffer_size
+        self.prefix = prefix
+        self.input_file = input_file
+        self.header = read_record(input_file)
+        # record text in a file besides the header
+        self.records_size = max(1, chunk_size - len(self.header))
+        self.file_index = 0
+
+    def read_block(self, size):
+        return read_block(self.input_file, min(size, BLOCK_SIZE))
+
+    def split(self):
+        if not self.header:
+            return
+
+        records_size = self.records_size
+        block = self.read_block(records_size)
+        while True:
+            with open(
+                    self.prefix + str(self.file_index), 'wb',
+                    self.buffer_size) as f:
+                output_file = self.stats.output_file(f)
+                output_file.write(self.header)
+                written = 0
+                while block:
+                    output_file.write(block)
+                    written += len(block)
+                    if written >= records_size:
+                        break
+                    block = self.read_block(records_size - written)
+            self.file_index += 1
+
+            block = self.read_block(records_size)
+            if not block:
+                return
+
+
+def split_bytes(
+        input_file, prefix, chunk_size, stats=None, buffer_size=-1):
+    RawSplitter(input_file, prefix, chunk_size, stats, buffer_size).split()
+
+
+# files kept open for other purposes than buckets
+RESERVED_FILES = 16
+# total size of the buffers of open bucket files
+BUFFER_BUDGET = 64 * 1024 * 1024
+# rows written to a bucket at once
+BATCH_ROWS = 1000
+# total number of rows waiting to be written to buckets
+PENDING_ROWS = 1000000
+
+
+def max_open_files():
+    soft_limit, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft_limit == resource.RLIM_INFINITY:
+        soft_limit = 1 << 16
+    return max(1, soft_limit - RESERVED_FILES)
+
+
+def bucket_of(values, buckets):
+    '''
+    Bucket of key values - the same in every run, on every platform
+    '''
+    # length prefixed values: unambiguous
+    key = ''.join('{:d}:{}'.format(len(value), value) for value in values)
+    return (zlib.crc32(key) & 0xffffffff) % buckets
+
+
+class FilePool(object):
+
+    '''
+    csv writers of files, at most max_open files are open at a time.
+
+    When another file is needed, the least recently used one is closed,
+    to be reopened for appending when needed again.
+    '''
+
+    def __init__(self, max_open, stats=None, buffer_size=-1):
+        self.max_open = max_open
+        self.stats = stats or NoStats()
+        self.buffer_size = buffer_size
+        # filename -> (file, writer), least recently used first
+        self.open_files = collections.OrderedDict()
+        self.created = set()
+        self.opened = 0
+
+    def writer(self, filename):
+        entry = self.open_files.pop(filename, None)
+        if entry is None:
+            if len(self.open_files) >= self.max_open:
+                _, (f, _) = self.open_files.popitem(last=False)
+                f.close()
+            mode = 'ab' if filename in self.created else 'wb'
+            f = open(filename, mode, self.buffer_size)
+            self.created.add(filename)
+            self.opened += 1
+            entry = (f, csv.writer(self.stats.output_file(f)))
+        self.open_files[filename] = entry
+        return entry[1]
+
+    def close(self):
+        while self.open_files:
+            _, (f, _) = self.open_files.popitem(last=False)
+            f.close()
+
+
+class BucketSplitter(object):
+
+    '''
+    Split rows to buckets by the hash of key fields.
+
+    Every bucket file has the header, even if it has no rows.
+    Rows are collected per bucket and written in batches, through a pool
+    of open files, when there are more buckets than files can be open.
+    '''
+
+    def __init__(
+            self, reader, prefix, fields, buckets, stats=None,
+            buffer_size=-1, max_open=None):
+        self.stats = stats or NoStats()
+        self.reader = iter(reader)
+        self.prefix = prefix
+        self.fields = fields
+        self.buckets = buckets
+
+        max_open = min(buckets, max_open or max_open_files())
+        if buffer_size > 0:
+            buffer_size = max(
+                io.DEFAULT_BUFFER_SIZE,
+                min(buffer_size, BUFFER_BUDGET // max_open))
+        self.pool = FilePool(max_open, self.stats, buffer_size)
+        self.batch_rows = max(1, min(BATCH_ROWS, PENDING_ROWS // buckets))
+
+    def split(self):
+        header = self.reader.next()
+        missing = set(self.fields) - set(header)
+        if missing:
+            raise MissingFieldError(missing)
+        extract_key = projection(Header(header).indices(self.fields))
+
+        buckets = self.buckets
+        filenames = [self.prefix + str(i) for i in range(buckets)]
+        writer = self.pool.writer
+        try:
+            for filename in filenames:
+                writer(filename).writerow(header)
+
+            batch_rows = self.batch_rows
+            batches = [[] for _ in xrange(buckets)]
+            for row in self.reader:
+                bucket = bucket_of(extract_key(row), buckets)
+                batch = batches[bucket]
+                batch.append(row)
+                if len(batch) >= batch_rows:
+                    writer(filenames[bucket]).writerows(batch)
+                    batches[bucket] = []
+
+            for filename, batch in zip(filenames, batches):
+                if batch:
+                    writer(filename).writerows(batch)
+        finally:
+            self.pool.close()
+        self.stats.count('files_opened', self.pool.opened)
+
+
+def split_buckets(
+        reader, prefix, fields, buckets, stats=None, buffer_size=-1,
+        max_open=None):
+    BucketSplitter(
+        reader, prefix, fields, buckets, stats, buffer_size,
+        max_open).split()
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser()
+
+    cli.add_input_argument(parser)
+    cli.add_stats_argument(parser)
+    cli.add_buffer_argument(parser)
+    parser.add_argument(
+        'prefix', metavar='PREFIX',
+        help='output file prefix, output files are PREFIX0, PREFIX1, ...')
+    parser.add_argument(
+        '--bytes', action='store_true', default=False,
+        help='CHUNK_SIZE is the size of output files in bytes,'
+        ' records are copied without parsing')
+    parser.add_argument(
+        '--by', type=lambda fields: fields.split(','), default=None,
+        metavar='FIELDS',
+        help='split rows to --buckets by the hash of these'
+        ' comma separated fields')
+    parser.add_argument(
+        '--buckets', type=int, default=None, metavar='N',
+        help='number of output files with --by')
+    parser.add_argument(
+        'chunk_size', metavar='CHUNK_SIZE', type=int, nargs='?',
+        help='number of data rows in an output file')
+
+    args = parser.parse_args(args)
+    if args.by or args.buckets:
+        if not (args.by and args.buckets):
+            parser.error('--by and --buckets are to be given together')
+        if args.chunk_size is not None or args.bytes:
+            parser.error('--by can not be used with CHUNK_SIZE or --bytes')
+        if args.buckets < 1:
+            parser.error('--buckets must be positive')
+    elif args.chunk_size is None or args.chunk_size < 1:
+        parser.error('CHUNK_SIZE must be positive')
+    return args
 
 
 def main():
-    prefix, chunk_size = sys.argv[1:]
-    split(csv.reader(sys.stdin), prefix, int(chunk_size))
+    args = parse_args(sys.argv[1:])
+    stats = cli.stats_for(args, 'split')
+
+    with cli.input_file(args.input_filename) as input_file:
+        if args.bytes:
+            split_bytes(
+                stats.input_file(input_file), args.prefix, args.chunk_size,
+                stats, args.buffer_size)
+            return
+        reader = stats.reader(csv.reader(stats.input_file(input_file)))
+        if args.by:
+            split_buckets(
+                reader, args.prefix, args.by, args.buckets, stats,
+                args.buffer_size)
+            return
+        split(
+            reader, args.prefix, args.chunk_size, stats, args.buffer_size)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,287 @@
+'''
+Runtime statistics of a tool run
+
+Enabled with the --stats option or by setting the CSVTOOLS_STATS
+environment variable to a non-empty value.
+When enabled, a JSON summary is written to standard error at exit:
+
+- rows (headers included) and bytes read and written
+- wall and CPU time of parsing, writing and transforming,
+  where transforming is the time not spent with parsing or writing
+- CPU time of child processes (e.g. with --jobs)
+- peak memory (maximum resident set size in kilobytes)
+- tool specific counters, e.g. existing and new mappings of extract_map
+
+Timing and counting rows is done per block of rows read and per batch of
+rows written, so that the overhead of measuring stays small.
+Rows are read a block ahead of their processing.
+Output bytes are counted per write call, which adds to the write time.
+'''
+
+import os
+import sys
+import json
+import time
+import atexit
+import resource
+import itertools
+import collections
+
+from csvtools.blocks import read_blocks
+
+
+ENVIRONMENT_VARIABLE = 'CSVTOOLS_STATS'
+
+PARSE = 'parse'
+TRANSFORM = 'transform'
+WRITE = 'write'
+
+# rows read and timed at once, also the batch size for written iterators
+BLOCK_ROWS = 1000
+# bytes of lines read and counted at once when iterating over a file
+READ_SIZE = 64 * 1024
+
+
+class Phase(object):
+
+    def __init__(self):
+        self.wall = 0.0
+        self.cpu = 0.0
+
+    def as_dict(self):
+        return dict(wall=self.wall, cpu=self.cpu)
+
+
+class Stats(object):
+
+    '''
+    Collects statistics through wrapped readers, writers and files
+    '''
+
+    def __init__(self, tool):
+        self.tool = tool
+        self.counters = collections.defaultdict(int)
+        self.phases = collections.defaultdict(Phase)
+        self.output_files = []
+        self.start_wall = time.time()
+        self.start_cpu = time.clock()
+
+    def timed(self, phase_name, function):
+        '''
+        Wrap function, so that time spent in it is added to phase
+        '''
+        phase = self.phases[phase_name]
+
+        def timed_function(*args):
+            start_wall = time.time()
+            start_cpu = time.clock()
+            try:
+                return function(*args)
+            finally:
+                phase.wall += time.time() - start_wall
+                phase.cpu += time.clock() - start_cpu
+        return timed_function
+
+    def timed_iter(self, phase_name, iterable):
+        '''
+        Wrap iterable, so that time spent getting items is added to phase
+        '''
+        next_item = self.timed(phase_name, iter(iterable).next)
+        while True:
+            try:
+                item = next_item()
+            except StopIteration:
+                return
+            yield item
+
+    def count(self, counter, n=1):
+        self.counters[counter] += n
+
+    def reader(self, reader):
+        '''
+        Wrap a csv reader: time parsing, count rows read
+        '''
+        counters = self.counters
+        blocks = self.timed_iter(PARSE, read_blocks(reader, BLOCK_ROWS))
+        for rows in blocks:
+            counters['rows_read'] += len(rows)
+            for row in rows:
+                yield row
+
+    def writer(self, writer):
+        '''
+        Wrap a csv writer: time writing, count rows written
+        '''
+        return StatsWriter(self, writer)
+
+    def input_file(self, input_file):
+        '''
+        Wrap a file: count bytes read
+        '''
+        return CountingInputFile(self, input_file)
+
+    def output_file(self, output_file):
+        '''
+        Wrap a file: count bytes written
+        '''
+        return CountingOutputFile(self, output_file)
+
+    def summary(self):
+        wall = time.time() - self.start_wall
+        cpu = time.clock() - self.start_cpu
+
+        phases = dict(
+            (name, phase.as_dict())
+            for name, phase in self.phases.items()
+            if name != TRANSFORM)
+        phases[TRANSFORM] = dict(
+            wall=max(0.0, wall - sum(p['wall'] for p in phases.values())),
+            cpu=max(0.0, cpu - sum(p['cpu'] for p in phases.values())))
+
+        times = os.times()
+        summary = dict(self.counters)
+        if self.output_files:
+            summary['bytes_written'] = summary.get('bytes_written', 0) + sum(
+                f.bytes_written for f in self.output_files)
+        summary.update(
+            tool=self.tool,
+            wall=wall,
+            cpu=cpu,
+            children_cpu=times[2] + times[3],
+            phases=phases,
+            peak_memory_kb=max(
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss))
+        return summary
+
+    def report(self, output_file=None):
+        output_file = output_file or sys.stderr
+        json.dump(self.summary(), output_file, sort_keys=True)
+        output_file.write('\n')
+
+
+class StatsWriter(object):
+
+    '''
+    Times and counts a writerows call as a whole.
+
+    Rows from an iterator are written in batches, so that producing them
+    is not timed as writing.
+    '''
+
+    def __init__(self, stats, writer):
+        self.counters = stats.counters
+        self.timed_writerow = stats.timed(WRITE, writer.writerow)
+        self.timed_writerows = stats.timed(WRITE, writer.writerows)
+
+    def writerow(self, row):
+        self.counters['rows_written'] += 1
+        self.timed_writerow(row)
+
+    def writerows(self, rows):
+        if isinstance(rows, (list, tuple)):
+            batches = [rows]
+        else:
+            batches = read_blocks(rows, BLOCK_ROWS)
+        for batch in batches:
+            self.counters['rows_written'] += len(batch)
+            self.timed_writerows(batch)
+
+
+class CountingInputFile(object):
+
+    def __init__(self, stats, input_file):
+        self.stats = stats
+        self.input_file = input_file
+
+    def _counted(self, data):
+        self.stats.counters['bytes_read'] += len(data)
+        return data
+
+    def _line_blocks(self):
+        readlines = self.input_file.readlines
+        counters = self.stats.counters
+        for lines in iter(lambda: readlines(READ_SIZE), []):
+            counters['bytes_read'] += sum(itertools.imap(len, lines))
+            yield lines
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self._line_blocks())
+
+    def readline(self, *args):
+        return self._counted(self.input_file.readline(*args))
+
+    def read(self, *args):
+        return self._counted(self.input_file.read(*args))
+
+    def readlines(self, *args):
+        lines = self.input_file.readlines(*args)
+        self.stats.counters['bytes_read'] += sum(len(line) for line in lines)
+        return lines
+
+    def __getattr__(self, name):
+        return getattr(self.input_file, name)
+
+
+class CountingOutputFile(object):
+
+    '''
+    Bytes written are summed by the file and added up by Stats.summary
+    '''
+
+    def __init__(self, stats, output_file):
+        self.output_file = output_file
+        self.bytes_written = 0
+        self.write_data = output_file.write
+        stats.output_files.append(self)
+
+    def write(self, data):
+        self.bytes_written += len(data)
+        self.write_data(data)
+
+    def __getattr__(self, name):
+        return getattr(self.output_file, name)
+
+
+class NoStats(object):
+
+    '''
+    Stats interface doing nothing
+    '''
+
+    def timed(self, phase_name, function):
+        return function
+
+    def timed_iter(self, phase_name, iterable):
+        return iterable
+
+    def count(self, counter, n=1):
+        pass
+
+    def reader(self, reader):
+        return reader
+
+    def writer(self, writer):
+        return writer
+
+    def input_file(self, input_file):
+        return input_file
+
+    def output_file(self, output_file):
+        return output_file
+
+
+def enabled(option=False):
+    return option or bool(os.environ.get(ENVIRONMENT_VARIABLE))
+
+
+def for_tool(tool, enable=False):
+    '''
+    Stats for tool - reported at exit - if enabled, NoStats otherwise
+    '''
+    if not enabled(enable):
+        return NoStats()
+
+    stats = Stats(tool)
+    atexit.register(stats.report)
+    return stats
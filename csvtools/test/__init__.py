@@ -2,11 +2,20 @@ import csv
 from StringIO import StringIO
 import textwrap
 
+from csvtools.field_maps import FieldMaps
+from csvtools.transformer import SimpleTransformer
+
 
 def csv_reader(content):
     return csv.reader(StringIO(textwrap.dedent(content)))
 
 
+def simple_transformer(field_maps_string):
+    field_maps = FieldMaps()
+    field_maps.parse_from(field_maps_string)
+    return SimpleTransformer(field_maps)
+
+
 class ReaderWriter(object):
 
     '''
@@ -0,0 +1,98 @@
+import unittest
+from csvtools.test import ReaderWriter
+import csvtools.batch_writer as m
+
+
+class Test_BatchWriter(unittest.TestCase):
+
+    def test_rows_are_written_when_batch_is_full(self):
+        writer = ReaderWriter()
+        batch_writer = m.BatchWriter(writer, batch_size=2)
+
+        batch_writer.writerow([1])
+        self.assertListEqual([], writer.rows)
+
+        batch_writer.writerow([2])
+        self.assertListEqual([[1], [2]], writer.rows)
+
+    def test_flush(self):
+        writer = ReaderWriter()
+        batch_writer = m.BatchWriter(writer, batch_size=2)
+
+        batch_writer.writerow([1])
+        batch_writer.flush()
+
+        self.assertListEqual([[1]], writer.rows)
+
+    def test_writerows_keeps_order(self):
+        writer = ReaderWriter()
+        batch_writer = m.BatchWriter(writer, batch_size=10)
+
+        batch_writer.writerow([1])
+        batch_writer.writerows([[2], [3]])
+        batch_writer.writerow([4])
+        batch_writer.close()
+
+        self.assertListEqual([[1], [2], [3], [4]], writer.rows)
+
+    def test_context_manager_flushes(self):
+        writer = ReaderWriter()
+
+        with m.BatchWriter(writer) as batch_writer:
+            batch_writer.writerow([1])
+
+        self.assertListEqual([[1]], writer.rows)
+
+
+class OutputFile(object):
+
+    def __init__(self):
+        self.writes = []
+        self.closed = False
+
+    def write(self, data):
+        self.writes.append(data)
+
+    def close(self):
+        self.closed = True
+
+
+class FailingFile(OutputFile):
+
+    def write(self, data):
+        raise IOError('disk full')
+
+
+class Test_FormattingWriter(unittest.TestCase):
+
+    def test_rows_are_written_at_once(self):
+        output_file = OutputFile()
+        writer = m.FormattingWriter(output_file)
+
+        writer.writerows([['a', 'b,c'], ['1', '2']])
+        writer.writerow(['x'])
+
+        self.assertListEqual(
+            ['a,"b,c"\r\n1,2\r\n', 'x\r\n'], output_file.writes)
+
+
+class Test_ThreadedFile(unittest.TestCase):
+
+    def test_data_is_written_in_order(self):
+        output_file = OutputFile()
+
+        with m.ThreadedFile(output_file, queue_size=2) as threaded_file:
+            for i in range(10):
+                threaded_file.write(str(i))
+
+        self.assertListEqual(map(str, range(10)), output_file.writes)
+        self.assertTrue(output_file.closed)
+
+    def test_close_raises_error_of_thread(self):
+        output_file = FailingFile()
+        threaded_file = m.ThreadedFile(output_file)
+        threaded_file.write('1')
+
+        with self.assertRaises(IOError):
+            threaded_file.close()
+        self.assertTrue(output_file.closed)
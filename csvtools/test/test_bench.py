@@ -0,0 +1,66 @@
+import unittest
+from StringIO import StringIO
+import csv
+
+from csvtools.bench.generators import GENERATORS
+import csvtools.bench.runner as m
+
+
+def generate(name, rows, seed=0):
+    output = StringIO()
+    GENERATORS[name](output, rows, seed=seed)
+    return output.getvalue()
+
+
+class Test_generators(unittest.TestCase):
+
+    def test_deterministic(self):
+        for name in GENERATORS:
+            self.assertEqual(generate(name, 10), generate(name, 10), name)
+
+    def test_seed_changes_output(self):
+        for name in GENERATORS:
+            self.assertNotEqual(
+                generate(name, 10), generate(name, 10, seed=1), name)
+
+    def test_header_and_rows(self):
+        for name in GENERATORS:
+            rows = list(csv.reader(StringIO(generate(name, 10))))
+            self.assertEqual(11, len(rows), name)
+            for row in rows:
+                self.assertEqual(len(rows[0]), len(row), name)
+
+
+class Test_compare(unittest.TestCase):
+
+    def results(self, rows_per_s):
+        return dict(b=dict(rows_per_s=rows_per_s))
+
+    def test_regression(self):
+        self.assertEqual(
+            ['b'], m.compare(self.results(80), self.results(100), 0.1))
+
+    def test_within_tolerance(self):
+        self.assertEqual(
+            [], m.compare(self.results(95), self.results(100), 0.1))
+
+    def test_missing_from_baseline(self):
+        self.assertEqual([], m.compare(self.results(10), {}, 0.1))
+
+
+class Test_run_benchmarks(unittest.TestCase):
+
+    def test_zip(self):
+        benchmarks = [b for b in m.BENCHMARKS if b.name == 'zip-narrow']
+
+        results = m.run_benchmarks(benchmarks, rows=10)
+
+        result = results['zip-narrow']
+        self.assertEqual(10, result['rows'])
+        self.assertGreater(result['rows_per_s'], 0)
+        self.assertGreater(result['peak_rss_kb'], 0)
+
+    def test_all(self):
+        results = m.run_benchmarks(m.BENCHMARKS, rows=10)
+
+        self.assertItemsEqual([b.name for b in m.BENCHMARKS], results.keys())
@@ -0,0 +1,13 @@
+import unittest
+
+import csvtools.blocks as m
+
+
+class Test_read_blocks(unittest.TestCase):
+
+    def test_blocks(self):
+        self.assertEqual(
+            [[1, 2], [3, 4], [5]], list(m.read_blocks(range(1, 6), 2)))
+
+    def test_empty(self):
+        self.assertEqual([], list(m.read_blocks([], 2)))
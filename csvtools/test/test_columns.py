@@ -0,0 +1,129 @@
+import unittest
+from temp_dir import within_temp_dir
+import csv
+import os
+from StringIO import StringIO
+import subprocess
+
+from csvtools.test import ReaderWriter, csv_reader
+from csvtools.transformer import SimpleTransformer
+from csvtools.field_maps import FieldMaps
+from csvtools.rmfields import RemoveFields
+from csvtools.stats import NoStats
+import csvtools.columns as m
+
+
+INPUT = (
+    'a,b,c\n'
+    'a1,"b\n1",\n'
+    'a2,"b,2",c2\n')
+
+ROWS = [
+    ['a', 'b', 'c'],
+    ['a1', 'b\n1', ''],
+    ['a2', 'b,2', 'c2']]
+
+
+def write_store(directory='store'):
+    m.write_columns(csv.reader(StringIO(INPUT)), directory)
+    return m.ColumnStore(directory)
+
+
+class TestColumnStore(unittest.TestCase):
+
+    @within_temp_dir
+    def test_round_trip(self):
+        store = write_store()
+
+        self.assertEqual(['a', 'b', 'c'], store.fields)
+        self.assertEqual(2, store.rows)
+        self.assertEqual(ROWS, list(store.reader()))
+
+    @within_temp_dir
+    def test_reader_of_fields(self):
+        store = write_store()
+
+        self.assertEqual(
+            [['c', 'a'], ['', 'a1'], ['c2', 'a2']],
+            list(store.reader(['c', 'a'])))
+
+    @within_temp_dir
+    def test_missing_field_is_an_error(self):
+        store = write_store()
+
+        with self.assertRaises(m.MissingFieldError):
+            list(store.reader(['x']))
+
+    @within_temp_dir
+    def test_manifest_is_written_last(self):
+        with self.assertRaises(m.BadInput):
+            m.write_columns(csv_reader('a,b\n1'), 'store')
+
+        self.assertFalse(m.is_column_store('store'))
+        self.assertTrue(os.path.isdir('store'))
+
+    @within_temp_dir
+    def test_duplicate_fields_are_an_error(self):
+        with self.assertRaises(m.DuplicateFieldError):
+            m.write_columns(csv_reader('a,b,a'), 'store')
+
+
+class TestTransform(unittest.TestCase):
+
+    def transform(self, transformer, store):
+        writer = ReaderWriter()
+        m.transform(transformer, store, NoStats(), writer)
+        return map(list, writer.rows)
+
+    @within_temp_dir
+    def test_select_reads_only_needed_columns(self):
+        store = write_store()
+        field_maps = FieldMaps()
+        field_maps.parse_from('x=c,a')
+        transformer = SimpleTransformer(field_maps)
+
+        self.assertEqual(
+            ['a', 'c'], m.needed_fields(transformer, store.fields))
+        self.assertEqual(
+            [['x', 'a'], ['', 'a1'], ['c2', 'a2']],
+            self.transform(transformer, store))
+
+    @within_temp_dir
+    def test_rmfields(self):
+        store = write_store()
+        transformer = RemoveFields(['b'])
+
+        self.assertEqual(
+            ['a', 'c'], m.needed_fields(transformer, store.fields))
+        self.assertEqual(
+            [['a', 'c'], ['a1', ''], ['a2', 'c2']],
+            self.transform(transformer, store))
+
+
+class Test_script(unittest.TestCase):
+
+    def run_tool(self, cmdline, stdin=''):
+        process = subprocess.Popen(
+            cmdline,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE)
+        stdout, stderr = process.communicate(stdin)
+
+        self.assertEqual('', stderr, stderr)
+        return list(csv.reader(StringIO(stdout)))
+
+    @within_temp_dir
+    def test_tools(self):
+        self.run_tool(['csv_to_columns', 'store'], INPUT)
+
+        self.assertEqual(ROWS, self.run_tool(['columns_to_csv', 'store']))
+        self.assertEqual(
+            [['c', 'a'], ['', 'a1'], ['c2', 'a2']],
+            self.run_tool(['columns_to_csv', '--fields', 'c,a', 'store']))
+        self.assertEqual(
+            [['b'], ['b\n1'], ['b,2']],
+            self.run_tool(['csv_select', '-i', 'store', 'b']))
+        self.assertEqual(
+            [['a'], ['a1'], ['a2']],
+            self.run_tool(['csv_rmfields', '-i', 'store', 'b', 'c']))
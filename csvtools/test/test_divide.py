@@ -0,0 +1,100 @@
+import unittest
+from temp_dir import within_temp_dir
+import csv
+import os
+import subprocess
+
+from csvtools.test import ReaderWriter
+import csvtools.divide as m
+
+
+def read_rows(filename):
+    with open(filename, 'rb') as f:
+        return list(csv.reader(f))
+
+
+def input_rows(rows):
+    return [['a', 'b']] + [
+        [str(i), 'x' * (i % 3) + '\n"'] for i in range(rows)]
+
+
+class Test_record_boundaries(unittest.TestCase):
+
+    def test_cuts_are_record_starts(self):
+        data = 'h\n1\n"2\n2"\n333\n4\n'
+
+        # cuts at 6 (in a quoted field) and 11
+        self.assertEqual([2, 10, 14, 16], m.record_boundaries(data, 2, 3))
+
+    def test_long_record_makes_empty_parts(self):
+        data = 'h\n"1\n1\n1\n1\n1\n1"\n'
+
+        self.assertEqual(
+            [2, len(data), len(data), len(data)],
+            m.record_boundaries(data, 2, 3))
+
+
+class Test_divide(unittest.TestCase):
+
+    @within_temp_dir
+    def test_divide_file(self):
+        rows = input_rows(100)
+        with open('input.csv', 'wb') as f:
+            csv.writer(f).writerows(rows)
+
+        with open('input.csv', 'rb') as f:
+            m.divide_file(f, 'part.', 3)
+
+        parts = [read_rows('part.{}'.format(i)) for i in range(3)]
+        self.assertFalse(os.path.exists('part.3'))
+        for part in parts:
+            self.assertEqual(rows[0], part[0])
+            self.assertTrue(25 < len(part) < 40, len(part))
+        self.assertEqual(rows[1:], sum((part[1:] for part in parts), []))
+
+    @within_temp_dir
+    def test_divide_stream_round_robin(self):
+        reader = ReaderWriter()
+        reader.writerows(input_rows(10))
+
+        m.divide_stream(reader, 'part.', 3)
+
+        rows = input_rows(10)
+        self.assertEqual(
+            [rows[0]] + rows[1::3], read_rows('part.0'))
+        self.assertEqual(
+            [rows[0]] + rows[2::3], read_rows('part.1'))
+        self.assertEqual(
+            [rows[0]] + rows[3::3], read_rows('part.2'))
+
+    @within_temp_dir
+    def test_more_parts_than_rows(self):
+        reader = ReaderWriter()
+        reader.writerows(input_rows(1))
+
+        m.divide_stream(reader, 'part.', 3)
+
+        self.assertEqual(input_rows(1), read_rows('part.0'))
+        self.assertEqual([['a', 'b']], read_rows('part.2'))
+
+
+class Test_script(unittest.TestCase):
+
+    @within_temp_dir
+    def test_file_and_stream(self):
+        rows = input_rows(20)
+        with open('input.csv', 'wb') as f:
+            csv.writer(f).writerows(rows)
+
+        subprocess.check_call(['csv_divide', '-i', 'input.csv', 'f', '4'])
+        with open('input.csv', 'rb') as f:
+            process = subprocess.Popen(
+                ['csv_divide', 's', '4'], stdin=subprocess.PIPE)
+            process.communicate(f.read())
+
+        file_parts = [read_rows('f{}'.format(i)) for i in range(4)]
+        stream_parts = [read_rows('s{}'.format(i)) for i in range(4)]
+        self.assertEqual(rows[1:], sum((p[1:] for p in file_parts), []))
+        self.assertEqual(
+            sorted(rows[1:]), sorted(sum((p[1:] for p in stream_parts), [])))
+        self.assertEqual([6, 6, 6, 6], map(len, stream_parts))
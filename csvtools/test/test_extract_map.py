@@ -4,6 +4,7 @@ import csv
 import textwrap
 from StringIO import StringIO
 import subprocess
+import os
 
 from csvtools.test import ReaderWriter, csv_reader
 from csvtools.lib import FieldsMap
@@ -108,6 +109,30 @@ class TestMap(unittest.TestCase):
         self.assertEqual(2, mapped_id)
         self.assertListEqual([['bb', 2, 'aa']], appender.rows)
 
+    def test_batched_new_mappings_are_pending_until_commit(self):
+        reader = self.map_reader()
+        appender = ReaderWriter()
+        mapper = m.Mapper('id', ['a', 'b'], reader, appender, batch_size=3)
+
+        self.assertEqual(2, mapper.map(('a2', 'b2')))
+        self.assertEqual(3, mapper.map(('a3', 'b3')))
+        self.assertEqual(2, mapper.map(('a2', 'b2')))
+        self.assertListEqual([], appender.rows)
+
+        mapper.commit()
+        self.assertListEqual(
+            [[2, 'a2', 'b2'], [3, 'a3', 'b3']], appender.rows)
+
+    def test_full_batch_is_written(self):
+        reader = self.map_reader()
+        appender = ReaderWriter()
+        mapper = m.Mapper('id', ['a', 'b'], reader, appender, batch_size=2)
+
+        mapper.map(('a2', 'b2'))
+        mapper.map(('a3', 'b3'))
+
+        self.assertEqual(2, len(appender.rows))
+
 
 class ExtractorFixture(object):
 
@@ -198,6 +223,28 @@ class TestEntityExtractor(unittest.TestCase):
             f.appender.rows)
 
 
+class TestEntityExtractorBatches(unittest.TestCase):
+
+    def test_mappings_are_written_before_output_rows(self):
+        mapper_appender = ReaderWriter()
+        extractor = m.EntityExtractor(
+            FieldsMap.parse('id=ref'), FieldsMap.parse('a'),
+            keep_fields=True, batch_size=2)
+        extractor.use_new_mapper(mapper_appender)
+        reader = csv_reader('''\
+            a
+            a1
+            a2
+            a3
+            ''')
+
+        rows = extractor.rows(reader)
+        self.assertEqual(['a', 'ref'], rows.next())
+        for row in rows:
+            ref = row[-1]
+            self.assertIn([ref, row[0]], mapper_appender.rows)
+
+
 class Test_script(unittest.TestCase):
 
     # integration tests
@@ -289,3 +336,213 @@ class Test_script(unittest.TestCase):
                 ['b1', 'a1', 'c3', '1'],
             ],
             stdout_rows)
+
+
+class Test_script_with_index(Test_script):
+
+    CMDLINE = Test_script.CMDLINE[:1] + ['--index'] + Test_script.CMDLINE[1:]
+
+    @within_temp_dir
+    def test_index_is_created(self):
+        self.call_with_entities_file()
+
+        index = m.MapIndex(self.ENTITIES_FILE + '.index')
+        self.assertEqual(3, len(index))
+        self.assertEqual(4, index.max_ref)
+        self.assertEqual(4, index.get(('a2', 'b2')))
+
+    @within_temp_dir
+    def test_second_run_uses_index(self):
+        self.call_with_entities_file()
+        # the mapping is only in the index, map file is not read again
+        with open(self.ENTITIES_FILE, 'w') as f:
+            f.write(self.ENTITIES)
+
+        self.assertListEqual(
+            [
+                ['b', 'a', 'c', 'ab_id'],
+                ['b1', 'a1', 'c1', '1'],
+                ['b2', 'a2', 'c2', '4'],
+                ['b1', 'a1', 'c3', '1'],
+            ],
+            self.call_without_creating_entities_file())
+
+    @within_temp_dir
+    def test_mappings_appended_to_map_are_read(self):
+        self.call_with_entities_file()
+        with open(self.ENTITIES_FILE, 'a') as f:
+            f.write('b7,7,a7\r\n')
+
+        self.STDIN = 'a,b\na7,b7\na8,b8\n'
+        self.assertListEqual(
+            [['a', 'b', 'ab_id'], ['a7', 'b7', '7'], ['a8', 'b8', '8']],
+            self.call_without_creating_entities_file())
+
+    @within_temp_dir
+    def test_index_is_rebuilt_for_shorter_map(self):
+        self.call_with_entities_file()
+        with open(self.ENTITIES_FILE, 'w') as f:
+            f.write('other,id,a\nb2,2,a2\n')
+
+        self.assertListEqual(
+            [
+                ['b', 'a', 'c', 'ab_id'],
+                ['b1', 'a1', 'c1', '3'],
+                ['b2', 'a2', 'c2', '2'],
+                ['b1', 'a1', 'c3', '3'],
+            ],
+            self.call_without_creating_entities_file())
+
+
+class Test_script_compact(Test_script):
+
+    CMDLINE = (
+        Test_script.CMDLINE[:1] + ['--compact', '--memory-limit', '0'] +
+        Test_script.CMDLINE[1:])
+
+    @within_temp_dir
+    def test_spilled_mappings(self):
+        self.STDIN = 'a,b\n' + ''.join(
+            'a{0},b{0}\n'.format(i % 700) for i in range(1400))
+
+        rows = self.call_without_creating_entities_file()
+
+        self.assertEqual(
+            [str(i % 700 + 1) for i in range(1400)],
+            [row[-1] for row in rows[1:]])
+        self.assertEqual(701, len(self.entities()))
+
+
+class Test_entity_specs(unittest.TestCase):
+
+    def test_triples(self):
+        self.assertEqual(
+            [('a', 'id=a_id', 'a.csv'), ('b,c', 'id=bc_id', 'bc.csv')],
+            m.entity_specs(
+                ['a', 'id=a_id', 'a.csv', 'b,c', 'id=bc_id', 'bc.csv']))
+
+    def test_not_triples(self):
+        with self.assertRaises(m.BadEntitySpecs):
+            m.entity_specs(['a', 'id=a_id', 'a.csv', 'b'])
+
+    def test_same_map_file(self):
+        with self.assertRaises(m.BadEntitySpecs):
+            m.entity_specs(['a', 'id=a_id', 'a.csv', 'b', 'id=b_id', 'a.csv'])
+
+
+class Test_script_multiple_entities(unittest.TestCase):
+
+    STDIN = Test_script.STDIN
+
+    @within_temp_dir
+    def test_single_pass(self):
+        with open('entities.csv', 'w') as f:
+            f.write(Test_script.ENTITIES)
+        process = subprocess.Popen(
+            Test_script.CMDLINE + ['c', 'id=c_id', 'c.csv'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE)
+        stdout, stderr = process.communicate(self.STDIN)
+
+        self.assertEqual('', stderr, stderr)
+        self.assertListEqual(
+            [
+                ['b', 'a', 'c', 'ab_id', 'c_id'],
+                ['b1', 'a1', 'c1', '1', '1'],
+                ['b2', 'a2', 'c2', '4', '2'],
+                ['b1', 'a1', 'c3', '1', '3'],
+            ],
+            list(csv.reader(StringIO(stdout))))
+        with open('c.csv') as f:
+            self.assertListEqual(
+                [['id', 'c'], ['1', 'c1'], ['2', 'c2'], ['3', 'c3']],
+                list(csv.reader(f)))
+
+    def test_bad_specs(self):
+        process = subprocess.Popen(
+            Test_script.CMDLINE + ['c', 'id=c_id'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE)
+        process.communicate(self.STDIN)
+
+        self.assertEqual(2, process.returncode)
+
+
+class Test_script_sharded(Test_script):
+
+    CMDLINE = (
+        Test_script.CMDLINE[:1] + ['--jobs', '2'] + Test_script.CMDLINE[1:])
+
+
+class Test_script_journal(Test_script):
+
+    CMDLINE = (
+        Test_script.CMDLINE[:1] + ['--journal', '--batch-size', '1'] +
+        Test_script.CMDLINE[1:])
+
+    @within_temp_dir
+    def test_journal_is_committed(self):
+        self.call_with_entities_file()
+
+        journal = m.Journal(self.ENTITIES_FILE)
+        self.assertEqual(
+            os.path.getsize(self.ENTITIES_FILE), journal.committed_size())
+
+    @within_temp_dir
+    def test_uncommitted_mappings_are_removed(self):
+        self.call_with_entities_file()
+        # crash after writing, before commit
+        with open(self.ENTITIES_FILE, 'a') as f:
+            f.write('b7,7,a7\r\nb8,')
+
+        self.STDIN = 'a,b\na7,b7\n'
+        self.assertListEqual(
+            [['a', 'b', 'ab_id'], ['a7', 'b7', '5']],
+            self.call_without_creating_entities_file())
+        self.assertEqual(['b7', '5', 'a7'], self.entities()[-1])
+
+    @within_temp_dir
+    def test_run_without_journal_stops_journaling(self):
+        self.call_with_entities_file()
+        self.CMDLINE = Test_script.CMDLINE
+        self.STDIN = 'a,b\na7,b7\n'
+        self.call_without_creating_entities_file()
+
+        self.assertIsNone(m.Journal(self.ENTITIES_FILE).committed_size())
+        self.assertEqual(['b7', '5', 'a7'], self.entities()[-1])
+
+    @within_temp_dir
+    def test_sharded_run_stops_journaling(self):
+        self.call_with_entities_file()
+        self.CMDLINE = Test_script_sharded.CMDLINE
+        self.STDIN = 'a,b\na7,b7\n'
+        self.call_without_creating_entities_file()
+        self.CMDLINE = Test_script.CMDLINE
+        self.STDIN = 'a,b\na8,b8\n'
+
+        self.assertListEqual(
+            [['a', 'b', 'ab_id'], ['a8', 'b8', '6']],
+            self.call_without_creating_entities_file())
+        self.assertIsNone(m.Journal(self.ENTITIES_FILE).committed_size())
+        self.assertEqual(
+            [['b7', '5', 'a7'], ['b8', '6', 'a8']], self.entities()[-2:])
+
+
+class Test_script_shared(Test_script):
+
+    CMDLINE = (
+        Test_script.CMDLINE[:1] + ['--shared', '--journal'] +
+        Test_script.CMDLINE[1:])
+
+    @within_temp_dir
+    def test_run_without_journal_stops_journaling(self):
+        self.call_with_entities_file()
+        self.CMDLINE = (
+            Test_script.CMDLINE[:1] + ['--shared'] + Test_script.CMDLINE[1:])
+        self.STDIN = 'a,b\na7,b7\n'
+        self.call_without_creating_entities_file()
+
+        self.assertIsNone(m.Journal(self.ENTITIES_FILE).committed_size())
+        self.assertEqual(['b7', '5', 'a7'], self.entities()[-1])
@@ -0,0 +1,181 @@
+import unittest
+from temp_dir import within_temp_dir
+import csv
+import textwrap
+from StringIO import StringIO
+import subprocess
+
+from csvtools.test import ReaderWriter, csv_reader
+import csvtools.inflate_map as m
+
+
+MAP = (
+    'other,id,a\n'
+    'b1,1,a1\n'
+    '"b,3",3,"a\n3"\n'
+    'b2,2,a2\n')
+
+
+class TestRefTable(unittest.TestCase):
+
+    def table(self):
+        return m.RefTable('id', ['a', 'other'], StringIO(MAP))
+
+    def test_get(self):
+        table = self.table()
+
+        self.assertEqual(('a1', 'b1'), table.get(1))
+        self.assertEqual(('a2', 'b2'), table.get(2))
+        self.assertEqual(('a\n3', 'b,3'), table.get(3))
+
+    def test_unknown_reference_is_an_error(self):
+        table = self.table()
+
+        for ref in (0, 4, 100, -1):
+            with self.assertRaises(m.UnknownReferenceError):
+                table.get(ref)
+
+    def test_missing_map_field_is_an_error(self):
+        with self.assertRaises(m.MissingFieldError):
+            m.RefTable('id', ['a', 'x'], StringIO(MAP))
+
+    def test_empty_map_is_an_error(self):
+        with self.assertRaises(m.MissingFieldError):
+            m.RefTable('id', ['a'], StringIO(''))
+
+
+class TestMappedRefTable(unittest.TestCase):
+
+    TABLE = m.MappedRefTable
+
+    @within_temp_dir
+    def test_get(self):
+        with open('map.csv', 'wb') as f:
+            f.write(MAP)
+
+        table = self.TABLE('id', ['a', 'other'], open('map.csv', 'rb'))
+        try:
+            self.assertEqual(('a\n3', 'b,3'), table.get(3))
+            self.assertEqual(('a1', 'b1'), table.get(1))
+            self.assertEqual(('a2', 'b2'), table.get(2))
+            for ref in (0, 4, -1):
+                with self.assertRaises(m.UnknownReferenceError):
+                    table.get(ref)
+        finally:
+            table.close()
+
+    @within_temp_dir
+    def test_empty_map_is_an_error(self):
+        open('map.csv', 'wb').close()
+
+        with self.assertRaises(m.MissingFieldError):
+            self.TABLE('id', ['a'], open('map.csv', 'rb'))
+
+
+class TestRefTable_file(TestMappedRefTable):
+
+    TABLE = m.RefTable
+
+
+class TestMapInflater(unittest.TestCase):
+
+    def inflater(self, keep_ref=False):
+        inflater = m.new_inflater('a,other=b', 'id=ab_id', keep_ref=keep_ref)
+        inflater.use_table(
+            m.RefTable(
+                inflater.map_ref_field, inflater.map_fields, StringIO(MAP)))
+        return inflater
+
+    def reader(self):
+        return csv_reader('''\
+            c,ab_id
+            c1,1
+            c2,3
+            c3,1
+            ''')
+
+    def test_map_fields(self):
+        inflater = self.inflater()
+
+        self.assertEqual('id', inflater.map_ref_field)
+        self.assertEqual(('a', 'other'), tuple(inflater.map_fields))
+
+    def test_process(self):
+        writer = ReaderWriter()
+
+        self.inflater().process(self.reader(), writer)
+
+        self.assertListEqual(
+            [
+                ['c', 'a', 'b'],
+                ['c1', 'a1', 'b1'],
+                ['c2', 'a\n3', 'b,3'],
+                ['c3', 'a1', 'b1'],
+            ],
+            [list(row) for row in writer.rows])
+
+    def test_keep_ref(self):
+        rows = list(self.inflater(keep_ref=True).rows(self.reader()))
+
+        self.assertListEqual(['c', 'ab_id', 'a', 'b'], list(rows[0]))
+        self.assertListEqual(['c1', '1', 'a1', 'b1'], list(rows[1]))
+
+    def test_unknown_reference_is_an_error(self):
+        reader = csv_reader('''\
+            c,ab_id
+            c1,7
+            ''')
+
+        with self.assertRaises(m.UnknownReferenceError):
+            list(self.inflater().rows(reader))
+
+
+class Test_script(unittest.TestCase):
+
+    # integration tests
+
+    STDIN = textwrap.dedent('''\
+        b,a,c
+        b1,a1,c1
+        b2,a2,c2
+        b1,a1,c3
+        ''')
+
+    def run_tool(self, cmdline, stdin):
+        process = subprocess.Popen(
+            cmdline,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE)
+        stdout, stderr = process.communicate(stdin)
+
+        self.assertEqual('', stderr, stderr)
+        return stdout
+
+    def round_trip(self, *options):
+        extracted = self.run_tool(
+            ['csv_extract_map', 'a,other=b', 'id=ab_id', 'map.csv'],
+            self.STDIN)
+        reduced = self.run_tool(['csv_rmfields', 'a', 'b'], extracted)
+        return list(
+            csv.reader(
+                StringIO(
+                    self.run_tool(
+                        ['csv_inflate_map'] + list(options) +
+                        ['a,other=b', 'id=ab_id', 'map.csv'],
+                        reduced))))
+
+    @within_temp_dir
+    def test_extract_inflate_round_trip(self):
+        self.assertListEqual(
+            [
+                ['c', 'a', 'b'],
+                ['c1', 'a1', 'b1'],
+                ['c2', 'a2', 'b2'],
+                ['c3', 'a1', 'b1'],
+            ],
+            self.round_trip())
+
+    @within_temp_dir
+    def test_on_disk_round_trip(self):
+        self.assertListEqual(self.round_trip(), self.round_trip('--on-disk'))
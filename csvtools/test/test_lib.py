@@ -32,6 +32,12 @@ class TestHeader(unittest.TestCase):
         extractors = self.header.extractors(['b', 'a'])
         self.assertEqual([2, 1], [x([1, 2, 3]) for x in extractors])
 
+    def test_index(self):
+        self.assertEqual(1, self.header.index('b'))
+
+    def test_indices(self):
+        self.assertEqual([2, 0], self.header.indices(['c', 'a']))
+
 
 class Seq_extractor_Tests(object):
     # Mixin class adding tests for sequence extractors
@@ -72,6 +78,48 @@ class Test_tuple_extractor(Seq_extractor_Tests, unittest.TestCase):
     function_under_test = staticmethod(m.tuple_extractor)
 
 
+class Test_projection(unittest.TestCase):
+
+    def test_tuple(self):
+        project = m.projection([2, 0])
+        self.assertEqual((3, 1), project([1, 2, 3]))
+
+    def test_tuple_of_one_item(self):
+        project = m.projection([1])
+        self.assertEqual((2,), project([1, 2, 3]))
+
+    def test_empty_tuple(self):
+        project = m.projection([])
+        self.assertEqual((), project([1, 2, 3]))
+
+    def test_list(self):
+        project = m.projection([2, 0], list)
+        self.assertEqual([3, 1], project([1, 2, 3]))
+
+    def test_list_of_one_item(self):
+        project = m.projection([1], list)
+        self.assertEqual([2], project([1, 2, 3]))
+
+    def test_none_index_extracts_none(self):
+        project = m.projection([None, 1])
+        self.assertEqual((None, 2), project([1, 2, 3]))
+
+    def test_works_with_iterator_parameter(self):
+        project = m.projection(iter([2, 1, 0]), list)
+        self.assertEqual(['c', 'b', 'a'], project('abc'))
+
+
+class Test_numeric_value(unittest.TestCase):
+
+    def test_numbers(self):
+        self.assertEqual(
+            [12, -1.5, 1e3], map(m.numeric_value, ['12', '-1.5', '1e3']))
+
+    def test_non_numbers_are_kept(self):
+        self.assertEqual(
+            ['', 'a', 'nan'], map(m.numeric_value, ['', 'a', 'nan']))
+
+
 class TestFieldsMap_parse(unittest.TestCase):
 
     def test_input_fields(self):
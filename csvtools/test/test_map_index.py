@@ -0,0 +1,84 @@
+import unittest
+from temp_dir import within_temp_dir
+
+import csvtools.map_index as m
+
+
+class Test_MapIndex(unittest.TestCase):
+
+    @within_temp_dir
+    def test_new_index_is_empty(self):
+        index = m.MapIndex('map.csv.index')
+
+        self.assertEqual(0, len(index))
+        self.assertEqual(0, index.offset)
+        self.assertEqual(0, index.max_ref)
+        self.assertIsNone(index.get(('a', 'b')))
+
+    @within_temp_dir
+    def test_mappings(self):
+        index = m.MapIndex('map.csv.index')
+        index[('a', 'b')] = 1
+        index[('a', 'c')] = 2
+
+        self.assertEqual(1, index.get(('a', 'b')))
+        self.assertEqual(2, index.get(('a', 'c')))
+        self.assertIsNone(index.get(('a', 'bc')))
+        self.assertEqual(2, len(index))
+
+    @within_temp_dir
+    def test_remapping_does_not_change_size(self):
+        index = m.MapIndex('map.csv.index')
+        index[('a',)] = 1
+        index[('a',)] = 2
+
+        self.assertEqual(2, index.get(('a',)))
+        self.assertEqual(1, len(index))
+
+    @within_temp_dir
+    def test_committed_state_is_persistent(self):
+        index = m.MapIndex('map.csv.index')
+        index.reset(('id', 'a'))
+        index[('a',)] = 3
+        index.commit(100, 3)
+        index.close()
+
+        index = m.MapIndex('map.csv.index')
+        self.assertEqual(3, index.get(('a',)))
+        self.assertEqual(100, index.offset)
+        self.assertEqual(3, index.max_ref)
+        self.assertEqual(1, len(index))
+        self.assertTrue(index.matches(('id', 'a'), 100))
+
+    @within_temp_dir
+    def test_uncommitted_changes_are_lost(self):
+        index = m.MapIndex('map.csv.index')
+        index[('a',)] = 3
+        index.close()
+
+        index = m.MapIndex('map.csv.index')
+        self.assertIsNone(index.get(('a',)))
+        self.assertEqual(0, len(index))
+
+    @within_temp_dir
+    def test_matches(self):
+        index = m.MapIndex('map.csv.index')
+        index.reset(('id', 'a'))
+        index.commit(100, 3)
+
+        self.assertTrue(index.matches(('id', 'a'), 200))
+        self.assertFalse(index.matches(('id', 'a'), 99))
+        self.assertFalse(index.matches(('id', 'b'), 100))
+
+    @within_temp_dir
+    def test_reset(self):
+        index = m.MapIndex('map.csv.index')
+        index[('a',)] = 3
+        index.commit(100, 3)
+
+        index.reset(('id', 'a'))
+
+        self.assertIsNone(index.get(('a',)))
+        self.assertEqual(0, len(index))
+        self.assertEqual(0, index.offset)
+        self.assertEqual(0, index.max_ref)
@@ -0,0 +1,81 @@
+import unittest
+from temp_dir import within_temp_dir
+import os
+
+import csvtools.map_journal as m
+
+
+def write(filename, content):
+    with open(filename, 'w') as f:
+        f.write(content)
+
+
+def read(filename):
+    with open(filename) as f:
+        return f.read()
+
+
+class Test_Journal(unittest.TestCase):
+
+    @within_temp_dir
+    def test_not_committed(self):
+        journal = m.Journal('map.csv')
+
+        self.assertIsNone(journal.committed_size())
+        self.assertEqual(0, journal.recover())
+
+    @within_temp_dir
+    def test_commit_records_size(self):
+        journal = m.Journal('map.csv')
+        with open('map.csv', 'a') as f:
+            f.write('id,a\n')
+            journal.commit(f)
+
+        self.assertEqual(5, journal.committed_size())
+        self.assertTrue(os.path.exists('map.csv.journal'))
+
+    @within_temp_dir
+    def test_recover_truncates_uncommitted_data(self):
+        journal = m.Journal('map.csv')
+        with open('map.csv', 'a') as f:
+            f.write('id,a\n1,a\n')
+            journal.commit(f)
+            f.write('2,b\n3,')
+
+        self.assertEqual(6, journal.recover())
+        self.assertEqual('id,a\n1,a\n', read('map.csv'))
+
+    @within_temp_dir
+    def test_recover_keeps_committed_data(self):
+        journal = m.Journal('map.csv')
+        with open('map.csv', 'a') as f:
+            f.write('id,a\n1,a\n')
+            journal.commit(f)
+
+        self.assertEqual(0, journal.recover())
+        self.assertEqual('id,a\n1,a\n', read('map.csv'))
+
+    @within_temp_dir
+    def test_remove(self):
+        journal = m.Journal('map.csv')
+        with open('map.csv', 'a') as f:
+            journal.commit(f)
+
+        journal.remove()
+
+        self.assertIsNone(journal.committed_size())
+
+
+class Test_JournaledWriter(unittest.TestCase):
+
+    @within_temp_dir
+    def test_writes_are_committed(self):
+        journal = m.Journal('map.csv')
+        with open('map.csv', 'a') as f:
+            writer = m.JournaledWriter(f, journal)
+            writer.writerow(['id', 'a'])
+            self.assertEqual(len('id,a\r\n'), journal.committed_size())
+
+            writer.writerows([['1', 'a'], ['2', 'b']])
+            self.assertEqual(
+                len('id,a\r\n1,a\r\n2,b\r\n'), journal.committed_size())
@@ -0,0 +1,84 @@
+import unittest
+from temp_dir import within_temp_dir
+import csv
+import os
+import threading
+
+import csvtools.mapped_file as m
+
+
+CONTENT = 'a,b\n"1\n2",3\n4,5\n'
+
+
+def write_file(filename, content=CONTENT):
+    with open(filename, 'w') as f:
+        f.write(content)
+
+
+class Test_MappedFile(unittest.TestCase):
+
+    @within_temp_dir
+    def test_iteration(self):
+        write_file('input.csv')
+
+        with m.open_mapped('input.csv') as f:
+            self.assertListEqual(
+                ['a,b\n', '"1\n', '2",3\n', '4,5\n'], list(f))
+
+    @within_temp_dir
+    def test_csv_reader(self):
+        write_file('input.csv')
+
+        with m.open_mapped('input.csv') as f:
+            self.assertListEqual(
+                [['a', 'b'], ['1\n2', '3'], ['4', '5']],
+                list(csv.reader(f)))
+
+    @within_temp_dir
+    def test_readline_tell_seek(self):
+        write_file('input.csv')
+
+        with m.open_mapped('input.csv') as f:
+            self.assertEqual('a,b\n', f.readline())
+            self.assertEqual(4, f.tell())
+            f.seek(1)
+            self.assertEqual(',b\n', f.readline())
+
+    @within_temp_dir
+    def test_readlines_returns_whole_lines(self):
+        write_file('input.csv')
+
+        with m.open_mapped('input.csv') as f:
+            self.assertListEqual(['a,b\n', '"1\n'], f.readlines(5))
+            self.assertListEqual(['2",3\n', '4,5\n'], f.readlines(100))
+            self.assertListEqual([], f.readlines(100))
+
+    @within_temp_dir
+    def test_readlines_without_sizehint(self):
+        write_file('input.csv', 'a\nb')
+
+        with m.open_mapped('input.csv') as f:
+            self.assertListEqual(['a\n', 'b'], f.readlines())
+
+    @within_temp_dir
+    def test_empty_file_is_opened_normally(self):
+        write_file('input.csv', '')
+
+        with m.open_mapped('input.csv') as f:
+            self.assertIsInstance(f, file)
+            self.assertEqual('', f.read())
+
+    @within_temp_dir
+    def test_fifo_is_opened_normally(self):
+        os.mkfifo('input.csv')
+
+        def write():
+            write_file('input.csv')
+        writer = threading.Thread(target=write)
+        writer.start()
+        try:
+            with m.open_mapped('input.csv') as f:
+                self.assertIsInstance(f, file)
+                self.assertEqual(CONTENT, f.read())
+        finally:
+            writer.join()
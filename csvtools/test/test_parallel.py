@@ -0,0 +1,68 @@
+import unittest
+from temp_dir import within_temp_dir
+from StringIO import StringIO
+
+from csvtools.field_maps import FieldMaps
+from csvtools.transformer import SimpleTransformer
+import csvtools.parallel as m
+
+
+INPUT = (
+    'a,b,c\n' +
+    ''.join('a{0},"b\n{0}",c{0}\n'.format(i) for i in range(100)))
+
+
+def transformer():
+    field_maps = FieldMaps()
+    field_maps.parse_from('c,b,x=a')
+    return SimpleTransformer(field_maps)
+
+
+def serial_output():
+    output = StringIO()
+    m.process(transformer(), StringIO(INPUT), output)
+    return output.getvalue()
+
+
+class Test_process_file(unittest.TestCase):
+
+    @within_temp_dir
+    def test_output_is_same_as_serial(self):
+        with open('input.csv', 'w') as f:
+            f.write(INPUT)
+
+        output = StringIO()
+        with open('input.csv') as f:
+            m.process_file(transformer(), f, output, jobs=3, chunk_size=50)
+
+        self.assertEqual(serial_output(), output.getvalue())
+
+    @within_temp_dir
+    def test_process_uses_regular_files(self):
+        with open('input.csv', 'w') as f:
+            f.write(INPUT)
+
+        output = StringIO()
+        with open('input.csv') as f:
+            m.process(transformer(), f, output, jobs=2)
+
+        self.assertEqual(serial_output(), output.getvalue())
+
+
+class Test_is_mappable(unittest.TestCase):
+
+    def test_stringio(self):
+        self.assertFalse(m.is_mappable(StringIO('a')))
+
+    @within_temp_dir
+    def test_empty_file(self):
+        open('empty', 'w').close()
+        with open('empty') as f:
+            self.assertFalse(m.is_mappable(f))
+
+    @within_temp_dir
+    def test_file(self):
+        with open('file', 'w') as f:
+            f.write('a')
+        with open('file') as f:
+            self.assertTrue(m.is_mappable(f))
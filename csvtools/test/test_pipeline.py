@@ -0,0 +1,217 @@
+import unittest
+import os
+from temp_dir import within_temp_dir
+import csv
+import gzip
+import textwrap
+from StringIO import StringIO
+import subprocess
+
+from csvtools.test import ReaderWriter, csv_reader, simple_transformer
+from csvtools.lib import FieldsMap
+from csvtools.rmfields import RemoveFields
+from csvtools.extract_map import EntityExtractor
+from csvtools.unzip import Unzip
+from csvtools.zip import Zip
+import csvtools.pipeline as m
+
+
+class Test_Pipeline(unittest.TestCase):
+
+    def reader(self):
+        return csv_reader('''\
+            a,b,c
+            a1,b1,c1
+            a2,b2,c2
+            ''')
+
+    def test_no_stages_copies_input(self):
+        rows = list(m.Pipeline([]).rows(self.reader()))
+
+        self.assertListEqual(list(self.reader()), rows)
+
+    def test_stages_are_chained(self):
+        pipeline = m.Pipeline(
+            [simple_transformer('c,x=a,b'), RemoveFields(['b'])])
+
+        rows = list(pipeline.rows(self.reader()))
+
+        self.assertListEqual(
+            [('c', 'x'), ('c1', 'a1'), ('c2', 'a2')],
+            rows)
+
+    def test_process_writes_rows(self):
+        writer = ReaderWriter()
+        pipeline = m.Pipeline([RemoveFields(['a', 'c'])])
+
+        pipeline.process(self.reader(), writer)
+
+        self.assertListEqual([('b',), ('b1',), ('b2',)], writer.rows)
+
+    def test_extract_map_stage(self):
+        mapper_appender = ReaderWriter()
+        extractor = EntityExtractor(
+            FieldsMap.parse('id=ref'), FieldsMap.parse('b'), keep_fields=True)
+        extractor.use_new_mapper(mapper_appender)
+        pipeline = m.Pipeline([extractor, RemoveFields(['a', 'b'])])
+
+        rows = list(pipeline.rows(self.reader()))
+
+        self.assertListEqual(
+            [('c', 'ref'), ('c1', 1), ('c2', 2)],
+            rows)
+
+    def test_unzip_then_zip_stages_restore_input(self):
+        unspec = ReaderWriter()
+        spec = list(m.Pipeline([Unzip(['a'], unspec)]).rows(self.reader()))
+
+        rows = list(m.Pipeline([Zip(unspec)]).rows(spec))
+
+        self.assertListEqual(
+            [['a', 'b', 'c'], ['a1', 'b1', 'c1'], ['a2', 'b2', 'c2']],
+            rows)
+
+
+class Test_split_stages(unittest.TestCase):
+
+    def test_one_stage(self):
+        self.assertListEqual(
+            [['rmfields', 'a', 'b']],
+            m.split_stages(['rmfields', 'a', 'b']))
+
+    def test_more_stages(self):
+        self.assertListEqual(
+            [['select', 'a,b'], ['rmfields', 'a']],
+            m.split_stages(['select', 'a,b', ':', 'rmfields', 'a']))
+
+    def test_empty_stage_is_an_error(self):
+        with self.assertRaises(m.BadStage):
+            m.split_stages(['select', 'a,b', ':'])
+
+
+class Test_parse_stage(unittest.TestCase):
+
+    def test_unknown_stage_is_an_error(self):
+        with self.assertRaises(m.BadStage):
+            m.parse_stage(['no-such-stage'])
+
+    def test_stage_arguments_are_parsed_by_its_tool(self):
+        name, args = m.parse_stage(
+            ['extract_map', '--index', '--batch-size', '10', 'a', 'id=a_id',
+             'a.csv'])
+
+        self.assertEqual('extract_map', name)
+        self.assertTrue(args.index)
+        self.assertEqual(10, args.batch_size)
+        self.assertEqual([('a', 'id=a_id', 'a.csv')], args.entity_specs)
+
+    def test_jobs_is_an_error(self):
+        with self.assertRaises(m.BadStage):
+            m.parse_stage(['select', '--jobs', '2', 'a'])
+
+    def test_input_is_an_error(self):
+        with self.assertRaises(m.BadStage):
+            m.parse_stage(['rmfields', '--input', 'in.csv', 'a'])
+
+
+class Test_StageBuilder(unittest.TestCase):
+
+    def test_unknown_stage_is_an_error(self):
+        with self.assertRaises(m.BadStage):
+            m.StageBuilder().build(['no-such-stage'])
+
+    def test_select(self):
+        stage = m.StageBuilder().build(['select', 'b,a'])
+
+        self.assertEqual(('b', 'a'), stage.output_field_names)
+
+
+class Test_script(unittest.TestCase):
+
+    # integration test
+
+    STDIN = textwrap.dedent('''\
+        a,b,c
+        a1,b1,c1
+        a2,b2,c1
+        ''')
+
+    @within_temp_dir
+    def test_select_rmfields_extract_map(self):
+        process = subprocess.Popen(
+            ['csv_pipeline',
+             'select', 'a,b,x=c', ':',
+             'rmfields', 'b', ':',
+             'extract_map', 'x', 'id=x_id', 'map.csv'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE)
+        stdout, stderr = process.communicate(self.STDIN)
+
+        self.assertEqual('', stderr, stderr)
+        self.assertListEqual(
+            [['a', 'x', 'x_id'], ['a1', 'c1', '1'], ['a2', 'c1', '1']],
+            list(csv.reader(StringIO(stdout))))
+        with open('map.csv') as f:
+            self.assertListEqual(
+                [['id', 'x'], ['1', 'c1']], list(csv.reader(f)))
+
+    @within_temp_dir
+    def test_extract_map_multiple_entities(self):
+        process = subprocess.Popen(
+            ['csv_pipeline',
+             'extract_map', 'a', 'id=a_id', 'a.csv', 'c', 'id=c_id', 'c.csv'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE)
+        stdout, stderr = process.communicate(self.STDIN)
+
+        self.assertEqual('', stderr, stderr)
+        self.assertListEqual(
+            [['a', 'b', 'c', 'a_id', 'c_id'],
+             ['a1', 'b1', 'c1', '1', '1'],
+             ['a2', 'b2', 'c1', '2', '1']],
+            list(csv.reader(StringIO(stdout))))
+
+    @within_temp_dir
+    def test_unzip_to_gz_outputs(self):
+        for threads in ([], ['--threads']):
+            process = subprocess.Popen(
+                ['csv_pipeline', 'unzip'] + threads +
+                ['--to', 'a', 'a.csv.gz', '--to', 'b', 'b.csv'],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE)
+            stdout, stderr = process.communicate(self.STDIN)
+
+            self.assertEqual('', stderr, stderr)
+            self.assertEqual('id,c\r\n0,c1\r\n1,c1\r\n', stdout)
+            with gzip.open('a.csv.gz') as f:
+                self.assertEqual('id,a\r\n0,a1\r\n1,a2\r\n', f.read())
+            with open('b.csv') as f:
+                self.assertEqual('id,b\r\n0,b1\r\n1,b2\r\n', f.read())
+
+    @within_temp_dir
+    def test_extract_map_options(self):
+        process = subprocess.Popen(
+            ['csv_pipeline',
+             'extract_map', '--index', '--batch-size', '1',
+             'a', 'id=a_id', 'a.csv'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE)
+        stdout, stderr = process.communicate(self.STDIN)
+
+        self.assertEqual('', stderr, stderr)
+        self.assertTrue(os.path.exists('a.csv.index'))
+
+    def test_bad_stage_is_a_usage_error(self):
+        process = subprocess.Popen(
+            ['csv_pipeline', 'no-such-stage'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE)
+        stdout, stderr = process.communicate(self.STDIN)
+
+        self.assertEqual(2, process.returncode)
+        self.assertIn('bad stage: unknown stage no-such-stage', stderr)
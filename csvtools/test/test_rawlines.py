@@ -0,0 +1,105 @@
+import unittest
+from StringIO import StringIO
+import csv
+
+from csvtools.test import simple_transformer
+from csvtools.rmfields import RemoveFields
+import csvtools.rawlines as m
+
+
+def csv_output(transformer, input_text):
+    output = StringIO()
+    transformer.process(
+        csv.reader(StringIO(input_text)), csv.writer(output))
+    return output.getvalue()
+
+
+def rawlines_output(transformer, input_text, block_size=m.BLOCK_SIZE):
+    output = StringIO()
+    m.process(transformer, StringIO(input_text), output, block_size)
+    return output.getvalue()
+
+
+class Test_read_record(unittest.TestCase):
+
+    def test_one_line(self):
+        f = StringIO('a,b\nc,d\n')
+        self.assertEqual('a,b\n', m.read_record(f))
+
+    def test_quoted_newlines(self):
+        f = StringIO('"a\nb\n",b\nc,d\n')
+        self.assertEqual('"a\nb\n",b\n', m.read_record(f))
+
+    def test_in_quotes(self):
+        f = StringIO('b",c\nd\n')
+        self.assertEqual('b",c\n', m.read_record(f, in_quotes=True))
+
+
+class Test_read_blocks(unittest.TestCase):
+
+    def test_blocks_contain_whole_records(self):
+        text = ''.join('"a\n{}",b\n'.format(i) for i in range(100))
+
+        blocks = list(m.read_blocks(StringIO(text), block_size=10))
+
+        self.assertEqual(text, ''.join(blocks))
+        for block in blocks:
+            self.assertEqual(0, block.count('"') % 2)
+
+
+class Test_process(unittest.TestCase):
+
+    INPUT = 'a,b,c\r\na1,,c1\r\na2,b2,c2\r\n'
+
+    def assert_same_as_csv(self, transformer_factory, input_text):
+        self.assertEqual(
+            csv_output(transformer_factory(), input_text),
+            rawlines_output(transformer_factory(), input_text, 10))
+
+    def test_select(self):
+        self.assert_same_as_csv(
+            lambda: simple_transformer('c,x=a'), self.INPUT)
+
+    def test_rmfields(self):
+        self.assert_same_as_csv(lambda: RemoveFields(['a']), self.INPUT)
+
+    def test_single_empty_field(self):
+        self.assert_same_as_csv(lambda: simple_transformer('b'), self.INPUT)
+
+    def test_quoted_input(self):
+        self.assert_same_as_csv(
+            lambda: simple_transformer('c,a'),
+            'a,b,c\n"a\n1",b1,"c,1"\na2,b2,c2\n')
+
+    def test_unix_newlines(self):
+        self.assert_same_as_csv(
+            lambda: simple_transformer('c,a'), 'a,b,c\na1,b1,c1\n')
+
+    def test_no_trailing_newline(self):
+        self.assert_same_as_csv(
+            lambda: simple_transformer('c,a'), 'a,b,c\na1,b1,c1')
+
+    def test_header_only(self):
+        self.assert_same_as_csv(lambda: simple_transformer('c,a'), 'a,b,c')
+
+    def test_uses_raw_path_for_unquoted_block(self):
+        transformer = simple_transformer('b')
+        transformer.bind(['a', 'b'])
+        transform_block = m.BlockTransformer(transformer)
+        transform_block.transform_csv = None
+
+        self.assertEqual('2\r\n', transform_block('1,2\n'))
+
+    def test_line_break_like_characters_in_fields(self):
+        self.assert_same_as_csv(
+            lambda: simple_transformer('c,a'),
+            'a,b,c\r\na\x0b1,b\x0c1,c\x1c1\r\na\x1d2,b\x1e2,c\x852\r\n')
+
+    def test_uses_csv_path_for_bare_carriage_return(self):
+        transformer = simple_transformer('b')
+        transformer.bind(['a', 'b'])
+        transform_block = m.BlockTransformer(transformer)
+        transform_block.transform_raw = None
+        transform_block.transform_csv = lambda block: block
+
+        self.assertEqual('1,2\r3\n', transform_block('1,2\r3\n'))
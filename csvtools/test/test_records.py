@@ -0,0 +1,65 @@
+import unittest
+import csvtools.records as m
+
+
+class Test_next_record_start(unittest.TestCase):
+
+    def test_after_newline(self):
+        self.assertEqual(4, m.next_record_start('a,b\nc,d\n'))
+
+    def test_from_start(self):
+        self.assertEqual(8, m.next_record_start('a,b\nc,d\n', 4))
+
+    def test_no_newline(self):
+        self.assertIsNone(m.next_record_start('a,b'))
+
+    def test_newline_in_quotes_is_skipped(self):
+        self.assertEqual(8, m.next_record_start('a,"b\nc"\nd\n'))
+
+    def test_escaped_quotes(self):
+        self.assertEqual(7, m.next_record_start('"a""b"\nd\n'))
+
+    def test_in_quotes(self):
+        self.assertEqual(7, m.next_record_start('b\nc",d\n', in_quotes=True))
+
+
+class Test_find_record_start(unittest.TestCase):
+
+    def test_end_of_data(self):
+        self.assertEqual(3, m.find_record_start('a,b', 0))
+
+    def test_across_blocks(self):
+        data = '"' + 'a\n' * 10 + '",b\nc,d\n'
+
+        original_block_size = m.BLOCK_SIZE
+        m.BLOCK_SIZE = 4
+        try:
+            self.assertEqual(25, m.find_record_start(data, 0))
+        finally:
+            m.BLOCK_SIZE = original_block_size
+
+
+class Test_record_ranges(unittest.TestCase):
+
+    def test_ranges_cover_data(self):
+        data = 'h\n' + 'a,b\n' * 10
+
+        ranges = list(m.record_ranges(data, 2, 8))
+
+        self.assertEqual(2, ranges[0][0])
+        self.assertEqual(len(data), ranges[-1][1])
+        for (_, end), (start, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, start)
+
+    def test_ranges_end_on_record_boundaries(self):
+        data = 'h\n' + '"a\nb",c\n' * 10
+
+        for start, end in m.record_ranges(data, 2, 5):
+            self.assertEqual(0, (end - start) % 8)
+
+    def test_one_range_if_size_is_big(self):
+        self.assertEqual(
+            [(2, 10)], list(m.record_ranges('h\na,b\nc,d\n', 2, 100)))
+
+    def test_no_ranges_for_empty_data(self):
+        self.assertEqual([], list(m.record_ranges('h\n', 2, 100)))
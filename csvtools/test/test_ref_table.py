@@ -0,0 +1,81 @@
+import unittest
+import mock
+
+import csvtools.ref_table as m
+
+
+class Test_CompactRefTable(unittest.TestCase):
+
+    def test_empty(self):
+        table = m.CompactRefTable()
+
+        self.assertEqual(0, len(table))
+        self.assertIsNone(table.get(('a',)))
+        self.assertEqual(-1, table.get(('a',), -1))
+
+    def test_mappings(self):
+        table = m.CompactRefTable()
+        table[('a', 'b')] = 1
+        table[('a', 'c')] = 0
+
+        self.assertEqual(1, table.get(('a', 'b')))
+        self.assertEqual(0, table.get(('a', 'c')))
+        self.assertIsNone(table.get(('a', 'bc')))
+        self.assertEqual(2, len(table))
+
+    def test_remapping_does_not_change_size(self):
+        table = m.CompactRefTable()
+        table[('a',)] = 1
+        table[('a',)] = 2
+
+        self.assertEqual(2, table.get(('a',)))
+        self.assertEqual(1, len(table))
+
+    def test_grows(self):
+        table = m.CompactRefTable()
+        for i in xrange(10000):
+            table[(str(i),)] = i
+
+        self.assertGreater(table.capacity, m.INITIAL_CAPACITY)
+        self.assertEqual(10000, len(table))
+        for i in xrange(10000):
+            self.assertEqual(i, table.get((str(i),)))
+
+    def test_spills_above_memory_limit(self):
+        table = m.CompactRefTable(memory_limit=50000)
+        for i in xrange(10000):
+            table[(str(i), 'x')] = i
+
+        self.assertIsNotNone(table.spill)
+        self.assertLessEqual(table.memory_size, 50000)
+        self.assertEqual(10000, len(table))
+        for i in xrange(10000):
+            self.assertEqual(i, table.get((str(i), 'x')))
+
+        table[('9999', 'x')] = 7
+        self.assertEqual(7, table.get(('9999', 'x')))
+        self.assertEqual(10000, len(table))
+        table.close()
+
+    def test_values_are_not_concatenated(self):
+        table = m.CompactRefTable()
+        table[('ab', 'c')] = 1
+
+        self.assertIsNone(table.get(('a', 'bc')))
+
+    def test_interned_and_parsed_strings_are_equal(self):
+        table = m.CompactRefTable()
+        table[('aa', 'bb')] = 1
+
+        self.assertEqual(1, table.get(tuple('aa,bb'.split(','))))
+
+    @mock.patch.object(m, 'key_hash', lambda key: 7)
+    def test_values_with_equal_hashes_are_distinct(self):
+        table = m.CompactRefTable()
+        for i in xrange(100):
+            table[(str(i),)] = i
+
+        self.assertEqual(100, len(table))
+        for i in xrange(100):
+            self.assertEqual(i, table.get((str(i),)))
+        self.assertIsNone(table.get(('x',)))
@@ -0,0 +1,123 @@
+import unittest
+from temp_dir import within_temp_dir
+import csv
+import random
+
+from csvtools.lib import FieldsMap
+from csvtools.extract_map import EntityExtractor
+import csvtools.sharded_map as m
+
+
+def rows(seed=0):
+    random_ = random.Random(seed)
+    yield ['a', 'b', 'c']
+    for i in xrange(500):
+        yield [
+            'a{}'.format(random_.randint(0, 60)),
+            'b{}'.format(random_.randint(0, 2)),
+            str(i)]
+
+
+MAP = '''\
+b,id,a
+b0,7,a0
+b1,3,a1
+b2,12,a60
+'''
+
+
+def write_input():
+    with open('input.csv', 'wb') as f:
+        csv.writer(f).writerows(rows())
+
+
+def serial_output(map_filename):
+    extractor = EntityExtractor(
+        FieldsMap.parse('id=ab_id'), FieldsMap.parse('a,b'),
+        keep_fields=True)
+    with open(map_filename, 'a+') as f:
+        with open('serial_output.csv', 'wb') as output:
+            extractor.use_existing_mapper(csv.reader(f), csv.writer(f))
+            extractor.extract(rows(), csv.writer(output))
+    return read('serial_output.csv')
+
+
+def sharded_output(map_filename, jobs, chunk_size):
+    with open('input.csv', 'rb') as input_file:
+        with open('output.csv', 'wb') as output_file:
+            maps, _ = m.extract(
+                [('a,b', 'id=ab_id', map_filename)],
+                input_file, output_file, jobs, chunk_size=chunk_size)
+    return maps
+
+
+def read(filename):
+    with open(filename) as f:
+        return f.read()
+
+
+class Test_extract(unittest.TestCase):
+
+    def assert_same_as_serial(self, jobs, chunk_size):
+        for filename in ('serial.csv', 'sharded.csv'):
+            with open(filename, 'w') as f:
+                f.write(MAP)
+        write_input()
+
+        expected = serial_output('serial.csv')
+        sharded_output('sharded.csv', jobs, chunk_size)
+        self.assertEqual(expected, read('output.csv'))
+        self.assertEqual(read('serial.csv'), read('sharded.csv'))
+
+    @within_temp_dir
+    def test_same_as_serial(self):
+        self.assert_same_as_serial(jobs=3, chunk_size=100)
+
+    @within_temp_dir
+    def test_one_shard(self):
+        self.assert_same_as_serial(jobs=1, chunk_size=1)
+
+    @within_temp_dir
+    def test_single_chunk(self):
+        self.assert_same_as_serial(jobs=2, chunk_size=100000)
+
+    @within_temp_dir
+    def test_new_map(self):
+        write_input()
+        sharded_output('map.csv', jobs=2, chunk_size=30)
+
+        with open('output.csv') as f:
+            output = list(csv.reader(f))
+        self.assertEqual(['a', 'b', 'c', 'ab_id'], output[0])
+        refs = dict()
+        for a, b, _, ref in output[1:]:
+            self.assertEqual(refs.setdefault((a, b), ref), ref)
+        self.assertEqual(
+            range(1, len(refs) + 1), sorted(set(map(int, refs.values()))))
+        with open('map.csv') as f:
+            self.assertEqual(len(refs) + 1, len(list(csv.reader(f))))
+
+    @within_temp_dir
+    def test_existing_and_new_mappings_are_counted(self):
+        with open('map.csv', 'w') as f:
+            f.write(MAP)
+        write_input()
+        maps = sharded_output('map.csv', jobs=2, chunk_size=50)
+
+        self.assertEqual(3, maps[0].existing_mappings)
+        with open('map.csv') as f:
+            self.assertEqual(
+                maps[0].new_mappings + 4, len(list(csv.reader(f))))
+
+    @within_temp_dir
+    def test_map_loaded_by_more_workers_than_ranges(self):
+        self.assert_same_as_serial(jobs=5, chunk_size=100)
+
+    @within_temp_dir
+    def test_missing_field(self):
+        write_input()
+        with self.assertRaises(m.MissingFieldError):
+            with open('input.csv', 'rb') as input_file:
+                m.extract(
+                    [('x', 'id=x_id', 'map.csv')],
+                    input_file, open('output.csv', 'wb'), jobs=2)
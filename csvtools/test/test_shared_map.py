@@ -0,0 +1,113 @@
+import unittest
+from temp_dir import within_temp_dir
+import csv
+import random
+import subprocess
+
+import csvtools.shared_map as m
+from csvtools.extract_map import Mapper
+
+
+class Test_SharedMapFile(unittest.TestCase):
+
+    @within_temp_dir
+    def test_appending_yields_rows_appended_by_others(self):
+        with open('map.csv', 'w') as f:
+            f.write('id,a\r\n1,a\r\n')
+        with open('map.csv', 'a+') as f:
+            shared_map = m.SharedMapFile(f)
+            shared_map.read_to_end()
+            with open('map.csv', 'a') as other:
+                other.write('2,b\r\n')
+
+            with shared_map.appending() as new_rows:
+                self.assertListEqual([['2', 'b']], list(new_rows))
+                f.write('3,c\r\n')
+
+            with shared_map.appending() as new_rows:
+                self.assertListEqual([], list(new_rows))
+
+
+class Test_shared_Mapper(unittest.TestCase):
+
+    def mapper(self, f, batch_size):
+        shared_map = m.SharedMapFile(f)
+        mapper = Mapper(
+            'id', ['a'], csv.reader(f), csv.writer(f),
+            batch_size=batch_size, shared_map=shared_map)
+        shared_map.read_to_end()
+        return mapper
+
+    @within_temp_dir
+    def test_references_are_allocated_at_commit(self):
+        with open('map.csv', 'w') as f:
+            f.write('id,a\r\n1,a\r\n')
+        with open('map.csv', 'a+') as f:
+            mapper = self.mapper(f, batch_size=10)
+            self.assertEqual(1, mapper.map(('a',)))
+            provisional_b = mapper.map(('b',))
+            provisional_c = mapper.map(('c',))
+            self.assertLess(provisional_b, 0)
+
+            with open('map.csv', 'a') as other:
+                other.write('2,c\r\n3,d\r\n')
+            mapper.commit()
+
+            self.assertDictEqual(
+                {provisional_b: 4, provisional_c: 2},
+                mapper.take_renumbered())
+            self.assertEqual(4, mapper.map(('b',)))
+            self.assertEqual(3, mapper.map(('d',)))
+            self.assertEqual(1, mapper.new_mappings)
+
+        with open('map.csv') as f:
+            self.assertListEqual(
+                [['id', 'a'], ['1', 'a'], ['2', 'c'], ['3', 'd'], ['4', 'b']],
+                list(csv.reader(f)))
+
+    @within_temp_dir
+    def test_map_returns_final_reference_of_full_batch(self):
+        with open('map.csv', 'w') as f:
+            f.write('id,a\r\n')
+        with open('map.csv', 'a+') as f:
+            mapper = self.mapper(f, batch_size=1)
+            with open('map.csv', 'a') as other:
+                other.write('1,x\r\n')
+
+            self.assertEqual(2, mapper.map(('a',)))
+            self.assertDictEqual({}, mapper.take_renumbered())
+
+
+class Test_concurrent_processes(unittest.TestCase):
+
+    @within_temp_dir
+    def test_refs_are_consistent(self):
+        processes = 3
+        for p in range(processes):
+            random_ = random.Random(p)
+            with open('in{}.csv'.format(p), 'w') as f:
+                f.write('a\n')
+                for i in range(2000):
+                    f.write('v{}\n'.format(random_.randint(0, 300)))
+
+        running = [
+            subprocess.Popen(
+                ['csv_extract_map', '--shared', '--batch-size', '20',
+                 '-i', 'in{}.csv'.format(p), 'a', 'id=a_id', 'map.csv'],
+                stdout=open('out{}.csv'.format(p), 'w'))
+            for p in range(processes)]
+        self.assertEqual([0] * processes, [p.wait() for p in running])
+
+        with open('map.csv') as f:
+            map_rows = list(csv.reader(f))[1:]
+        refs = [ref for ref, _ in map_rows]
+        values = [value for _, value in map_rows]
+        self.assertEqual(
+            range(1, len(refs) + 1), sorted(int(ref) for ref in refs))
+        self.assertEqual(len(values), len(set(values)))
+
+        value_to_ref = dict((value, ref) for ref, value in map_rows)
+        for p in range(processes):
+            with open('out{}.csv'.format(p)) as f:
+                for value, ref in list(csv.reader(f))[1:]:
+                    self.assertEqual(value_to_ref[value], ref)
@@ -0,0 +1,164 @@
+import unittest
+from temp_dir import within_temp_dir
+import csv
+import os
+import textwrap
+from StringIO import StringIO
+import subprocess
+
+from csvtools.test import ReaderWriter, csv_reader
+import csvtools.sort as m
+
+
+INPUT = (
+    'id,name,n\n'
+    '1,b,10\n'
+    '2,a,9\n'
+    '3,"c\nc",100\n'
+    '4,a,9\n'
+    '5,b,2\n')
+
+
+def input_reader():
+    return csv.reader(StringIO(INPUT))
+
+
+def ids(rows):
+    return [row[0] for row in rows]
+
+
+class TestSorter(unittest.TestCase):
+
+    def sort(self, fields, **kwargs):
+        writer = ReaderWriter()
+        m.Sorter(fields, **kwargs).process(input_reader(), writer)
+        return writer.rows
+
+    def test_in_memory(self):
+        rows = self.sort(['name'])
+
+        self.assertEqual(['id', 'name', 'n'], rows[0])
+        self.assertEqual(['2', '4', '1', '5', '3'], ids(rows[1:]))
+
+    def test_string_key(self):
+        rows = self.sort(['n'])
+
+        self.assertEqual(['1', '3', '5', '2', '4'], ids(rows[1:]))
+
+    def test_numeric_key(self):
+        rows = self.sort(['n'], numeric=True)
+
+        self.assertEqual(['5', '2', '4', '1', '3'], ids(rows[1:]))
+
+    def test_more_key_fields(self):
+        rows = self.sort(['name', 'n'], numeric=False)
+
+        self.assertEqual(['2', '4', '1', '5', '3'], ids(rows[1:]))
+
+    def test_runs_are_merged(self):
+        sorter = m.Sorter(['n'], numeric=True, run_rows=2)
+        writer = ReaderWriter()
+
+        sorter.process(input_reader(), writer)
+
+        self.assertEqual(3, sorter.runs)
+        self.assertEqual(['5', '2', '4', '1', '3'], ids(writer.rows[1:]))
+        self.assertEqual(['3', 'c\nc', '100'], writer.rows[-1])
+
+    def test_runs_are_merged_in_passes(self):
+        sorter = m.Sorter(['n'], numeric=True, run_rows=1, fan_in=2)
+        writer = ReaderWriter()
+
+        sorter.process(input_reader(), writer)
+
+        # 5 runs -> 2 merged + 1 -> 1 merged + 1
+        self.assertEqual(5, sorter.runs)
+        self.assertEqual(2 + 1, sorter.merged_runs)
+        self.assertEqual(['5', '2', '4', '1', '3'], ids(writer.rows[1:]))
+
+    def test_runs_sorted_in_processes(self):
+        rows = self.sort(['name'], run_rows=1, jobs=2)
+
+        self.assertEqual(['2', '4', '1', '5', '3'], ids(rows[1:]))
+
+    def test_run_files_are_removed(self):
+        temp_dir = os.path.abspath('csv_sort_test_runs')
+        os.mkdir(temp_dir)
+        try:
+            self.sort(['name'], run_rows=2, temp_dir=temp_dir)
+
+            self.assertEqual([], os.listdir(temp_dir))
+        finally:
+            os.rmdir(temp_dir)
+
+    def test_missing_field_is_an_error(self):
+        with self.assertRaises(m.MissingFieldError):
+            self.sort(['x'])
+
+
+class Test_sort_key(unittest.TestCase):
+
+    def test_non_numbers_sort_after_numbers(self):
+        key = m.sort_key([0], numeric=True)
+        values = ['b', '', '10', 'nan', '-1.5', 'a', '2']
+
+        self.assertEqual(
+            ['-1.5', '2', '10', '', 'a', 'b', 'nan'],
+            [row[0] for row in sorted([[v] for v in values], key=key)])
+
+
+class TestMergeSorted(unittest.TestCase):
+
+    def test_merge(self):
+        reader1 = csv_reader('''\
+            id,k
+            a,1
+            b,3
+            ''')
+        reader2 = csv_reader('''\
+            id,k
+            c,1
+            d,2
+            ''')
+
+        rows = list(m.merge_sorted([reader1, reader2], ['k']))
+
+        self.assertEqual(['id', 'k'], rows[0])
+        self.assertEqual(['a', 'c', 'd', 'b'], ids(rows[1:]))
+
+    def test_different_headers_are_an_error(self):
+        with self.assertRaises(m.BadInput):
+            list(m.merge_sorted([csv_reader('a,k'), csv_reader('k,a')], 'k'))
+
+
+class Test_script(unittest.TestCase):
+
+    def csv_sort(self, args, stdin=''):
+        process = subprocess.Popen(
+            ['csv_sort'] + args,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE)
+        stdout, stderr = process.communicate(stdin)
+
+        self.assertEqual('', stderr, stderr)
+        return list(csv.reader(StringIO(stdout)))
+
+    @within_temp_dir
+    def test_sort_then_merge(self):
+        stdin = textwrap.dedent('''\
+            k,v
+            3,c
+            1,a
+            2,b
+            ''')
+        rows = self.csv_sort(['--run-rows', '2', '--numeric', 'k'], stdin)
+        self.assertEqual(
+            [['k', 'v'], ['1', 'a'], ['2', 'b'], ['3', 'c']], rows)
+
+        with open('sorted.csv', 'wb') as f:
+            csv.writer(f).writerows(rows)
+        merged = self.csv_sort(
+            ['--merge', '--numeric', 'k', 'sorted.csv', 'sorted.csv'])
+        self.assertEqual(
+            ['k', '1', '1', '2', '2', '3', '3'], ids(merged))
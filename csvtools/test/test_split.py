@@ -5,6 +5,10 @@ from temp_dir import within_temp_dir
 
 import codecs
 import csv
+import itertools
+import subprocess
+import zlib
+from StringIO import StringIO
 
 from csvtools.test import ReaderWriter
 import csvtools.split as m
@@ -80,3 +84,145 @@ class Test_split(unittest.TestCase):
                  [u'1', u'2'],
                  [u'3', u'4']],
                 list(csv.reader(f)))
+
+
+INPUT = (
+    'a,b\r\n'
+    '1,"x\r\ny"\r\n'
+    '2,"""q"",\r\n"\r\n'
+    '3,z\r\n'
+    '4,w\r\n')
+
+
+class Test_split_bytes(unittest.TestCase):
+
+    def split_bytes(self, chunk_size):
+        m.split_bytes(StringIO(INPUT), 'split.', chunk_size)
+        files = []
+        for i in itertools.count():
+            if not os.path.exists('split.{}'.format(i)):
+                return files
+            with open('split.{}'.format(i), 'rb') as f:
+                files.append(f.read())
+
+    @within_temp_dir
+    def test_files_have_header_and_whole_records(self):
+        files = self.split_bytes(1)
+
+        self.assertEqual(
+            ['a,b\r\n1,"x\r\ny"\r\n',
+             'a,b\r\n2,"""q"",\r\n"\r\n',
+             'a,b\r\n3,z\r\n',
+             'a,b\r\n4,w\r\n'],
+            files)
+
+    @within_temp_dir
+    def test_records_are_copied(self):
+        files = self.split_bytes(20)
+
+        self.assertTrue(1 < len(files) < 4, files)
+        for text in files:
+            self.assertTrue(text.startswith('a,b\r\n'))
+            self.assertTrue(len(text) <= 20 + 12, text)
+        self.assertEqual(
+            INPUT, 'a,b\r\n' + ''.join(text[5:] for text in files))
+
+    @within_temp_dir
+    def test_header_only_input_one_output_file_with_header(self):
+        m.split_bytes(StringIO('a,b\n'), 'split.', 10)
+
+        self.assertEqual(u'a,b', header(u'split.0'))
+        self.assertFalse(os.path.exists('split.1'))
+
+    @within_temp_dir
+    def test_script(self):
+        with open('input.csv', 'wb') as f:
+            f.write(INPUT)
+
+        subprocess.check_call(
+            ['csv_split', '--bytes', '-i', 'input.csv', 'part.', '25'])
+
+        rows = []
+        for i in range(2):
+            with open('part.{}'.format(i), 'rb') as f:
+                rows.extend(list(csv.reader(f))[1:])
+        self.assertFalse(os.path.exists('part.2'))
+        self.assertEqual(list(csv.reader(StringIO(INPUT)))[1:], rows)
+
+
+class Test_split_buckets(unittest.TestCase):
+
+    def rows(self):
+        rows = ReaderWriter()
+        rows.writerow(['k1', 'v', 'k2'])
+        for i in range(100):
+            rows.writerow([str(i % 7), str(i), str(i % 2)])
+        return rows
+
+    def read_buckets(self, count):
+        buckets = []
+        for i in range(count):
+            with open('bucket.{}'.format(i), 'rb') as f:
+                buckets.append(list(csv.reader(f)))
+        self.assertFalse(os.path.exists('bucket.{}'.format(count)))
+        return buckets
+
+    def check_buckets(self, buckets, fields):
+        input_rows = self.rows().rows
+        keys = [input_rows[0].index(field) for field in fields]
+        key_buckets = {}
+        for i, bucket in enumerate(buckets):
+            self.assertEqual(input_rows[0], bucket[0])
+            for row in bucket[1:]:
+                key = tuple(row[k] for k in keys)
+                self.assertEqual(i, key_buckets.setdefault(key, i))
+                self.assertEqual(i, m.bucket_of(key, len(buckets)))
+        self.assertEqual(
+            sorted(input_rows[1:]),
+            sorted(sum((bucket[1:] for bucket in buckets), [])))
+
+    @within_temp_dir
+    def test_rows_with_same_key_are_in_same_bucket(self):
+        m.split_buckets(self.rows(), 'bucket.', ['k1', 'k2'], 5)
+
+        self.check_buckets(self.read_buckets(5), ['k1', 'k2'])
+
+    @within_temp_dir
+    def test_more_buckets_than_open_files(self):
+        splitter = m.BucketSplitter(
+            self.rows(), 'bucket.', ['k1'], 20, max_open=3)
+        splitter.batch_rows = 2
+
+        splitter.split()
+
+        self.assertTrue(splitter.pool.opened > 20)
+        self.check_buckets(self.read_buckets(20), ['k1'])
+
+    @within_temp_dir
+    def test_empty_buckets_have_header(self):
+        m.split_buckets(self.rows(), 'bucket.', ['k2'], 4)
+
+        buckets = self.read_buckets(4)
+        self.assertEqual(2, sum(1 for bucket in buckets if len(bucket) == 1))
+
+    def test_bucket_is_stable(self):
+        self.assertEqual(
+            (zlib.crc32('1:a2:bc') & 0xffffffff) % 7,
+            m.bucket_of(('a', 'bc'), 7))
+
+    @within_temp_dir
+    def test_missing_field_is_an_error(self):
+        with self.assertRaises(m.MissingFieldError):
+            m.split_buckets(self.rows(), 'bucket.', ['x'], 2)
+
+    @within_temp_dir
+    def test_script(self):
+        stdin = StringIO()
+        csv.writer(stdin).writerows(self.rows().rows)
+        process = subprocess.Popen(
+            ['csv_split', '--by', 'k2,k1', '--buckets', '3', 'bucket.'],
+            stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+        _, stderr = process.communicate(stdin.getvalue())
+
+        self.assertEqual('', stderr, stderr)
+        self.check_buckets(self.read_buckets(3), ['k2', 'k1'])
@@ -0,0 +1,131 @@
+import unittest
+import os
+from StringIO import StringIO
+import json
+import mock
+
+from csvtools.test import ReaderWriter
+import csvtools.stats as m
+
+
+class Test_Stats(unittest.TestCase):
+
+    def test_reader_counts_rows(self):
+        stats = m.Stats('tool')
+
+        rows = list(stats.reader([['a'], ['1'], ['2']]))
+
+        self.assertEqual([['a'], ['1'], ['2']], rows)
+        self.assertEqual(3, stats.summary()['rows_read'])
+
+    def test_writer_counts_rows(self):
+        stats = m.Stats('tool')
+        writer = ReaderWriter()
+        stats_writer = stats.writer(writer)
+
+        stats_writer.writerow(['a'])
+        stats_writer.writerows([['1'], ['2']])
+
+        self.assertEqual([['a'], ['1'], ['2']], writer.rows)
+        self.assertEqual(3, stats.summary()['rows_written'])
+
+    def test_writer_writes_a_list_at_once(self):
+        stats = m.Stats('tool')
+        writer = ReaderWriter()
+        writer.writerows = mock.Mock()
+        rows = [['1'], ['2']]
+
+        stats.writer(writer).writerows(rows)
+
+        writer.writerows.assert_called_once_with(rows)
+
+    def test_writer_writes_an_iterator_in_batches(self):
+        stats = m.Stats('tool')
+        writer = ReaderWriter()
+        writer.writerows = mock.Mock()
+        rows = [[str(i)] for i in range(m.BLOCK_ROWS + 1)]
+
+        stats.writer(writer).writerows(iter(rows))
+
+        self.assertEqual(
+            [mock.call(rows[:-1]), mock.call(rows[-1:])],
+            writer.writerows.call_args_list)
+        self.assertEqual(len(rows), stats.summary()['rows_written'])
+
+    def test_input_file_counts_bytes(self):
+        stats = m.Stats('tool')
+        input_file = stats.input_file(StringIO('a\nbb\nccc\n'))
+
+        input_file.readline()
+        list(input_file)
+
+        self.assertEqual(9, stats.summary()['bytes_read'])
+
+    def test_output_file_counts_bytes(self):
+        stats = m.Stats('tool')
+        output = StringIO()
+        output_file = stats.output_file(output)
+
+        output_file.write('abc')
+
+        self.assertEqual('abc', output.getvalue())
+        self.assertEqual(3, stats.summary()['bytes_written'])
+
+    def test_timed_phase(self):
+        stats = m.Stats('tool')
+
+        self.assertEqual(3, stats.timed('phase', len)('abc'))
+
+        self.assertIn('phase', stats.summary()['phases'])
+
+    def test_summary_has_transform_phase(self):
+        phases = m.Stats('tool').summary()['phases']
+
+        self.assertGreaterEqual(phases[m.TRANSFORM]['wall'], 0)
+        self.assertGreaterEqual(phases[m.TRANSFORM]['cpu'], 0)
+
+    def test_report_is_json(self):
+        stats = m.Stats('tool')
+        stats.count('mappings', 2)
+        output = StringIO()
+
+        stats.report(output)
+
+        summary = json.loads(output.getvalue())
+        self.assertEqual('tool', summary['tool'])
+        self.assertEqual(2, summary['mappings'])
+        self.assertGreater(summary['peak_memory_kb'], 0)
+
+
+class Test_NoStats(unittest.TestCase):
+
+    def test_wrappers_return_their_parameter(self):
+        stats = m.NoStats()
+        reader = ReaderWriter()
+
+        self.assertIs(reader, stats.reader(reader))
+        self.assertIs(reader, stats.writer(reader))
+        self.assertIs(reader, stats.input_file(reader))
+        self.assertIs(reader, stats.output_file(reader))
+        self.assertIs(len, stats.timed('phase', len))
+
+
+class Test_enabled(unittest.TestCase):
+
+    def setUp(self):
+        self.original = os.environ.pop(m.ENVIRONMENT_VARIABLE, None)
+
+    def tearDown(self):
+        os.environ.pop(m.ENVIRONMENT_VARIABLE, None)
+        if self.original is not None:
+            os.environ[m.ENVIRONMENT_VARIABLE] = self.original
+
+    def test_disabled_by_default(self):
+        self.assertFalse(m.enabled())
+
+    def test_option(self):
+        self.assertTrue(m.enabled(True))
+
+    def test_environment(self):
+        os.environ[m.ENVIRONMENT_VARIABLE] = '1'
+        self.assertTrue(m.enabled())
@@ -1,9 +1,9 @@
 import unittest
 import mock
 from mock import sentinel
-from csvtools.test import ReaderWriter
+from csvtools.test import ReaderWriter, simple_transformer
 import csvtools.transformer as m
-from csvtools.field_maps import FieldMaps
+from csvtools.field import NamedField
 
 
 class BindCheckerTransformer(m.Transformer):
@@ -54,12 +54,6 @@ class Test_Transformer_process(unittest.TestCase):
         self.assertEqual([sentinel.output, sentinel.output], writer.rows[1:])
 
 
-def simple_transformer(field_maps_string):
-    field_maps = FieldMaps()
-    field_maps.parse_from(field_maps_string)
-    return m.SimpleTransformer(field_maps)
-
-
 class Test_SimpleTransformer_output_field_names(unittest.TestCase):
 
     def test(self):
@@ -87,6 +81,13 @@ class Test_SimpleTransformer_bind(unittest.TestCase):
         self.assertEqual('a', rb.extractors[1](('a', 'in1', 'b')))
         self.assertEqual('b', rb.extractors[2](('a', 'in1', 'b')))
 
+    def test_sets_indices(self):
+        rb = simple_transformer('out1=in1,a,b')
+
+        rb.bind(('a', 'in1', 'b'))
+
+        self.assertEqual((1, 0, 2), rb.indices)
+
 
 class Test_SimpleTransformer_transform(unittest.TestCase):
 
@@ -101,3 +102,26 @@ class Test_SimpleTransformer_transform(unittest.TestCase):
         rb.bind(header)
 
         self.assertEqual(expected_transformed, rb.transform(record))
+
+
+class UpperField(NamedField):
+
+    @property
+    def value_extractor(self):
+        index = self.index
+        return lambda row: row[index].upper()
+
+
+class Test_SimpleTransformer_custom_extractor(unittest.TestCase):
+
+    def transformer(self):
+        rb = simple_transformer('a,b')
+        rb.fields['b'] = UpperField('b')
+        rb.bind(('a', 'b'))
+        return rb
+
+    def test_extractor_is_used(self):
+        self.assertEqual(('x', 'Y'), self.transformer().transform(('x', 'y')))
+
+    def test_is_not_a_projection(self):
+        self.assertIsNone(self.transformer().indices)
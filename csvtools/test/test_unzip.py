@@ -1,4 +1,8 @@
 import unittest
+from temp_dir import within_temp_dir
+import gzip
+import subprocess
+
 from csvtools.test import ReaderWriter
 import csvtools.unzip as m
 
@@ -80,3 +84,105 @@ class TestUnzip(unittest.TestCase):
 
         with self.assertRaises(m.DuplicateFieldError):
             m.unzip(csv_in, ['a'], csv_out_spec, csv_out_unspec, zip_field='a')
+
+    def test_out_unspec_is_written_in_batches(self):
+        csv_in = self.csv_header_a_b_c()
+        for i in range(1500):
+            csv_in.writerow(['a', 'b', 'c'])
+        csv_out_unspec = ReaderWriter()
+
+        rows = m.Unzip(['a'], csv_out_unspec).rows(csv_in)
+        for i in range(2):
+            rows.next()
+
+        self.assertListEqual([], csv_out_unspec.rows)
+        list(rows)
+        self.assertEqual(1501, len(csv_out_unspec.rows))
+
+    def test_out_unspec_is_flushed_when_stopped_early(self):
+        csv_in = self.csv_header_a_b_c()
+        for i in range(1500):
+            csv_in.writerow(['a', 'b', 'c'])
+        csv_out_unspec = ReaderWriter()
+
+        rows = m.Unzip(['a'], csv_out_unspec).rows(csv_in)
+        for i in range(11):
+            rows.next()
+        rows.close()
+
+        self.assertEqual(11, len(csv_out_unspec.rows))
+        self.assertListEqual(['9', 'b', 'c'], csv_out_unspec.rows[-1])
+
+
+class TestMultiUnzip(unittest.TestCase):
+
+    def csv_in(self):
+        csv_in = ReaderWriter()
+        csv_in.writerow('a  b  c  d'.split())
+        csv_in.writerow('a1 b1 c1 d1'.split())
+        csv_in.writerow('a2 b2 c2 d2'.split())
+        return csv_in
+
+    def test_groups_and_rest(self):
+        out_c = ReaderWriter()
+        out_ab = ReaderWriter()
+
+        rows = m.MultiUnzip([(['c'], out_c), (['b', 'a'], out_ab)]).rows(
+            self.csv_in())
+
+        self.assertListEqual(
+            ['id d'.split(), '0 d1'.split(), '1 d2'.split()],
+            list(rows))
+        self.assertListEqual(
+            ['id c'.split(), '0 c1'.split(), '1 c2'.split()],
+            out_c.rows)
+        self.assertListEqual(
+            ['id b a'.split(), '0 b1 a1'.split(), '1 b2 a2'.split()],
+            out_ab.rows)
+
+
+class ClosedFile(object):
+
+    def __init__(self, closed, error=None):
+        self.closed = closed
+        self.error = error
+
+    def close(self):
+        self.closed.append(self)
+        if self.error:
+            raise self.error
+
+
+class Test_close_files(unittest.TestCase):
+
+    def test_all_files_are_closed_on_error(self):
+        closed = []
+        files = [
+            ClosedFile(closed), ClosedFile(closed, IOError('second')),
+            ClosedFile(closed, IOError('first'))]
+
+        with self.assertRaises(IOError) as context:
+            m.close_files(files)
+
+        self.assertEqual('first', str(context.exception))
+        self.assertListEqual(list(reversed(files)), closed)
+
+
+class Test_script(unittest.TestCase):
+
+    @within_temp_dir
+    def test_to_outputs(self):
+        process = subprocess.Popen(
+            ['csv_unzip', '--threads',
+             '--to', 'a', 'a.csv', '--to', 'c,b', 'cb.csv.gz'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE)
+        stdout, stderr = process.communicate('a,b,c,d\na1,b1,c1,d1\n')
+
+        self.assertEqual('', stderr, stderr)
+        self.assertEqual('id,d\r\n0,d1\r\n', stdout)
+        with open('a.csv') as f:
+            self.assertEqual('id,a\r\n0,a1\r\n', f.read())
+        with gzip.open('cb.csv.gz') as f:
+            self.assertEqual('id,c,b\r\n0,c1,b1\r\n', f.read())
@@ -0,0 +1,101 @@
+import unittest
+from temp_dir import within_temp_dir
+import csv
+import subprocess
+from StringIO import StringIO
+
+from csvtools.test import csv_reader
+import csvtools.weave as m
+
+
+class FailingReader(object):
+
+    def __iter__(self):
+        yield ['a']
+        raise IOError('read error')
+
+
+class Test_weave(unittest.TestCase):
+
+    def readers(self):
+        return [
+            csv_reader('''\
+                a,b
+                1,x
+                4,x
+                7,x'''),
+            csv_reader('''\
+                a,b
+                2,y
+                5,y'''),
+            csv_reader('''\
+                a,b
+                3,z''')]
+
+    def test_rows_are_interleaved(self):
+        rows = list(m.weave(self.readers()))
+
+        self.assertEqual(['a', 'b'], rows[0])
+        self.assertEqual(
+            ['1', '2', '3', '4', '5', '7'], [row[0] for row in rows[1:]])
+
+    def test_concatenate(self):
+        rows = list(m.weave(self.readers(), concatenate=True))
+
+        self.assertEqual(['a', 'b'], rows[0])
+        self.assertEqual(
+            ['1', '4', '7', '2', '5', '3'], [row[0] for row in rows[1:]])
+
+    def test_without_read_ahead(self):
+        self.assertEqual(
+            list(m.weave(self.readers())),
+            list(m.weave(self.readers(), read_ahead=0)))
+
+    def test_different_headers_are_an_error(self):
+        with self.assertRaises(m.BadInput):
+            list(m.weave([csv_reader('a,b'), csv_reader('b,a')]))
+
+    def test_error_of_reader_thread_is_raised(self):
+        with self.assertRaises(IOError):
+            list(m.weave([FailingReader(), csv_reader('a\n1\n2')]))
+
+    def test_threaded_reader_reads_all_rows(self):
+        rows = [[str(i)] for i in range(2500)]
+
+        self.assertEqual(
+            rows, list(m.ThreadedReader(iter(rows), read_ahead=300)))
+
+
+class Test_script(unittest.TestCase):
+
+    @within_temp_dir
+    def test_weave_reverses_round_robin_divide(self):
+        rows = [['id', 'v']] + [[str(i), 'v\n' * (i % 3)] for i in range(50)]
+        stdin = StringIO()
+        csv.writer(stdin).writerows(rows)
+
+        divide = subprocess.Popen(
+            ['csv_divide', 'part', '3'], stdin=subprocess.PIPE)
+        divide.communicate(stdin.getvalue())
+        weave = subprocess.Popen(
+            ['csv_weave', 'part'],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        stdout, stderr = weave.communicate()
+
+        self.assertEqual('', stderr, stderr)
+        self.assertEqual(rows, list(csv.reader(StringIO(stdout))))
+
+    @within_temp_dir
+    def test_concatenate_reverses_divide_of_file(self):
+        rows = [['id', 'v']] + [[str(i), 'v\n' * (i % 3)] for i in range(50)]
+        with open('input.csv', 'wb') as f:
+            csv.writer(f).writerows(rows)
+
+        subprocess.check_call(['csv_divide', '-i', 'input.csv', 'part', '3'])
+        weave = subprocess.Popen(
+            ['csv_weave', '--concatenate', 'part'],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        stdout, stderr = weave.communicate()
+
+        self.assertEqual('', stderr, stderr)
+        self.assertEqual(rows, list(csv.reader(StringIO(stdout))))
@@ -81,3 +81,200 @@ class TestZip(unittest.TestCase):
         self.assertEqual(2, len(csv_out.rows))
         self.assertEqual('a b c d'.split(), csv_out.rows[0])
         self.assertEqual('a b c d'.split(), csv_out.rows[1])
+
+
+class TestMergeJoin(unittest.TestCase):
+
+    def inputs(self):
+        csv_in1 = csv_reader('''\
+            a,id
+            a1,1
+            a2,2
+            a2x,2
+            a4,4''')
+        csv_in2 = csv_reader('''\
+            id,c
+            2,c2
+            3,c3
+            4,c4
+            5,c5''')
+        return csv_in1, csv_in2
+
+    def join(self, join, **kwargs):
+        csv_in1, csv_in2 = self.inputs()
+        csv_out = ReaderWriter()
+        m.csvzip(csv_in1, csv_in2, csv_out, join=join, **kwargs)
+        return map(list, csv_out.rows)
+
+    def test_inner(self):
+        self.assertEqual(
+            [['id', 'a', 'c'],
+             ['2', 'a2', 'c2'],
+             ['2', 'a2x', 'c2'],
+             ['4', 'a4', 'c4']],
+            self.join(m.INNER, keep_id=True))
+
+    def test_left(self):
+        self.assertEqual(
+            [['a', 'c'],
+             ['a1', ''],
+             ['a2', 'c2'],
+             ['a2x', 'c2'],
+             ['a4', 'c4']],
+            self.join(m.LEFT))
+
+    def test_outer(self):
+        self.assertEqual(
+            [['id', 'a', 'c'],
+             ['1', 'a1', ''],
+             ['2', 'a2', 'c2'],
+             ['2', 'a2x', 'c2'],
+             ['3', '', 'c3'],
+             ['4', 'a4', 'c4'],
+             ['5', '', 'c5']],
+            self.join(m.OUTER, keep_id=True))
+
+    def test_outer_with_empty_input(self):
+        csv_in1 = csv_reader('a,id')
+        csv_in2 = csv_reader('''\
+            id,c
+            1,c1''')
+        csv_out = ReaderWriter()
+
+        m.csvzip(csv_in1, csv_in2, csv_out, join=m.OUTER)
+
+        self.assertEqual([['a', 'c'], ['', 'c1']], map(list, csv_out.rows))
+
+    def test_numeric(self):
+        csv_in1 = csv_reader('''\
+            a,id
+            a9,9
+            a10,10''')
+        csv_in2 = csv_reader('''\
+            id,c
+            9,c9
+            10,c10''')
+        csv_out = ReaderWriter()
+
+        m.csvzip(csv_in1, csv_in2, csv_out, join=m.INNER, numeric=True)
+
+        self.assertEqual(
+            [['a', 'c'], ['a9', 'c9'], ['a10', 'c10']],
+            map(list, csv_out.rows))
+
+    def test_numeric_ids_are_ordered_like_sort_numeric(self):
+        csv_in1 = csv_reader('''\
+            a,id
+            a1,-1.5
+            a2,2
+            a3,10
+            a4,
+            a5,x''')
+        csv_in2 = csv_reader('''\
+            id,c
+            2,c2
+            10,c3
+            x,c5''')
+        csv_out = ReaderWriter()
+
+        m.csvzip(csv_in1, csv_in2, csv_out, join=m.LEFT, numeric=True)
+
+        self.assertEqual(
+            [['a', 'c'], ['a1', ''], ['a2', 'c2'], ['a3', 'c3'], ['a4', ''],
+             ['a5', 'c5']],
+            map(list, csv_out.rows))
+
+    def test_unsorted_input_raises_error(self):
+        csv_in1 = csv_reader('''\
+            a,id
+            a9,9
+            a10,10''')
+        csv_in2 = csv_reader('''\
+            id,c
+            9,c9''')
+        csv_out = ReaderWriter()
+
+        with self.assertRaises(m.UnsortedInput):
+            m.csvzip(csv_in1, csv_in2, csv_out, join=m.LEFT)
+
+    def test_duplicate_id_in_other_input_raises_error(self):
+        csv_in1 = csv_reader('''\
+            a,id
+            a1,1''')
+        csv_in2 = csv_reader('''\
+            id,c
+            1,c1
+            1,c1x''')
+        csv_out = ReaderWriter()
+
+        with self.assertRaises(m.UnsortedInput):
+            m.csvzip(csv_in1, csv_in2, csv_out, join=m.OUTER)
+
+
+class TestMultiZip(unittest.TestCase):
+
+    def others(self):
+        return [
+            csv_reader('''\
+                c,id
+                c1,1
+                c2,2'''),
+            csv_reader('''\
+                id,d,e
+                1,d1,e1
+                2,d2,e2''')]
+
+    def reader(self):
+        return csv_reader('''\
+            a,id,b
+            a1,1,b1
+            a2,2,b2''')
+
+    def test_output_fields_are_in_input_order(self):
+        rows = m.MultiZip(self.others()).rows(self.reader())
+
+        self.assertEqual(
+            [['a', 'b', 'c', 'd', 'e'],
+             ['a1', 'b1', 'c1', 'd1', 'e1'],
+             ['a2', 'b2', 'c2', 'd2', 'e2']],
+            map(list, rows))
+
+    def test_keep_id(self):
+        rows = m.MultiZip(self.others(), keep_id=True).rows(self.reader())
+
+        self.assertEqual(
+            [['id', 'a', 'b', 'c', 'd', 'e'],
+             ['1', 'a1', 'b1', 'c1', 'd1', 'e1'],
+             ['2', 'a2', 'b2', 'c2', 'd2', 'e2']],
+            map(list, rows))
+
+    def test_mismatch_in_id_values_raises_error(self):
+        others = self.others()
+        others.append(
+            csv_reader('''\
+                id,f
+                1,f1
+                3,f3'''))
+
+        with self.assertRaises(m.IdMismatch):
+            list(m.MultiZip(others).rows(self.reader()))
+
+    def test_outer_join(self):
+        others = [
+            csv_reader('''\
+                c,id
+                c2,2'''),
+            csv_reader('''\
+                id,d
+                1,d1
+                3,d3''')]
+
+        rows = m.MultiZip(others, keep_id=True, join=m.OUTER).rows(
+            self.reader())
+
+        self.assertEqual(
+            [['id', 'a', 'b', 'c', 'd'],
+             ['1', 'a1', 'b1', '', 'd1'],
+             ['2', 'a2', 'b2', 'c2', ''],
+             ['3', '', '', '', 'd3']],
+            map(list, rows))
@@ -6,12 +6,18 @@ Usage:
     csv_to_postgres name-of-table-to-create < file.csv |
         psql [connection options - NOT requiring password!]
 
+The input file can be given with --input file.csv as well.
+
 This is working for at least PostgreSQL psql 9.1.
 '''
 
 import csv
 import sys
 
+import argparse
+from csvtools import cli
+from csvtools.stats import NoStats
+
 
 SQL_TEMPLATE = '''\
 -- exit if table already exists - avoids double population
@@ -25,9 +31,23 @@ CREATE TABLE {table} (
 '''
 
 
-def main():
-    table, = sys.argv[1:]
-    reader = csv.reader(sys.stdin)
+def parse_args(args):
+    parser = argparse.ArgumentParser()
+
+    cli.add_input_argument(parser)
+    cli.add_stats_argument(parser)
+    cli.add_buffer_argument(parser)
+    parser.add_argument(
+        'table', metavar='TABLE',
+        help='name of the table to create')
+
+    return parser.parse_args(args)
+
+
+def to_postgres(input_file, output_file, table, stats=None):
+    stats = stats or NoStats()
+    output_file = stats.output_file(output_file)
+    reader = stats.reader(csv.reader(stats.input_file(input_file)))
     header = reader.next()
     notnullcolumns = header
 
@@ -41,12 +61,21 @@ def main():
         fielddefs=fielddefs,
         notnullcolumns=', '.join(notnullcolumns))
 
-    sys.stdout.write(create_and_import_sql)
+    output_file.write(create_and_import_sql)
 
-    writer = csv.writer(sys.stdout)
+    writer = stats.writer(csv.writer(output_file))
     writer.writerow(header)
     writer.writerows(reader)
 
 
+def main():
+    args = parse_args(sys.argv[1:])
+    stats = cli.stats_for(args, 'to_postgres')
+
+    with cli.input_file(args.input_filename) as input_file:
+        with cli.output_file(args.buffer_size) as output_file:
+            to_postgres(input_file, output_file, args.table, stats)
+
+
 if __name__ == '__main__':
     main()
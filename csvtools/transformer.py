@@ -1,21 +1,34 @@
+import itertools
+from csvtools.lib import projection
+from csvtools.field import is_index_field
+
+
 class Transformer(object):
 
     '''
     .output_field_names : tuple of field names, output header
     .transform : creates a new tuple based on the input_row and the specs
+    .indices : tuple of input field indices if .transform is a projection,
+        None otherwise
     '''
 
     output_field_names = None
+    indices = None
 
     def process(self, reader, writer):
+        writer.writerows(self.rows(reader))
+
+    def rows(self, reader):
+        '''
+        Iterator over output rows - the first one is the output header
+        '''
         reader_iter = iter(reader)
         header = reader_iter.next()
         self.bind(header)
-        transform = self.transform
 
-        writer.writerow(self.output_field_names)
-        for record in reader_iter:
-            writer.writerow(transform(record))
+        return itertools.chain(
+            [self.output_field_names],
+            itertools.imap(self.transform, reader_iter))
 
     def bind(self, header_row):
         pass
@@ -39,11 +52,17 @@ class SimpleTransformer(Transformer):
         for field in self.fields.itervalues():
             field.bind(header_row)
 
-        self.extractors = tuple(
-            self.fields[name].value_extractor
-            for name in self.input_field_names)
+        fields = tuple(self.fields[name] for name in self.input_field_names)
+        self.extractors = tuple(field.value_extractor for field in fields)
+        if all(is_index_field(field) for field in fields):
+            self.indices = tuple(field.index for field in fields)
+            self.transform = projection(self.indices)
+        else:
+            # some field has its own extractor
+            self.indices = None
+            self.transform = self.extract
 
-    def transform(self, input_row):
+    def extract(self, input_row):
         return tuple(e(input_row) for e in self.extractors)
 
     @property
@@ -1,11 +1,31 @@
 import csv
 import sys
 
+import argparse
+from csvtools import cli
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description='convert tsv to csv')
+
+    cli.add_input_argument(parser)
+    cli.add_stats_argument(parser)
+    cli.add_buffer_argument(parser)
+
+    return parser.parse_args(args)
+
 
 def main():
-    reader = csv.reader(sys.stdin, delimiter='\t')
-    writer = csv.writer(sys.stdout)
-    writer.writerows(reader)
+    args = parse_args(sys.argv[1:])
+    stats = cli.stats_for(args, 'tsv2csv')
+
+    with cli.input_file(args.input_filename) as input_file:
+        with cli.output_file(args.buffer_size) as output_file:
+            reader = stats.reader(
+                csv.reader(stats.input_file(input_file), delimiter='\t'))
+            writer = stats.writer(
+                csv.writer(stats.output_file(output_file)))
+            writer.writerows(reader)
 
 
 if __name__ == '__main__':
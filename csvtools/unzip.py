@@ -1,70 +1,252 @@
 import sys
 import csv
+import gzip
+import io
 
 import argparse
-from csvtools.lib import Header, list_extractor
+import itertools
+from csvtools.lib import Header, projection
+from csvtools import cli
+from csvtools.batch_writer import BatchWriter, FormattingWriter, ThreadedFile
+from csvtools.stats import NoStats
 
 
-class DuplicateFieldError(Exception):
-    pass
+GZIP_SUFFIX = '.gz'
+# compression level for .gz outputs: much faster than the default 9
+GZIP_LEVEL = 6
 
 
-def unzip(csv_in, fields, csv_out_spec, csv_out_unspec, zip_field='id'):
-    input_csv = iter(csv_in)
-
-    header_row = input_csv.next()
-    header = Header(header_row)
-
-    if zip_field in header:
-        raise DuplicateFieldError(zip_field)
+class DuplicateFieldError(Exception):
+    pass
 
-    extract_spec = list_extractor(header.extractors(fields))
-    extract_unspec = list_extractor(
-        header.extractor(field)
-        for field in header_row
-        if field not in fields)
 
-    def extract_to(output, extract, row_id, row):
-        output.writerow([str(row_id)] + extract(row))
+class Unzip(object):
+
+    '''
+    Keep only the given fields and a new zip-id field in rows.
+
+    The zip-id and the rest of the fields are written to csv_out_unspec.
+    '''
+
+    def __init__(self, fields, csv_out_unspec, zip_field='id'):
+        self.fields = fields
+        self.csv_out_unspec = csv_out_unspec
+        self.zip_field = zip_field
+
+    def rows(self, reader):
+        '''
+        Iterator over output rows - the first one is the output header
+        '''
+        zip_field = self.zip_field
+        input_csv = iter(reader)
+
+        header_row = input_csv.next()
+        header = Header(header_row)
+
+        if zip_field in header:
+            raise DuplicateFieldError(zip_field)
+
+        spec_indices, other_outputs = self.split(header)
+        outputs = [
+            (indices, BatchWriter(csv_out))
+            for indices, csv_out in other_outputs]
+
+        # header row: the zip field is its id
+        unzip_header = self._rows(
+            [header_row], spec_indices, outputs, ids=[zip_field])
+        try:
+            for row in unzip_header:
+                yield row
+            for row in self._rows(input_csv, spec_indices, outputs):
+                yield row
+        finally:
+            # also when the consumer stops early
+            for _, out in outputs:
+                out.flush()
+
+    def split(self, header):
+        '''
+        Indices of the fields in rows and
+        (indices of fields, csv_out) pairs of the other outputs
+        '''
+        fields = self.fields
+        unspec_indices = header.indices(
+            field for field in header if field not in fields)
+        return (
+            header.indices(fields),
+            [(unspec_indices, self.csv_out_unspec)])
+
+    def _rows(self, input_csv, spec_indices, outputs, ids=None):
+        extract_spec = projection(spec_indices, list)
+        writes = [
+            (projection(indices, list), out.writerow)
+            for indices, out in outputs]
+
+        for zip_id, row in itertools.izip(ids or itertools.count(), input_csv):
+            row_id = [str(zip_id)]
+            for extract, write in writes:
+                write(row_id + extract(row))
+            yield row_id + extract_spec(row)
+
+
+class MultiUnzip(Unzip):
+
+    '''
+    Write groups of fields with a new zip-id field to their own csv_out,
+    keep the rest of the fields and the zip-id in rows.
+
+    groups: (fields, csv_out) pairs
+    '''
+
+    def __init__(self, groups, zip_field='id'):
+        super(MultiUnzip, self).__init__(None, None, zip_field=zip_field)
+        self.groups = groups
+
+    def split(self, header):
+        grouped_fields = set(
+            field for fields, _ in self.groups for field in fields)
+        rest_indices = header.indices(
+            field for field in header if field not in grouped_fields)
+        return (
+            rest_indices,
+            [(header.indices(fields), csv_out)
+             for fields, csv_out in self.groups])
 
-    def unzip_row(row_id, row):
-        extract_to(csv_out_spec, extract_spec, row_id, row)
-        extract_to(csv_out_unspec, extract_unspec, row_id, row)
 
-    unzip_row(zip_field, header_row)
-    for zip_id, row in enumerate(input_csv):
-        unzip_row(zip_id, row)
+def unzip(csv_in, fields, csv_out_spec, csv_out_unspec, zip_field='id'):
+    unzipper = Unzip(fields, csv_out_unspec, zip_field=zip_field)
+    csv_out_spec.writerows(unzipper.rows(csv_in))
 
 
 def parse_args(args):
     parser = argparse.ArgumentParser()
 
+    cli.add_input_argument(parser)
+    cli.add_stats_argument(parser)
+    cli.add_buffer_argument(parser)
     parser.add_argument(
         '--id', action='store', dest='zip_field', default='id',
         help='new field that matches rows in unzipped parts (%(default)s)')
     parser.add_argument(
-        'fields', metavar='FIELDS',
+        '--to', nargs=2, action='append', dest='outputs', default=[],
+        metavar=('FIELDS', 'FILENAME'),
+        help='write the id and FIELDS to FILENAME (gzipped if it ends'
+        ' with .gz), the rest of the fields to standard output,'
+        ' can be repeated')
+    parser.add_argument(
+        '--threads', action='store_true', default=False,
+        help='write --to outputs in threads')
+    parser.add_argument(
+        'fields', metavar='FIELDS', nargs='?',
         help='comma separated field names')
     parser.add_argument(
-        'unspec_fields_filename', metavar='UNSPEC_FILENAME',
+        'unspec_fields_filename', metavar='UNSPEC_FILENAME', nargs='?',
         help='Filename for unspecified fields')
 
-    return parser.parse_args(args)
+    args = parser.parse_args(args)
+    if args.outputs:
+        if args.fields is not None:
+            parser.error(
+                'FIELDS and UNSPEC_FILENAME can not be used with --to')
+    elif args.unspec_fields_filename is None:
+        parser.error('FIELDS and UNSPEC_FILENAME are required without --to')
+    return args
+
+
+def open_output(filename, buffer_size, files):
+    '''
+    Open filename for writing, through gzip if it ends with .gz
+
+    Opened files are appended to files, to be closed in reverse order.
+    '''
+    f = open(filename, 'wb', buffer_size)
+    files.append(f)
+    if filename.endswith(GZIP_SUFFIX):
+        f = gzip.GzipFile(filename, 'wb', GZIP_LEVEL, fileobj=f)
+        files.append(f)
+        # compress large chunks, not the rows one by one
+        f = io.BufferedWriter(f, max(buffer_size, io.DEFAULT_BUFFER_SIZE))
+        files.append(f)
+    return f
+
+
+def open_writer(filename, buffer_size, threads, files, stats=None):
+    '''
+    csv writer to filename opened with open_output
+
+    With threads the rows are formatted here, in batches,
+    compressed and written in a thread.
+    '''
+    stats = stats or NoStats()
+    out = open_output(filename, buffer_size, files)
+    if threads:
+        out = ThreadedFile(out)
+        files.append(out)
+        return FormattingWriter(stats.output_file(out))
+    return csv.writer(stats.output_file(out))
+
+
+def close_files(files):
+    '''
+    Close files in reverse order - all of them, even if closing one fails,
+    the first error is re-raised
+    '''
+    exc_info = None
+    for f in reversed(files):
+        try:
+            f.close()
+        except:
+            if exc_info is None:
+                exc_info = sys.exc_info()
+    if exc_info is not None:
+        raise exc_info[0], exc_info[1], exc_info[2]
+
+
+def multi_unzip_main(args, stats):
+    files = []
+    try:
+        groups = []
+        for fields, filename in args.outputs:
+            csv_out = open_writer(
+                filename, args.buffer_size, args.threads, files, stats)
+            groups.append((fields.split(','), stats.writer(csv_out)))
+
+        unzipper = MultiUnzip(groups, zip_field=args.zip_field)
+        with cli.input_file(args.input_filename) as input_file:
+            with cli.output_file(args.buffer_size) as output_file:
+                csv_in = stats.reader(
+                    csv.reader(stats.input_file(input_file)))
+                csv_out_rest = stats.writer(
+                    csv.writer(stats.output_file(output_file)))
+                csv_out_rest.writerows(unzipper.rows(csv_in))
+    finally:
+        close_files(files)
 
 
 def main():
     args = parse_args(sys.argv[1:])
 
-    fields = args.fields.split(',')
-    csv_in = csv.reader(sys.stdin)
-    csv_out_spec = csv.writer(sys.stdout)
-
-    with open(args.unspec_fields_filename, 'w') as out_unspec:
-        csv_out_unspec = csv.writer(out_unspec)
+    stats = cli.stats_for(args, 'unzip')
+    if args.outputs:
+        multi_unzip_main(args, stats)
+        return
 
-        unzip(
-            csv_in, fields, csv_out_spec, csv_out_unspec,
-            zip_field=args.zip_field)
+    fields = args.fields.split(',')
+    unspec_filename = args.unspec_fields_filename
+
+    with cli.input_file(args.input_filename) as input_file:
+        with open(unspec_filename, 'w', args.buffer_size) as out_unspec:
+            with cli.output_file(args.buffer_size) as output_file:
+                csv_in = stats.reader(
+                    csv.reader(stats.input_file(input_file)))
+                csv_out_spec = stats.writer(
+                    csv.writer(stats.output_file(output_file)))
+                csv_out_unspec = stats.writer(
+                    csv.writer(stats.output_file(out_unspec)))
+
+                unzip(
+                    csv_in, fields, csv_out_spec, csv_out_unspec,
+                    zip_field=args.zip_field)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,192 @@
+'''
+Interleave (or concatenate) the rows of csv inputs - the reverse of divide
+
+Usage:
+weave [--read-ahead ROWS] [--concatenate] input [input [...]]
+
+Inputs are file names or prefixes: an input not existing as a file, but
+with an existing `input`0 file is the series of files `input`0, `input`1,
+... (like the outputs of divide).
+The inputs must have the same header, it is written only once.
+
+Rows are taken from the inputs in turn: the first row of every input,
+then the second rows, ..., inputs having no more rows are skipped.
+This restores the order of the rows divided with --round-robin.
+
+With --concatenate all rows of an input are taken before the next one's.
+This restores the order of the rows divided into byte ranges (the default
+of divide for regular files).
+
+Every input is read and parsed in its own thread, up to ROWS rows ahead,
+so a slow input does not stall reading the others.
+'''
+
+import os
+import csv
+import sys
+import Queue
+import itertools
+import threading
+
+import argparse
+from csvtools import cli
+from csvtools.blocks import read_blocks
+from csvtools.mapped_file import open_mapped
+
+
+READ_AHEAD = 10000
+# rows passed from a reader thread at once
+BATCH_ROWS = 1000
+
+
+class BadInput(Exception):
+    pass
+
+
+def input_filenames(inputs):
+    '''
+    File names of inputs, prefixes expanded to their series of files
+    '''
+    filenames = []
+    for name in inputs:
+        if os.path.exists(name) or not os.path.exists(name + '0'):
+            filenames.append(name)
+            continue
+        for i in itertools.count():
+            filename = name + str(i)
+            if not os.path.exists(filename):
+                break
+            filenames.append(filename)
+    return filenames
+
+
+class _Error(object):
+
+    def __init__(self, exc_info):
+        self.exc_info = exc_info
+
+
+class ThreadedReader(object):
+
+    '''
+    Iterator over the rows of reader, read in a thread
+    at most read_ahead rows ahead (in batches of batch_rows)
+    '''
+
+    def __init__(self, reader, read_ahead=READ_AHEAD, batch_rows=BATCH_ROWS):
+        self.reader = reader
+        self.batch_rows = min(batch_rows, read_ahead)
+        self.queue = Queue.Queue(max(1, read_ahead // self.batch_rows))
+        self.thread = threading.Thread(target=self._read_batches)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _read_batches(self):
+        put = self.queue.put
+        try:
+            for rows in read_blocks(self.reader, self.batch_rows):
+                put(rows)
+        except:
+            put(_Error(sys.exc_info()))
+        else:
+            put(None)
+
+    def _batches(self):
+        for batch in iter(self.queue.get, None):
+            if isinstance(batch, _Error):
+                exc_info = batch.exc_info
+                raise exc_info[0], exc_info[1], exc_info[2]
+            yield batch
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self._batches())
+
+
+def interleave(readers):
+    '''
+    Iterator over the rows of readers round robin,
+    skipping readers having no more rows
+    '''
+    next_rows = [iter(reader).next for reader in readers]
+    while next_rows:
+        active = []
+        for next_row in next_rows:
+            try:
+                row = next_row()
+            except StopIteration:
+                continue
+            active.append(next_row)
+            yield row
+        next_rows = active
+
+
+def weave(readers, read_ahead=READ_AHEAD, concatenate=False):
+    '''
+    Iterator over the header and the interleaved rows of readers
+
+    concatenate: the rows of readers follow each other, not interleaved
+    '''
+    readers = [iter(reader) for reader in readers]
+    headers = [next(reader, None) for reader in readers]
+    header = headers[0]
+    if any(other != header for other in headers[1:]):
+        raise BadInput('headers differ')
+    if header is None:
+        return
+
+    if read_ahead:
+        readers = [ThreadedReader(reader, read_ahead) for reader in readers]
+    if concatenate:
+        rows = itertools.chain.from_iterable(readers)
+    else:
+        rows = interleave(readers)
+    yield header
+    for row in rows:
+        yield row
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser()
+
+    cli.add_stats_argument(parser)
+    cli.add_buffer_argument(parser)
+    parser.add_argument(
+        '--read-ahead', type=int, default=READ_AHEAD, metavar='ROWS',
+        help='read every input in a thread at most ROWS rows ahead,'
+        ' 0 to read them in turn (%(default)s)')
+    parser.add_argument(
+        '--concatenate', action='store_true', default=False,
+        help='write the rows of the inputs one input after the other,'
+        ' not interleaved')
+    parser.add_argument(
+        'inputs', metavar='INPUT', nargs='+',
+        help='input file or prefix of input files')
+
+    return parser.parse_args(args)
+
+
+def main():
+    args = parse_args(sys.argv[1:])
+    stats = cli.stats_for(args, 'weave')
+
+    input_files = []
+    try:
+        for filename in input_filenames(args.inputs):
+            input_files.append(open_mapped(filename))
+        # the parse time of readers in threads can not be measured,
+        # rows are counted when interleaved
+        readers = [csv.reader(f) for f in input_files]
+        with cli.output_file(args.buffer_size) as output_file:
+            writer = stats.writer(csv.writer(stats.output_file(output_file)))
+            writer.writerows(
+                stats.reader(
+                    weave(
+                        readers, read_ahead=args.read_ahead,
+                        concatenate=args.concatenate)))
+    finally:
+        for f in input_files:
+            f.close()
+
+
+if __name__ == '__main__':
+    main()
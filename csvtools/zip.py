@@ -4,7 +4,9 @@ import csv
 
 import argparse
 import itertools
-from lib import Header, list_extractor
+from lib import Header, projection, numeric_value
+from csvtools import cli
+from csvtools.mapped_file import open_mapped
 
 
 class BadInput(Exception):
@@ -15,6 +17,17 @@ class IdMismatch(Exception):
     pass
 
 
+class UnsortedInput(BadInput):
+    '''Ids are not in increasing order'''
+
+
+# join types of the merge join
+INNER = 'inner'
+LEFT = 'left'
+OUTER = 'outer'
+JOINS = (INNER, LEFT, OUTER)
+
+
 def get_id_field(header1, header2):
     fields1 = set(header1)
     fields2 = set(header2)
@@ -28,49 +41,205 @@ def get_id_field(header1, header2):
 
 
 def extractor(header, excluded_field):
-    return list_extractor(
-        header.extractor(field)
-        for field in header
-        if field != excluded_field)
-
-
-def csvzip(csv_in1, csv_in2, csv_out, keep_id=False):
-    i_csv_in1 = iter(csv_in1)
-    i_csv_in2 = iter(csv_in2)
-
-    header1 = Header(i_csv_in1.next())
-    header2 = Header(i_csv_in2.next())
-
-    id_field = get_id_field(header1, header2)
-
-    extract_id1 = header1.extractor(id_field)
-    extract_id2 = header2.extractor(id_field)
-
-    extract_output1 = extractor(header1, id_field)
-    extract_output2 = extractor(header2, id_field)
-
-    def zip_rows(row1, row2):
-        zip_id1 = extract_id1(row1)
-        zip_id2 = extract_id2(row2)
-        if zip_id1 != zip_id2:
-            raise IdMismatch
-
-        output = extract_output1(row1) + extract_output2(row2)
-
-        if keep_id:
-            return [zip_id1] + output
+    return projection(
+        header.indices(field for field in header if field != excluded_field),
+        list)
+
+
+def numeric_key(extract_id):
+    '''
+    Key of rows: their id as a number, ordered like sort --numeric
+    '''
+    def key(row):
+        return numeric_value(extract_id(row))
+    return key
+
+
+def _keyed(rows, key, strict):
+    '''
+    Iterator over (key, row) pairs, checking that the keys are increasing
+    (strictly increasing if strict)
+    '''
+    rows = iter(rows)
+    for row in rows:
+        previous = key(row)
+        yield previous, row
+        break
+    for row in rows:
+        current = key(row)
+        if current < previous or (strict and current == previous):
+            raise UnsortedInput(current)
+        yield current, row
+        previous = current
+
+
+def merge_join(rows1, rows2, key1, key2, join=INNER):
+    '''
+    Iterator over (row1, row2) pairs of matching rows of inputs sorted by key.
+
+    Keys of rows1 must be increasing, keys of rows2 strictly increasing,
+    so memory use is constant, while more rows1 can match the same row2.
+
+    With a LEFT join rows1 without a match are paired with None,
+    with an OUTER join also rows2 without a match.
+    '''
+    keep1 = join in (LEFT, OUTER)
+    keep2 = join == OUTER
+    end = (None, None)
+
+    keyed1 = _keyed(rows1, key1, strict=False)
+    keyed2 = _keyed(rows2, key2, strict=True)
+    k1, row1 = next(keyed1, end)
+    k2, row2 = next(keyed2, end)
+    matched2 = False
+    while row1 is not None and row2 is not None:
+        if k1 == k2:
+            yield row1, row2
+            matched2 = True
+            k1, row1 = next(keyed1, end)
+        elif k1 < k2:
+            if keep1:
+                yield row1, None
+            k1, row1 = next(keyed1, end)
         else:
-            return output
-
-    csv_out.writerow(zip_rows(list(header1), list(header2)))
-    csv_out.writerows(
-        zip_rows(row1, row2)
-        for row1, row2 in itertools.izip(i_csv_in1, i_csv_in2))
+            if keep2 and not matched2:
+                yield None, row2
+            matched2 = False
+            k2, row2 = next(keyed2, end)
+
+    if keep1:
+        while row1 is not None:
+            yield row1, None
+            k1, row1 = next(keyed1, end)
+    if keep2:
+        while row2 is not None:
+            if not matched2:
+                yield None, row2
+            matched2 = False
+            k2, row2 = next(keyed2, end)
+
+
+class Zip(object):
+
+    '''
+    Join rows with the rows of another csv on their only common field.
+
+    join: if given (one of JOINS), the inputs are merge joined on their ids,
+        instead of requiring the same ids in the same order
+    numeric: compare ids as numbers in a merge join, like sort --numeric
+    '''
+
+    def __init__(
+            self, csv_in2, keep_id=False, join=None, numeric=False):
+        self.csv_in2 = csv_in2
+        self.keep_id = keep_id
+        self.join = join
+        self.numeric = numeric
+
+    def rows(self, reader):
+        '''
+        Iterator over output rows - the first one is the output header
+        '''
+        keep_id = self.keep_id
+        i_csv_in1 = iter(reader)
+        i_csv_in2 = iter(self.csv_in2)
+
+        header1 = Header(i_csv_in1.next())
+        header2 = Header(i_csv_in2.next())
+
+        id_field = get_id_field(header1, header2)
+
+        extract_id1 = header1.extractor(id_field)
+        extract_id2 = header2.extractor(id_field)
+
+        extract_output1 = extractor(header1, id_field)
+        extract_output2 = extractor(header2, id_field)
+
+        def zip_rows(row1, row2):
+            zip_id1 = extract_id1(row1)
+            zip_id2 = extract_id2(row2)
+            if zip_id1 != zip_id2:
+                raise IdMismatch
+
+            output = extract_output1(row1) + extract_output2(row2)
+
+            if keep_id:
+                return [zip_id1] + output
+            else:
+                return output
+
+        yield zip_rows(list(header1), list(header2))
+        if self.join:
+            if self.numeric:
+                key1 = numeric_key(extract_id1)
+                key2 = numeric_key(extract_id2)
+            else:
+                key1, key2 = extract_id1, extract_id2
+            missing1 = [''] * (len(header1) - 1)
+            missing2 = [''] * (len(header2) - 1)
+
+            pairs = merge_join(i_csv_in1, i_csv_in2, key1, key2, self.join)
+            for row1, row2 in pairs:
+                if row2 is None:
+                    zip_id = extract_id1(row1)
+                    output = extract_output1(row1) + missing2
+                elif row1 is None:
+                    zip_id = extract_id2(row2)
+                    output = missing1 + extract_output2(row2)
+                else:
+                    zip_id = extract_id1(row1)
+                    output = extract_output1(row1) + extract_output2(row2)
+                if keep_id:
+                    output.insert(0, zip_id)
+                yield output
+            return
+
+        for row1, row2 in itertools.izip(i_csv_in1, i_csv_in2):
+            yield zip_rows(row1, row2)
+
+
+class MultiZip(object):
+
+    '''
+    Join rows with the rows of more other csvs in one pass.
+
+    The other csvs are joined one after the other on the only field they
+    have in common with the rows joined so far, all rows being read in
+    lockstep. Output fields are in the order of the inputs.
+    '''
+
+    def __init__(self, others, keep_id=False, join=None, numeric=False):
+        others = list(others)
+        # intermediate joins keep the id field for the next ones
+        self.zips = [
+            Zip(
+                other,
+                keep_id=keep_id if i == len(others) - 1 else True,
+                join=join, numeric=numeric)
+            for i, other in enumerate(others)]
+
+    def rows(self, reader):
+        '''
+        Iterator over output rows - the first one is the output header
+        '''
+        rows = reader
+        for zipper in self.zips:
+            rows = zipper.rows(rows)
+        return iter(rows)
+
+
+def csvzip(
+        csv_in1, csv_in2, csv_out, keep_id=False, join=None, numeric=False):
+    zipper = Zip(csv_in2, keep_id=keep_id, join=join, numeric=numeric)
+    csv_out.writerows(zipper.rows(csv_in1))
 
 
 def parse_args(args):
     parser = argparse.ArgumentParser()
 
+    cli.add_input_argument(parser)
+    cli.add_stats_argument(parser)
+    cli.add_buffer_argument(parser)
     parser.add_argument(
         '--keep-id', action='store_true', dest='keep_id', default=False,
         help='keep id field in output')
@@ -78,8 +247,17 @@ def parse_args(args):
         '--rm', action='store_true', dest='remove_input_file', default=False,
         help='remove input file (clean up when used in pipe)')
     parser.add_argument(
-        'other_filename',
-        help='other filename to zip with')
+        '--join', choices=JOINS, default=None,
+        help='merge join inputs sorted on the id field,'
+        ' keeping rows without a match of the input (left)'
+        ' or of both inputs (outer)')
+    parser.add_argument(
+        '--numeric', action='store_true', default=False,
+        help='ids are sorted as numbers, like by sort --numeric'
+        ' (with --join)')
+    parser.add_argument(
+        'other_filenames', metavar='other_filename', nargs='+',
+        help='other filenames to zip with')
 
     return parser.parse_args(args)
 
@@ -87,17 +265,34 @@ def parse_args(args):
 def main():
     args = parse_args(sys.argv[1:])
 
-    csv_in1 = csv.reader(sys.stdin)
-    csv_out = csv.writer(sys.stdout)
-
-    with open(args.other_filename) as other_csv:
-        csv_in2 = csv.reader(other_csv)
-
-        csvzip(
-            csv_in1, csv_in2, csv_out, keep_id=args.keep_id)
+    stats = cli.stats_for(args, 'zip')
+
+    other_csvs = []
+    try:
+        for other_filename in args.other_filenames:
+            other_csvs.append(open_mapped(other_filename))
+
+        with cli.input_file(args.input_filename) as input_file:
+            with cli.output_file(args.buffer_size) as output_file:
+                csv_in1 = stats.reader(
+                    csv.reader(stats.input_file(input_file)))
+                others = [
+                    stats.reader(csv.reader(stats.input_file(other_csv)))
+                    for other_csv in other_csvs]
+                csv_out = stats.writer(
+                    csv.writer(stats.output_file(output_file)))
+
+                zipper = MultiZip(
+                    others, keep_id=args.keep_id, join=args.join,
+                    numeric=args.numeric)
+                csv_out.writerows(zipper.rows(csv_in1))
+    finally:
+        for other_csv in other_csvs:
+            other_csv.close()
 
     if args.remove_input_file:
-        os.remove(args.other_filename)
+        for other_filename in args.other_filenames:
+            os.remove(other_filename)
 
 
 if __name__ == '__main__':
@@ -15,7 +15,7 @@ setup(
     author=u'Krisztián Fekete',
     url='https://github.com/krisztianfekete/csvtools',
 
-    packages=['csvtools'],
+    packages=['csvtools', 'csvtools.bench'],
 
     install_requires=['temp_dir'],  # not really - only for tests
 
@@ -25,18 +25,27 @@ setup(
         'console_scripts': [
             'csv_select = csvtools.select:main',
             'csv_split = csvtools.split:main',
+            'csv_divide = csvtools.divide:main',
+            'csv_weave = csvtools.weave:main',
             'csv_zip = csvtools.zip:main',
             'csv_unzip = csvtools.unzip:main',
+            'csv_sort = csvtools.sort:main',
             'csv_rmfields = csvtools.rmfields:main',
             'csv_extract_map = csvtools.extract_map:main',
+            'csv_inflate_map = csvtools.inflate_map:main',
             'csv_to_postgres = csvtools.to_postgres:main',
             'csv_to_tsv = csvtools.csv2tsv:main',
             'tsv_to_csv = csvtools.tsv2csv:main',
+            'csv_to_columns = csvtools.csv2columns:main',
+            'columns_to_csv = csvtools.columns2csv:main',
+            'csv_pipeline = csvtools.pipeline:main',
 
             # aliases
             'csv2postgres = csvtools.to_postgres:main',
             'csv2tsv = csvtools.csv2tsv:main',
             'tsv2csv = csvtools.tsv2csv:main',
+            'csv2columns = csvtools.csv2columns:main',
+            'columns2csv = csvtools.columns2csv:main',
         ],
     }
     )